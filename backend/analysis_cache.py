@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import history_repository as repo
+from incident_cache import IncidentCache
+from metrics import counter
+
+_logger = logging.getLogger("klynx.analysis_cache")
+
+# How long an LLM analysis is reused for the same normalized alert text; 0 disables the cache.
+ANALYSIS_CACHE_TTL_S = float(os.getenv("KLYNX_ANALYSIS_CACHE_TTL_S", "3600"))
+# In-process tier in front of the shared SQLite table.
+ANALYSIS_CACHE_ENTRIES = int(os.getenv("KLYNX_ANALYSIS_CACHE_ENTRIES", "2048"))
+ANALYSIS_CACHE_DB = os.getenv("KLYNX_ANALYSIS_CACHE_DB", "true").lower() in ("1", "true", "yes")
+
+_MENTION = re.compile(r"<[@#!][^>]*>")
+_HAS_DIGIT = re.compile(r"\d").search
+# Volatile parts of a token, tried in branch order. Everything replaced
+# contains a digit, so only tokens with one are looked at.
+_VOLATILE = re.compile(
+    r"(?P<ts>\b\d{4}-\d{2}-\d{2}(?:t\d{2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?(?:z|[+-]\d{2}:?\d{2})?)?\b"
+    r"|\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?\b"
+    r"|\b1\d{9}(?:\.\d+)?\b|\b1\d{12}\b)"
+    r"|(?P<id>\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b)"
+    r"|(?P<rid>(?<=[a-z0-9])-(?=[0-9a-f]*\d)[0-9a-f]{4,}\b)"
+    r"|(?P<hex>\b(?=[0-9a-f]*\d)[0-9a-f]{12,}\b)"
+)
+# Entry field holding the volatile parts of the text an analysis was written for.
+_SOURCE_VALUES = "_source_values"
+_PLACEHOLDERS = {"ts": "<ts>", "id": "<id>", "rid": "-<id>", "hex": "<id>"}
+
+
+def _placeholder(m: "re.Match[str]") -> str:
+    return _PLACEHOLDERS[m.lastgroup]  # type: ignore[index]
+
+
+def alert_tokens(text: str) -> List[str]:
+    """
+    Lower-cased words of `text` with Slack mentions dropped and the parts
+    that change between re-fires of the same alert (timestamps, UUIDs,
+    resource and trace ids) replaced by placeholders.
+    """
+    tokens = _MENTION.sub(" ", (text or "").lower()).split()
+    sub = _VOLATILE.sub
+    # Nothing shorter than "-abc1" or "1:02:03" can hold a volatile part.
+    return [sub(_placeholder, tok) if len(tok) > 4 and _HAS_DIGIT(tok) else tok for tok in tokens]
+
+
+def volatile_values(text: str) -> List[str]:
+    """The parts of `text` alert_tokens() replaces, in order (lower-cased)."""
+    out: List[str] = []
+    for tok in _MENTION.sub(" ", (text or "").lower()).split():
+        if len(tok) > 4 and _HAS_DIGIT(tok):
+            out.extend(m.group(0) for m in _VOLATILE.finditer(tok))
+    return out
+
+
+def rebind(data: Any, source: Sequence[str], target: Sequence[str]) -> Optional[Any]:
+    """
+    `data` (an analysis written for a text with volatile parts `source`)
+    with each of them replaced, in every string, by the part at the same
+    position in `target`: texts that normalize alike line up one to one.
+    None when they don't, or one source part would need two replacements.
+    """
+    if len(source) != len(target):
+        return None
+    mapping: Dict[str, str] = {}
+    for old, new in zip(source, target):
+        if mapping.setdefault(old, new) != new:
+            return None
+    mapping = {old: new for old, new in mapping.items() if old != new}
+    if not mapping:
+        return data
+    pattern = re.compile("|".join(re.escape(v) for v in sorted(mapping, key=len, reverse=True)), re.IGNORECASE)
+
+    def sub(value: Any) -> Any:
+        if isinstance(value, str):
+            return pattern.sub(lambda m: mapping[m.group(0).lower()], value)
+        if isinstance(value, list):
+            return [sub(v) for v in value]
+        if isinstance(value, dict):
+            return {k: sub(v) for k, v in value.items()}
+        return value
+
+    return sub(data)
+
+
+def normalize_alert_text(text: str) -> str:
+    """alert_tokens() joined by single spaces."""
+    return " ".join(alert_tokens(text))
+
+
+def cache_key(text: str, *, model: str, prompt: str = "") -> str:
+    """
+    Content address of an analysis: the normalized text plus everything
+    that changes the LLM's answer (model and system prompt).
+    """
+    h = hashlib.sha256()
+    for part in (model, prompt, normalize_alert_text(text)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    """
+    Two-tier cache of LLM analyses: an in-process LRU in front of the
+    shared analysis_cache table. Entries expire `ttl_s` after the LLM
+    produced them, whichever tier serves them. DB errors only cost a miss.
+
+    Keys ignore ids and timestamps, so an entry also keeps those of the
+    text it was written for; get() rewrites them to the asking text's
+    (see rebind()), so a summary never names another alert's resource.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl_s: float = ANALYSIS_CACHE_TTL_S,
+        max_entries: int = ANALYSIS_CACHE_ENTRIES,
+        persist: bool = ANALYSIS_CACHE_DB,
+    ) -> None:
+        self.ttl_s = ttl_s
+        self.persist = persist
+        self._mem = IncidentCache(
+            max_entries=max_entries, max_bytes=64 * 1024 * 1024, ttl_s=max(ttl_s, 0), name="analysis_cache_mem"
+        )
+        self._db_hits = counter("analysis_cache_db_hits")
+        self._misses = counter("analysis_cache_misses")
+        self._stores = counter("analysis_cache_stores")
+        self._errors = counter("analysis_cache_errors")
+        self._unmapped = counter("analysis_cache_unmapped")
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_s > 0
+
+    def get(self, key: str, text: str) -> Optional[Dict[str, Any]]:
+        data = self._get(key)
+        if data is not None:
+            data = dict(data)
+            # Entries from before values were kept: only usable if there is nothing to rewrite.
+            source = data.pop(_SOURCE_VALUES, None)
+            target = volatile_values(text)
+            data = rebind(data, source if source is not None else [], target)
+            if data is None:
+                self._unmapped.inc()
+        return data
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        entry = self._mem.get(key)
+        if entry is not None and entry["expires_at"] > time.time():
+            return entry["data"]
+        if self.persist:
+            token = self._mem.token()
+            try:
+                found = repo.get_cached_analysis(key)
+            except Exception:
+                self._errors.inc()
+                _logger.exception("analysis cache read failed")
+                found = None
+            if found is not None:
+                data, expires_at = found
+                self._mem.put(key, {"data": data, "expires_at": expires_at}, token)
+                self._db_hits.inc()
+                return data
+        self._misses.inc()
+        return None
+
+    def put(self, key: str, model: str, data: Dict[str, Any], text: str) -> None:
+        if not self.enabled:
+            return
+        data = {**data, _SOURCE_VALUES: volatile_values(text)}
+        expires_at = time.time() + self.ttl_s
+        if self.persist:
+            try:
+                expires_at = repo.put_cached_analysis(key, model, data, self.ttl_s)
+            except Exception:
+                self._errors.inc()
+                _logger.exception("analysis cache write failed")
+        self._mem.put(key, {"data": data, "expires_at": expires_at}, self._mem.token())
+        self._stores.inc()
+
+    def clear(self) -> None:
+        self._mem.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        mem = self._mem.stats()
+        out: Dict[str, Any] = {
+            "enabled": self.enabled,
+            "ttl_s": self.ttl_s,
+            "memory_hits": mem["hits"],
+            "db_hits": self._db_hits.value,
+            "misses": self._misses.value,
+            "stores": self._stores.value,
+            "errors": self._errors.value,
+            "unmapped": self._unmapped.value,
+            "memory_entries": mem["entries"],
+        }
+        lookups = out["memory_hits"] + out["db_hits"] + out["misses"]
+        out["hit_ratio"] = round((out["memory_hits"] + out["db_hits"]) / lookups, 4) if lookups else 0.0
+        if self.persist:
+            try:
+                out["db_entries"] = repo.analysis_cache_size()
+            except Exception:
+                out["db_entries"] = None
+        return out
+
+
+_cache = AnalysisCache()
+
+
+def get_analysis_cache() -> AnalysisCache:
+    return _cache
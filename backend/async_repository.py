@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import history_repository as repo
+from metrics import histogram
+
+# Async facade over history_repository for `async def` handlers.
+# Every call runs on a small dedicated executor so SQLite I/O (and fsync)
+# never runs on the event loop thread, and a slow disk cannot starve the
+# default executor that FastAPI uses for sync routes.
+
+ASYNC_DB_WORKERS = int(os.getenv("INCIDENTS_ASYNC_DB_WORKERS", "4"))
+
+_executor = ThreadPoolExecutor(max_workers=ASYNC_DB_WORKERS, thread_name_prefix="incidents-db")
+_queue_ms = histogram("incidents_async_db_queue_ms")
+_call_ms = histogram("incidents_async_db_call_ms")
+
+
+async def _run(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    submitted = time.perf_counter()
+
+    def call() -> Any:
+        started = time.perf_counter()
+        _queue_ms.observe((started - submitted) * 1000.0)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _call_ms.observe((time.perf_counter() - started) * 1000.0)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, call)
+
+
+async def save_incident(**kwargs: Any) -> None:
+    await _run(repo.save_incident, **kwargs)
+
+
+async def get_incident_by_thread_ts(thread_ts: str, fields: Any = None) -> Optional[Dict[str, Any]]:
+    return await _run(repo.get_incident_by_thread_ts, thread_ts, fields=fields)
+
+
+async def query_incidents(**kwargs: Any) -> Dict[str, Any]:
+    return await _run(repo.query_incidents, **kwargs)
+
+
+async def list_incidents(limit: int = 50, **filters: Any) -> List[Dict[str, Any]]:
+    return await _run(repo.list_incidents, limit, **filters)
+
+
+async def search_incidents(query: str, limit: int = 20, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    return await _run(repo.search_incidents, query, limit, filters)
+
+
+async def incident_stats(**kwargs: Any) -> Dict[str, Any]:
+    return await _run(repo.incident_stats, **kwargs)
+
+
+async def find_incidents_by_resource(resource_id: str, **kwargs: Any) -> Dict[str, Any]:
+    return await _run(repo.find_incidents_by_resource, resource_id, **kwargs)
+
+
+async def incident_changes(**kwargs: Any) -> Dict[str, Any]:
+    return await _run(repo.incident_changes, **kwargs)
+
+
+async def change_cursor() -> str:
+    return await _run(repo.change_cursor)
+
+
+async def update_incident_status(thread_ts: str, status: str, actor: Optional[str] = None) -> None:
+    await _run(repo.update_incident_status, thread_ts, status, actor)
+
+
+async def update_incident_analysis(
+    thread_ts: str, analysis_text: str, probable_cause: str = "", actor: Optional[str] = None
+) -> None:
+    await _run(repo.update_incident_analysis, thread_ts, analysis_text, probable_cause, actor)
+
+
+async def update_incident_plan(thread_ts: str, plan: Dict[str, Any], actor: Optional[str] = None) -> None:
+    await _run(repo.update_incident_plan, thread_ts, plan, actor)
+
+
+async def upgrade_incident_analysis(thread_ts: str, **kwargs: Any) -> None:
+    await _run(repo.upgrade_incident_analysis, thread_ts, **kwargs)
+
+
+async def patch_incident_plan(thread_ts: str, **kwargs: Any) -> None:
+    await _run(repo.patch_incident_plan, thread_ts, **kwargs)
+
+
+async def append_incident_event(
+    thread_ts: str, kind: str, data: Optional[Dict[str, Any]] = None, actor: Optional[str] = None
+) -> None:
+    await _run(repo.append_incident_event, thread_ts, kind, data, actor)
+
+
+async def append_incident_events(events: List[Any]) -> int:
+    return await _run(repo.append_incident_events, events)
+
+
+async def import_incidents(records: List[Dict[str, Any]], **kwargs: Any) -> Dict[str, int]:
+    return await _run(repo.import_incidents, records, **kwargs)
+
+
+async def incident_timeline(incident_id: str, **kwargs: Any) -> Dict[str, Any]:
+    return await _run(repo.incident_timeline, incident_id, **kwargs)
+
+
+def shutdown() -> None:
+    _executor.shutdown(wait=True)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 import os
 from models import Incident, AutoFixResult
+import rule_engine
 
 def _aws_fix_plan(incident: Incident, dry_run: bool = True) -> AutoFixResult:
     result = AutoFixResult(ok=True, dry_run=dry_run, actions=[], errors=[], notes=[])
@@ -14,21 +15,9 @@ def _aws_fix_plan(incident: Incident, dry_run: bool = True) -> AutoFixResult:
         return result
 
     region = incident.region or os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION") or "us-east-1"
-    text = (incident.raw_text or "").lower()
-
-    if "alb" in text or "target group" in text or "503" in text or "504" in text or "bad gateway" in text:
-        result.actions.append(f"[dry_run={dry_run}] Check ALB target group health in {region}.")
-        result.actions.append(f"[dry_run={dry_run}] Validate health check path/port/timeouts; scale service if saturated.")
-        return result
-
-    if "insufficient subnets" in text and "lambda" in text:
-        result.actions.append(f"[dry_run={dry_run}] Validate Lambda VPC subnets have free IPs in {region}.")
-        result.actions.append(f"[dry_run={dry_run}] Update Lambda config to use healthy subnets across 2+ AZs.")
-        return result
-
-    if "unable to delete vpc" in text or "unable to remove vpc" in text:
-        result.actions.append(f"[dry_run={dry_run}] Enumerate VPC dependents (IGW/NAT/endpoints/ENIs) in {region}.")
-        result.actions.append(f"[dry_run={dry_run}] Generate safe deletion order checklist; execute only with approval.")
+    rule = rule_engine.evaluate(incident.raw_text or "").first("actions", "aws")
+    if rule is not None:
+        result.actions.extend(rule.render("actions", region=region, dry_run=dry_run)["aws"])
         return result
 
     result.ok = False
@@ -2,33 +2,49 @@ import os
 import re
 import json
 import uuid
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+
+import rule_engine
+from incident_classifier import confident
+from text_matcher import Matcher, TextMatch
 
 DEFAULT_DRY_RUN = os.getenv("KLYNX_DRY_RUN_DEFAULT", "true").lower() in ("1", "true", "yes")
 
-def _guess_cloud(text: str) -> str:
-    t = text.lower()
-    if any(x in t for x in ["aws", "ec2", "iam", "vpc", "alb", "route53", "cloudwatch", "lambda"]):
-        return "aws"
-    if any(x in t for x in ["azure", "aks", "entra", "aad", "arm", "resource group"]):
-        return "azure"
-    if any(x in t for x in ["gcp", "gke", "cloud run", "cloud sql", "vpc network"]):
-        return "gcp"
-    return "unknown"
+# Cloud / severity keywords, all found in one Matcher pass. Plan templates
+# live in rules/ (see rule_engine).
+_MATCHER = Matcher({
+    "aws": ["aws", "ec2", "iam", "vpc", "alb", "route53", "cloudwatch", "lambda"],
+    "azure": ["azure", "aks", "entra", "aad", "arm", "resource group"],
+    "gcp": ["gcp", "gke", "cloud run", "cloud sql", "vpc network"],
+    "sev1": ["outage", "down", "sev1", "sev-1", "p0", "major incident"],
+    "sev2": ["sev2", "sev-2", "p1", "degraded", "latency high", "errors spike"],
+    "sev3": ["sev3", "sev-3", "p2", "intermittent"],
+})
+
+def _guess_cloud(text: str, match: Optional[TextMatch] = None) -> str:
+    m = match or _MATCHER.scan(text)
+    for cloud in ("aws", "azure", "gcp"):
+        if m.has(cloud):
+            return cloud
+    if m.region_cloud:
+        return m.region_cloud
+    # No keyword: the trained classifier, when it is sure.
+    learned = confident(text)[1]
+    return learned if learned in ("aws", "azure", "gcp") else "unknown"
 
-def _guess_severity(text: str) -> str:
-    t = text.lower()
-    if any(x in t for x in ["outage", "down", "sev1", "sev-1", "p0", "major incident"]):
+def _guess_severity(text: str, match: Optional[TextMatch] = None) -> str:
+    m = match or _MATCHER.scan(text)
+    if m.has("sev1"):
         return "SEV-1"
-    if any(x in t for x in ["sev2", "sev-2", "p1", "degraded", "latency high", "errors spike"]):
+    if m.has("sev2"):
         return "SEV-2"
-    if any(x in t for x in ["sev3", "sev-3", "p2", "intermittent"]):
+    if m.has("sev3"):
         return "SEV-3"
-    return "SEV-4"
+    return confident(text)[0] or "SEV-4"
 
-def _extract_region(text: str) -> str:
-    m = re.search(r"\b(us|eu|ap|sa|ca|me|af)-[a-z]+-\d\b", text.lower())
-    return m.group(0) if m else "unknown"
+def _extract_region(text: str, match: Optional[TextMatch] = None) -> str:
+    m = match or _MATCHER.scan(text)
+    return m.region or "unknown"
 
 def _normalize_summary(text: str) -> str:
     # Remove bot mention if present
@@ -41,44 +57,6 @@ def generate_incident_id() -> str:
 
 # ---- Plan templates ----
 
-def _plan_vpc_privatelink_cidr_missing(cloud: str) -> Tuple[str, str, List[Dict[str, Any]]]:
-    probable = "PrivateLink CIDR missing or incorrect."
-    analysis = (
-        "VPC creation/PrivateLink setup often fails when the required PrivateLink CIDR is not configured, "
-        "overlaps with existing ranges, or the org/account policy restricts allowed CIDRs."
-    )
-    steps = [
-        {
-            "id": "s1",
-            "title": "Collect context",
-            "risk": "none",
-            "dry_run_cmd": "echo 'Gather: account, region, VPC module inputs, requested CIDR, org policy constraints'",
-            "apply_cmd": None,
-        },
-        {
-            "id": "s2",
-            "title": "Validate CIDR availability",
-            "risk": "low",
-            "dry_run_cmd": "echo 'Check overlaps: existing VPC CIDRs, subnet CIDRs, IPAM pools (if any)'",
-            "apply_cmd": None,
-        },
-        {
-            "id": "s3",
-            "title": "Propose safe CIDR",
-            "risk": "low",
-            "dry_run_cmd": "echo 'Suggest non-overlapping /24 or /22 from approved ranges'",
-            "apply_cmd": None,
-        },
-        {
-            "id": "s4",
-            "title": "Apply fix (requires approval)",
-            "risk": "medium",
-            "dry_run_cmd": "echo 'Would update IaC variables / parameters with approved PrivateLink CIDR and re-run pipeline'",
-            "apply_cmd": "echo 'APPLY: update IaC vars and re-run pipeline (placeholder)'",
-        },
-    ]
-    return probable, analysis, steps
-
 def _default_plan(text: str) -> Tuple[str, str, List[Dict[str, Any]]]:
     probable = "Insufficient details to propose a safe fix."
     analysis = "Need error message, cloud, region, affected service, and a screenshot/log snippet to propose a cloud-safe remediation."
@@ -94,14 +72,16 @@ def _default_plan(text: str) -> Tuple[str, str, List[Dict[str, Any]]]:
     return probable, analysis, steps
 
 def build_plan(text: str, cloud: str = "unknown") -> Dict[str, Any]:
-    cloud_guess = cloud if cloud and cloud != "unknown" else _guess_cloud(text)
-    region = _extract_region(text)
-    sev = _guess_severity(text)
+    match = _MATCHER.scan(text)
+    cloud_guess = cloud if cloud and cloud != "unknown" else _guess_cloud(text, match)
+    region = _extract_region(text, match)
+    sev = _guess_severity(text, match)
     summary = _normalize_summary(text)
 
-    t = text.lower()
-    if "privatelink" in t and "cidr" in t:
-        probable, analysis, steps = _plan_vpc_privatelink_cidr_missing(cloud_guess)
+    rule = rule_engine.evaluate(text).first("plan")
+    if rule is not None:
+        tpl = rule.render("plan", region=region, cloud=cloud_guess)
+        probable, analysis, steps = tpl.get("probable_cause", ""), tpl.get("analysis_text", ""), tpl.get("steps", [])
     else:
         probable, analysis, steps = _default_plan(text)
 
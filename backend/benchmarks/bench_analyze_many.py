@@ -0,0 +1,126 @@
+"""
+Wall time of replaying an alert backlog through POST /api/alerts/batch
+(incident_engine.analyze_many) versus analyzing the same alerts one at a
+time, as handle_otel would.
+
+    python benchmarks/bench_analyze_many.py --alerts 5000 --latency-ms 1000 --concurrency 16
+
+Runs in-process against a temporary DB with a stub LLM client that sleeps
+--latency-ms per call and fails --error-rate of them (exercising retries).
+The serial figure is measured on --serial-sample alerts and extrapolated.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("INCIDENTS_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="klynx-bench-"), "incidents.db"))
+
+_ANSWER = json.dumps({
+    "severity": "SEV-2",
+    "summary": "Upstream errors on the checkout service",
+    "cloud_provider": "aws",
+    "region": "us-east-1",
+    "probable_cause": ["unhealthy targets"],
+    "suggested_steps": ["check target health"],
+    "auto_fix_plan": [],
+})
+
+
+class _StubLLM:
+    def __init__(self, latency_s: float, error_rate: float) -> None:
+        self.latency_s = latency_s
+        self.error_rate = error_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(21)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, stream: bool = False, **kwargs: Any) -> Any:
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.error_rate
+        time.sleep(self.latency_s)
+        if fail:
+            raise RuntimeError("stub LLM: 503")
+        if stream:
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=_ANSWER))])])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=_ANSWER))])
+
+
+def backlog(n: int, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    services = ["checkout", "payments", "ledger", "search", "auth", "gateway", "billing", "ingest"]
+    symptoms = ["5xx ratio", "latency p99", "crashloop", "disk pressure", "consumer lag", "oom kills"]
+    return [
+        {
+            "name": f"{rng.choice(services)} {rng.choice(symptoms)} alert #{i}",
+            "severity": rng.choice(["critical", "warning"]),
+            # Distinct wording per alert so each one needs its own analysis.
+            "description": " ".join(rng.choice(services + symptoms) for _ in range(12)) + f" shard {i}",
+        }
+        for i in range(n)
+    ]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--alerts", type=int, default=5000)
+    ap.add_argument("--latency-ms", type=float, default=1000)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--error-rate", type=float, default=0.02)
+    ap.add_argument("--serial-sample", type=int, default=5)
+    args = ap.parse_args()
+
+    os.environ["KLYNX_LLM_BATCH_CONCURRENCY"] = str(args.concurrency)
+    os.environ.setdefault("KLYNX_ANALYSIS_CACHE_DB", "false")
+    os.environ.setdefault("KLYNX_LLM_BATCH_DEADLINE_S", str(max(30.0, args.latency_ms / 1000 * 8)))
+
+    import httpx
+
+    import incident_engine
+    import main
+    import otel_handler
+
+    stub = _StubLLM(args.latency_ms / 1000.0, args.error_rate)
+    incident_engine._openai_client = stub
+    alerts = backlog(args.alerts)
+
+    async def serial() -> float:
+        start = time.perf_counter()
+        for a in alerts[-args.serial_sample:]:
+            await incident_engine.analyze_many([otel_handler._alert_line(otel_handler.OTelAlert(**a))], concurrency=1)
+        return (time.perf_counter() - start) / args.serial_sample
+
+    async def batch() -> Any:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            start = time.perf_counter()
+            resp = await client.post("/api/alerts/batch", json={"alerts": alerts[:-args.serial_sample]})
+            return resp.json(), time.perf_counter() - start
+
+    per_item = asyncio.run(serial())
+    stub.calls = 0
+    body, elapsed = asyncio.run(batch())
+    n = args.alerts - args.serial_sample
+    print(f"{n} alerts, stub LLM {args.latency_ms:.0f} ms/call, {args.error_rate:.0%} errors")
+    print(f"serial (extrapolated): {per_item * n:8.1f} s")
+    print(
+        f"batch, concurrency {args.concurrency:>3}: {elapsed:8.1f} s  "
+        f"({per_item * n / elapsed:.1f}x, {stub.calls} LLM calls, sources {body.get('sources')}, "
+        f"incidents {body.get('incidents')}, duplicates {body.get('duplicates')})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+On-disk size and read/write throughput of the incidents DB per blob codec
+(INCIDENTS_BLOB_CODEC=none|zlib|zstd).
+
+    python benchmarks/bench_blob_codec.py --incidents 5000
+
+Each codec runs in a fresh subprocess against its own temporary DB. The
+write phase saves an incident and then rewrites its plan with execution
+results, like the apply-fix flow does. The read phase fetches every
+incident by thread_ts and touches the decoded plan.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _worker(n: int) -> None:
+    sys.path.insert(0, BACKEND)
+    import history_repository as repo
+    from autofix_engine import build_plan, execute_plan
+
+    text = (
+        "PrivateLink CIDR missing while creating VPC in us-east-1; terraform apply failed with "
+        "InvalidParameterValue for vpc-0abc123 subnet-0def456. Errors spike across checkout. "
+    )
+    repo.init_db()
+
+    start = time.perf_counter()
+    for i in range(n):
+        plan = build_plan(text + str(i))
+        analysis = "\n".join(f"- step {k}: {s['title']} ({s['risk']}) {s['dry_run_cmd']}" for k, s in enumerate(plan["steps"])) * 4
+        repo.save_incident(
+            incident_id=f"INC-{i:08d}",
+            thread_ts=f"bench.{i:08d}",
+            channel_id="C123",
+            severity=plan["meta"]["severity"],
+            summary=plan["meta"]["summary"],
+            cloud=plan["meta"]["cloud"],
+            region=plan["meta"]["region"],
+            resources="vpc-0abc123,subnet-0def456",
+            probable_cause=plan["probable_cause"],
+            analysis_text=analysis + plan["analysis_text"],
+            plan=plan,
+        )
+        plan["execution"] = execute_plan(plan, dry_run=True)
+        repo.update_incident_plan(f"bench.{i:08d}", plan)
+    write_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(n):
+        inc = repo.get_incident_by_thread_ts(f"bench.{i:08d}")
+        assert inc["plan"]["execution"]["results"]
+    read_s = time.perf_counter() - start
+
+    with repo._pool.connection() as conn:
+        blob_bytes = conn.execute(
+            "SELECT SUM(LENGTH(plan_json) + LENGTH(analysis_text)) FROM incidents"
+        ).fetchone()[0]
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    repo.shutdown()
+
+    print(json.dumps({
+        "codec": repo.BLOB_CODEC,
+        "db_bytes": os.path.getsize(repo.DB_PATH),
+        "blob_bytes": blob_bytes,
+        "writes_per_s": n / write_s,
+        "reads_per_s": n / read_s,
+    }))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--incidents", type=int, default=2000)
+    ap.add_argument("--codecs", default="none,zlib,zstd")
+    ap.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        _worker(args.incidents)
+        return
+
+    results = []
+    for codec in args.codecs.split(","):
+        tmp = tempfile.mkdtemp(prefix=f"klynx-codec-{codec}-")
+        env = dict(os.environ, INCIDENTS_DB_PATH=os.path.join(tmp, "incidents.db"), INCIDENTS_BLOB_CODEC=codec)
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", "--incidents", str(args.incidents)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        results.append(json.loads(out))
+
+    base = results[0]
+    print(f"{'codec':<6} {'db MB':>8} {'blob MB':>8} {'size':>6} {'writes/s':>9} {'reads/s':>9}")
+    for r in results:
+        print(
+            f"{r['codec']:<6} {r['db_bytes'] / 1e6:8.2f} {r['blob_bytes'] / 1e6:8.2f} "
+            f"{r['db_bytes'] / base['db_bytes']:6.2f} {r['writes_per_s']:9.0f} {r['reads_per_s']:9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Training cost, model size, inference latency and held-out accuracy of the
+local severity/cloud classifier (incident_classifier.py).
+
+    python benchmarks/bench_incident_classifier.py --incidents 50000
+
+Trains on synthetic labeled incidents whose labels follow the wording
+with some noise (--noise of labels are random), like a history labeled
+partly by the LLM and partly by humans.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from incident_classifier import CLOUDS, SEVERITIES, IncidentClassifier, evaluate, train  # noqa: E402
+
+_CLOUD_WORDS = {
+    "aws": ["ec2 instance", "alb target group", "rds cluster", "lambda function", "eks node group", "s3 bucket"],
+    "azure": ["app service plan", "aks pool", "cosmos db account", "azure front door", "vm scale set"],
+    "gcp": ["gke node pool", "cloud run service", "cloud sql instance", "pubsub subscription"],
+    "kubernetes": ["pod", "deployment rollout", "statefulset", "ingress controller", "kubelet"],
+    "unknown": ["service", "backend", "worker", "job runner"],
+}
+_REGIONS = {"aws": ["us-east-1", "eu-west-1"], "azure": ["eastus", "westeurope"], "gcp": ["us-central1"], "kubernetes": [""], "unknown": [""]}
+_SEVERITY_WORDS = {
+    "SEV-1": ["full outage", "all requests failing", "data loss risk", "customer facing down"],
+    "SEV-2": ["error rate above 5%", "degraded checkout", "latency p99 above slo", "partial outage"],
+    "SEV-3": ["intermittent errors", "single replica restarting", "elevated retries"],
+    "SEV-4": ["disk 80% full", "certificate expires in 20 days", "noisy alert"],
+    "SEV-5": ["question about dashboards", "test alert", "informational"],
+}
+_FILLER = "after deploy on the primary path for team payments ledger search since 10 minutes ago".split()
+
+
+def example(rng: random.Random, noise: float):
+    cloud = rng.choice(CLOUDS)
+    sev = rng.choice(SEVERITIES)
+    words = [rng.choice(_SEVERITY_WORDS[sev]), "on", rng.choice(_CLOUD_WORDS[cloud]), rng.choice(_REGIONS[cloud])]
+    words += rng.sample(_FILLER, 4)
+    rng.shuffle(words)
+    text = " ".join(w for w in words if w)
+    if rng.random() < noise:
+        sev = rng.choice(SEVERITIES)
+    if rng.random() < noise:
+        cloud = rng.choice(CLOUDS)
+    return text, sev, cloud
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--incidents", type=int, default=50000)
+    ap.add_argument("--noise", type=float, default=0.1)
+    ap.add_argument("--queries", type=int, default=5000)
+    args = ap.parse_args()
+
+    rng = random.Random(24)
+    rows = [example(rng, args.noise) for _ in range(args.incidents)]
+    test = [example(rng, 0.0) for _ in range(args.queries)]
+
+    start = time.perf_counter()
+    model = train(rows)
+    train_s = time.perf_counter() - start
+    path = os.path.join(tempfile.mkdtemp(prefix="klynx-clf-"), "model.npz")
+    model.save(path)
+    start = time.perf_counter()
+    model = IncidentClassifier.load(path)
+    load_ms = (time.perf_counter() - start) * 1000
+    print(
+        f"trained on {len(rows)} incidents in {train_s:.1f} s (incl. holdout fit); "
+        f"model {os.path.getsize(path) / 1024:.0f} KB, loads in {load_ms:.1f} ms"
+    )
+
+    times = []
+    for text, _, _ in test:
+        t0 = time.perf_counter()
+        model.predict(text)
+        times.append((time.perf_counter() - t0) * 1e6)
+    times.sort()
+    print(f"predict: p50 {times[len(times) // 2]:.0f} us, p99 {times[int(len(times) * 0.99)]:.0f} us")
+    print(f"held-out (noisy labels): {model.info['holdout']}")
+    print(f"clean test set:          {evaluate(model, test)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Inline cost and accuracy of near-duplicate folding (near_duplicates.py).
+
+    python benchmarks/bench_near_duplicates.py --entries 10000
+
+Fills the index with distinct synthetic alerts, then times claim() for
+re-fires (new ids/timestamps, a word or two changed) and for unrelated
+alerts, and reports how many of each were folded, plus the index's
+memory footprint.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from near_duplicates import NearDuplicateIndex  # noqa: E402
+
+_WORDS = (
+    "checkout payments ledger search catalog auth gateway billing inventory shipping ingest scheduler "
+    "kafka redis postgres nginx envoy coredns kubelet ingress upstream timeout latency error ratio "
+    "disk memory cpu pressure throttled evicted restart crashloop unhealthy targets health check failing "
+    "replication lag consumer backlog certificate expired quota exceeded connection refused dns"
+).split()
+
+
+def alert(rng: random.Random, words: int = 40) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def refire(rng: random.Random, text: str, changes: int) -> str:
+    words = text.split()
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = rng.choice(_WORDS)
+    ts = f"2026-10-{rng.randint(10, 28)}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00Z"
+    return f"<@U{rng.randint(1000, 9999)}> " + " ".join(words) + f" on i-{rng.getrandbits(64):016x} at {ts}"
+
+
+def percentile(samples, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entries", type=int, default=10000)
+    ap.add_argument("--queries", type=int, default=2000)
+    ap.add_argument("--words", type=int, default=40, help="words per alert")
+    args = ap.parse_args()
+
+    rng = random.Random(19)
+    index = NearDuplicateIndex(window_s=3600, max_entries=args.entries)
+    originals = [alert(rng, args.words) for _ in range(args.entries)]
+
+    start = time.perf_counter()
+    for i, text in enumerate(originals):
+        index.claim(text, scope="bench", key=str(i), incident_id=f"INC-{i}")
+    fill_s = time.perf_counter() - start
+
+    # Footprint from a second, traced fill (tracing distorts the timing).
+    tracemalloc.start()
+    traced = NearDuplicateIndex(window_s=3600, max_entries=args.entries)
+    for i, text in enumerate(originals):
+        traced.claim(text, scope="bench", key=str(i), incident_id=f"INC-{i}")
+    mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced
+    print(
+        f"indexed {args.entries} alerts: {fill_s / args.entries * 1e6:.0f} us/insert, "
+        f"{mem / 1e6:.1f} MB ({mem / args.entries:.0f} B/entry)"
+    )
+
+    cases = [
+        ("re-fire, ids only", lambda: refire(rng, rng.choice(originals), 0)),
+        ("re-fire, 1 word", lambda: refire(rng, rng.choice(originals), 1)),
+        ("re-fire, 3 words", lambda: refire(rng, rng.choice(originals), 3)),
+        ("unrelated", lambda: alert(rng, args.words)),
+    ]
+    print(f"{'case':<20} {'folded':>7} {'p50 us':>8} {'p99 us':>8}")
+    for name, make in cases:
+        folded, times = 0, []
+        for q in range(args.queries):
+            text = make()
+            t0 = time.perf_counter()
+            found = index.claim(text, scope="bench", key=f"q-{name}-{q}", incident_id="new")
+            times.append((time.perf_counter() - t0) * 1e6)
+            if found is not None:
+                folded += 1
+            else:
+                index.forget(f"q-{name}-{q}")
+        print(f"{name:<20} {folded / args.queries:7.1%} {percentile(times, 0.5):8.0f} {percentile(times, 0.99):8.0f}")
+
+
+if __name__ == "__main__":
+    main()
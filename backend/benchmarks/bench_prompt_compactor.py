@@ -0,0 +1,82 @@
+"""
+Prompt tokens saved by prompt_compactor, and what compaction costs, on
+typical alert payloads (stack traces, log storms, OTel batches).
+
+    python benchmarks/bench_prompt_compactor.py --budget 2000
+
+Token counts come from tiktoken when installed, else the built-in
+estimate; the saving in LLM input cost is proportional to the ratio.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompt_compactor  # noqa: E402
+from prompt_compactor import compact_alert_text  # noqa: E402
+
+
+def python_trace(depth: int) -> str:
+    frames = "".join(
+        f'  File "/srv/app/handlers/h{i}.py", line {40 + i}, in handle_{i}\n    return next_{i}(request)\n'
+        for i in range(depth)
+    )
+    return f"CheckoutService 500s in us-east-1\nTraceback (most recent call last):\n{frames}TimeoutError: upstream\n"
+
+
+def java_trace(depth: int) -> str:
+    frames = "".join(f"\tat com.acme.payments.Stage{i}.process(Stage{i}.java:{i + 10})\n" for i in range(depth))
+    return f"payments-api p99 above 2s\njava.net.SocketTimeoutException: Read timed out\n{frames}"
+
+
+def log_storm(lines: int, rng: random.Random) -> str:
+    return "".join(
+        f"2026-10-17T12:{i // 60 % 60:02d}:{i % 60:02d}Z ERROR envoy upstream reset to "
+        f"i-{rng.getrandbits(32):08x} req={rng.getrandbits(64):016x}\n"
+        for i in range(lines)
+    )
+
+
+def otel_batch(alerts: int, rng: random.Random) -> str:
+    services = ["checkout", "payments", "ledger", "search", "auth", "gateway"]
+    return "\n".join(
+        f"[critical] {rng.choice(services)} 5xx ratio above 5% - pod {rng.choice(services)}-{rng.getrandbits(24):06x} "
+        f"restarted {rng.randint(1, 9)} times"
+        for _ in range(alerts)
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--budget", type=int, default=prompt_compactor.PROMPT_MAX_TOKENS)
+    ap.add_argument("--iterations", type=int, default=50)
+    args = ap.parse_args()
+
+    rng = random.Random(22)
+    cases = [
+        ("short alert", "ALB 5xx spike on checkout in us-east-1"),
+        ("python trace x80", python_trace(80)),
+        ("java trace x200", java_trace(200)),
+        ("log storm x2000", log_storm(2000, rng)),
+        ("otel batch x200", otel_batch(200, rng)),
+        ("mixed", otel_batch(20, rng) + "\n\n" + java_trace(120) + "\n" + log_storm(500, rng)),
+    ]
+    print(f"tokenizer: {'tiktoken' if prompt_compactor.tiktoken else 'estimate'}, budget {args.budget}")
+    print(f"{'payload':<18} {'tokens':>8} {'sent':>6} {'saved':>6} {'ms':>7}")
+    for name, text in cases:
+        out = compact_alert_text(text, max_tokens=args.budget)
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            compact_alert_text(text, max_tokens=args.budget)
+        ms = (time.perf_counter() - start) / args.iterations * 1000
+        saved = 1 - out.tokens_after / out.tokens_before if out.tokens_before else 0.0
+        print(f"{name:<18} {out.tokens_before:8d} {out.tokens_after:6d} {saved:6.0%} {ms:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
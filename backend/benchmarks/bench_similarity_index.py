@@ -0,0 +1,116 @@
+"""
+Top-k similar-incident lookups over a large history (similarity_index.py).
+
+    python benchmarks/bench_similarity_index.py --incidents 1000000
+
+Loads synthetic incidents (summary, probable cause, cloud, region,
+resources) straight into a SimilarityIndex, then queries with reworded
+copies of random indexed incidents: reports build time, memory, query
+latency, and recall@k of the original against an exact full scan.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from similarity_index import SimilarityIndex, _features  # noqa: E402
+
+_SERVICES = (
+    "checkout payments ledger search catalog auth gateway billing inventory shipping notifications profile "
+    "ingest reporting scheduler kafka redis postgres mysql elasticsearch nginx envoy istio coredns etcd kubelet"
+).split()
+_SYMPTOMS = [
+    "5xx spike", "latency above slo", "crashloopbackoff", "oomkilled", "disk pressure", "consumer lag",
+    "replication lag", "certificate expired", "quota exceeded", "connection refused", "dns resolution failing",
+    "throttled requests", "node not ready", "unhealthy targets", "deadlock detected", "queue backlog growing",
+]
+_CAUSES = [
+    "bad deploy", "config drift", "expired credentials", "noisy neighbour", "upstream dependency outage",
+    "memory leak", "hot partition", "missing index", "exhausted connection pool", "security group change",
+    "subnet ip exhaustion", "autoscaling lag", "schema migration lock", "cache stampede",
+]
+_CLOUDS = {"aws": ["us-east-1", "us-west-2", "eu-west-1"], "azure": ["eastus", "westeurope"], "gcp": ["us-central1"]}
+
+
+def incident(rng: random.Random) -> str:
+    cloud = rng.choice(list(_CLOUDS))
+    svc, other = rng.sample(_SERVICES, 2)
+    return " ".join([
+        f"{svc} {rng.choice(_SYMPTOMS)} after {rng.choice(_CAUSES)} on {other} {rng.choice(_SYMPTOMS)}",
+        f"{rng.choice(_CAUSES)}; {rng.choice(_CAUSES)}",
+        cloud,
+        rng.choice(_CLOUDS[cloud]),
+        f"i-{rng.getrandbits(64):016x}",
+    ])
+
+
+def reword(rng: random.Random, text: str, changes: int) -> str:
+    words = text.split()
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = rng.choice(_SERVICES)
+    return " ".join(words)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--incidents", type=int, default=1000000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--dims", type=int, default=256)
+    ap.add_argument("--changes", type=int, default=2, help="words replaced in each query")
+    args = ap.parse_args()
+
+    rng = random.Random(23)
+    texts = [incident(rng) for _ in range(args.incidents)]
+    index = SimilarityIndex(dims=args.dims, max_items=args.incidents, min_score=0.0)
+
+    start = time.perf_counter()
+    index.load((f"INC-{i}", t) for i, t in reversed(list(enumerate(texts))))
+    build_s = time.perf_counter() - start
+    print(
+        f"{len(index)} incidents, {args.dims} dims: built in {build_s:.1f} s, "
+        f"{index._mat.nbytes / 1e6:.0f} MB"
+    )
+
+    start = time.perf_counter()
+    for i in range(1000):
+        index.add(f"NEW-{i}", incident(rng))
+    print(f"incremental add: {(time.perf_counter() - start):.3f} ms/incident")
+
+    probe_ms, exact_ms, hits, exact_hits = [], [], 0, 0
+    n = len(index._keys)
+    for _ in range(args.queries):
+        target = rng.randrange(args.incidents)
+        query = reword(rng, texts[target], args.changes)
+        t0 = time.perf_counter()
+        found = index.query(query, k=args.k)
+        probe_ms.append((time.perf_counter() - t0) * 1000)
+        hits += f"INC-{target}" in {key for key, _ in found}
+
+        t0 = time.perf_counter()
+        q = index.vector(query)
+        scores = q @ index._mat[:, :n]
+        top = np.argpartition(-scores, args.k)[: args.k]
+        exact_ms.append((time.perf_counter() - t0) * 1000)
+        exact_hits += f"INC-{target}" in {index._keys[i] for i in top}
+        del scores
+
+    def pct(xs, q):
+        return sorted(xs)[min(len(xs) - 1, int(q * len(xs)))]
+
+    print(f"{'scan':<14} {'p50 ms':>8} {'p99 ms':>8} {'recall@' + str(args.k):>10}")
+    print(f"{'probe+rerank':<14} {pct(probe_ms, .5):8.2f} {pct(probe_ms, .99):8.2f} {hits / args.queries:10.1%}")
+    print(f"{'exact':<14} {pct(exact_ms, .5):8.2f} {pct(exact_ms, .99):8.2f} {exact_hits / args.queries:10.1%}")
+    feats = _features(texts[0])[0].size
+    print(f"(~{feats} features per incident)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+p50/p99 latency of POST /api/slack/events under concurrent load, with the
+handler using the blocking history_repository calls ("before") versus
+async_repository ("after").
+
+    python benchmarks/bench_slack_events.py --requests 2000 --rate 400
+
+Runs in-process against a temporary DB (synchronous=FULL) with a stub
+Slack client. Load is open-loop: request i is due at start + i/rate and
+its latency is measured from that due time, so time spent stuck behind a
+blocked event loop is counted. --commit-latency-ms adds a sleep after each
+commit to model network/cloud block storage fsync; use 0 for local disk.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("INCIDENTS_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="klynx-bench-"), "incidents.db"))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+import async_repository  # noqa: E402
+import history_repository  # noqa: E402
+import slack_handler  # noqa: E402
+
+
+class _StubSlack:
+    def chat_postMessage(self, **kwargs: Any) -> Dict[str, Any]:
+        return {"ok": True}
+
+
+class _BlockingRepo:
+    """
+    The pre-change behaviour: async handlers calling the sync repository.
+    """
+
+    async def save_incident(self, **kwargs: Any) -> None:
+        history_repository.save_incident(**kwargs)
+
+    async def get_incident_by_thread_ts(self, thread_ts: str, fields: Any = None) -> Any:
+        return history_repository.get_incident_by_thread_ts(thread_ts, fields=fields)
+
+    async def update_incident_status(self, thread_ts: str, status: str) -> None:
+        history_repository.update_incident_status(thread_ts, status)
+
+    async def update_incident_plan(self, thread_ts: str, plan: Dict[str, Any]) -> None:
+        history_repository.update_incident_plan(thread_ts, plan)
+
+
+def _event(i: int, run: str) -> bytes:
+    return json.dumps({
+        "type": "event_callback",
+        "event": {
+            "type": "app_mention",
+            "text": f"<@U1> ALB 503 errors in us-east-1 on checkout (#{i})",
+            "channel": "C123",
+            "ts": f"{run}.{i:06d}",
+        },
+    }).encode("utf-8")
+
+
+async def _load(app: FastAPI, run: str, requests: int, rate: float) -> List[float]:
+    latencies: List[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t0 = time.perf_counter()
+
+        async def one(i: int) -> None:
+            due = t0 + i / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            r = await client.post("/api/slack/events", content=_event(i, run))
+            latencies.append((time.perf_counter() - due) * 1000.0)
+            r.raise_for_status()
+
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies
+
+
+def _slow_commits(pool: Any, latency_ms: float) -> None:
+    inner = pool.transaction
+
+    @contextmanager
+    def transaction():
+        with inner() as conn:
+            yield conn
+        time.sleep(latency_ms / 1000.0)
+
+    pool.transaction = transaction
+
+
+def _report(label: str, latencies: List[float], wall: float) -> None:
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]  # noqa: E731
+    print(
+        f"{label:<22} n={len(latencies):<6} rps={len(latencies) / wall:8.1f} "
+        f"p50={p(0.50):7.2f}ms p99={p(0.99):7.2f}ms mean={statistics.mean(latencies):7.2f}ms"
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=1000)
+    ap.add_argument("--rate", type=float, default=300.0, help="offered load, requests/second")
+    ap.add_argument("--commit-latency-ms", type=float, default=2.0)
+    ap.add_argument("--synchronous", default="FULL", help="SQLite synchronous pragma for the run")
+    args = ap.parse_args()
+
+    history_repository._pool.pragmas["synchronous"] = args.synchronous
+    history_repository.init_db()
+    if args.commit_latency_ms > 0:
+        _slow_commits(history_repository._pool, args.commit_latency_ms)
+    slack_handler.client = _StubSlack()
+    slack_handler.SLACK_SIGNING_SECRET = ""
+
+    app = FastAPI()
+    app.include_router(slack_handler.slack_router)
+
+    for label, repo in (("before (blocking)", _BlockingRepo()), ("after (async repo)", async_repository)):
+        slack_handler.incidents_db = repo
+        start = time.perf_counter()
+        latencies = asyncio.run(_load(app, label.split()[0], args.requests, args.rate))
+        _report(label, latencies, time.perf_counter() - start)
+
+    print(f"db: {history_repository.DB_PATH}")
+
+
+if __name__ == "__main__":
+    main()
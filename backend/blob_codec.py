@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import zlib
+from typing import Any, Optional
+
+try:
+    import zstandard  # type: ignore
+    _zstd_c = zstandard.ZstdCompressor(level=3)
+    _zstd_d = zstandard.ZstdDecompressor()
+except Exception:
+    zstandard = None
+    _zstd_c = _zstd_d = None
+
+_logger = logging.getLogger("klynx.blob_codec")
+
+# Compressed values are BLOBs that start with a 4-byte codec marker.
+# Anything stored as TEXT is a legacy/plain value and is returned as-is,
+# so rows written before compression was turned on stay readable.
+_ZSTD = b"KZS1"
+_ZLIB = b"KZL1"
+
+CODECS = ("none", "zlib", "zstd")
+
+
+def resolve_codec(name: str) -> str:
+    name = (name or "none").strip().lower()
+    if name not in CODECS:
+        raise ValueError(f"Unknown blob codec: {name} (expected one of {', '.join(CODECS)})")
+    if name == "zstd" and _zstd_c is None:
+        _logger.warning("zstandard is not installed; using zlib for blob compression")
+        return "zlib"
+    return name
+
+
+def best_codec() -> str:
+    return "zstd" if _zstd_c is not None else "zlib"
+
+
+def encode_text(value: Optional[str], codec: str) -> Any:
+    if value is None or codec == "none":
+        return value
+    raw = value.encode("utf-8")
+    if codec == "zstd":
+        return _ZSTD + _zstd_c.compress(raw)
+    return _ZLIB + zlib.compress(raw, 6)
+
+
+def decode_text(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    blob = bytes(value)
+    marker, body = blob[:4], blob[4:]
+    if marker == _ZLIB:
+        return zlib.decompress(body).decode("utf-8")
+    if marker == _ZSTD:
+        if _zstd_d is None:
+            raise RuntimeError("value is zstd-compressed but the zstandard package is not installed")
+        return _zstd_d.decompress(body).decode("utf-8")
+    return blob.decode("utf-8")
+
+
+def codec_of(value: Any) -> str:
+    if isinstance(value, (bytes, memoryview)):
+        marker = bytes(value[:4])
+        if marker == _ZSTD:
+            return "zstd"
+        if marker == _ZLIB:
+            return "zlib"
+    return "none"
+
+
+def register_sql_functions(conn: sqlite3.Connection) -> None:
+    """
+    klynx_text(x) decodes a stored value inside SQL (FTS triggers, views,
+    JSON patches) and klynx_encode(x, codec) re-encodes one. Any connection
+    that writes to the incidents DB needs them.
+    """
+    conn.create_function("klynx_text", 1, decode_text, deterministic=True)
+    conn.create_function("klynx_encode", 2, encode_text, deterministic=True)
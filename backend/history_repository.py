@@ -1,18 +1,105 @@
 import os
+import re
 import json
+import atexit
+import base64
+import logging
 import sqlite3
-from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+from itertools import product
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from blob_codec import codec_of, decode_text, encode_text, register_sql_functions, resolve_codec
+from incident_archive import IncidentArchive
+from incident_cache import IncidentCache
+from sqlite_pool import SQLitePool
+from write_behind import WriteBehindQueue
 
 DB_PATH = os.getenv("INCIDENTS_DB_PATH", os.path.join(os.path.dirname(__file__), "data", "incidents.db"))
+DB_POOL_SIZE = int(os.getenv("INCIDENTS_DB_POOL_SIZE", "32"))
+
+# Retention: incidents older than RETENTION_DAYS are moved to a compressed
+# archive DB by a background job. 0 disables the job.
+ARCHIVE_DB_PATH = os.getenv(
+    "INCIDENTS_ARCHIVE_DB_PATH", os.path.join(os.path.dirname(DB_PATH), "incidents_archive.db")
+)
+RETENTION_DAYS = float(os.getenv("INCIDENTS_RETENTION_DAYS", "0"))
+RETENTION_BATCH = int(os.getenv("INCIDENTS_RETENTION_BATCH", "200"))
+RETENTION_INTERVAL_S = float(os.getenv("INCIDENTS_RETENTION_INTERVAL_S", "3600"))
+RETENTION_PAUSE_MS = float(os.getenv("INCIDENTS_RETENTION_PAUSE_MS", "50"))
+
+# Statuses that count as resolved: moving into one stamps resolved_at, which
+# MTTR in the stats rollups is measured to. A dry run resolves nothing.
+RESOLVED_STATUSES = tuple(
+    s.strip()
+    for s in os.getenv("INCIDENTS_RESOLVED_STATUSES", "resolved,closed,fix_applied").split(",")
+    if s.strip()
+)
+
+# Optional write-behind mode: writes are queued and group-committed.
+WRITE_BEHIND = os.getenv("INCIDENTS_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+WRITE_BEHIND_INTERVAL_MS = int(os.getenv("INCIDENTS_WRITE_BEHIND_INTERVAL_MS", "50"))
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("INCIDENTS_WRITE_BEHIND_MAX_BATCH", "256"))
+
+# Opt-in compression for the plan_json/analysis_text columns: none|zlib|zstd.
+# Plain rows stay readable under any setting; the migrator converts them.
+BLOB_CODEC = resolve_codec(os.getenv("INCIDENTS_BLOB_CODEC", "none"))
+BLOB_CODEC_MIGRATE = os.getenv("INCIDENTS_BLOB_CODEC_MIGRATE", "false").lower() in ("1", "true", "yes")
+BLOB_COLUMNS = ("analysis_text", "plan_json")
+
+# Read-through cache for get_incident_by_thread_ts. 0 entries disables it.
+CACHE_ENTRIES = int(os.getenv("INCIDENTS_CACHE_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("INCIDENTS_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CACHE_TTL_S = float(os.getenv("INCIDENTS_CACHE_TTL_S", "60"))
+
+_pool = SQLitePool(
+    DB_PATH, name="incidents_db_pool", max_connections=DB_POOL_SIZE, on_connect=register_sql_functions
+)
+_migrated = False
+_migrate_lock = threading.Lock()
+_write_behind: Optional[WriteBehindQueue] = None
+_logger = logging.getLogger("klynx.history_repository")
+_retention_stop = threading.Event()
+_retention_thread: Optional[threading.Thread] = None
+_codec = BLOB_CODEC
+_cache = IncidentCache(max_entries=CACHE_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl_s=CACHE_TTL_S)
+_codec_stop = threading.Event()
+_change_listeners: List[Callable[[List[str]], None]] = []
+_status_listeners: List[Callable[[str, str], None]] = []
+_codec_thread: Optional[threading.Thread] = None
 
 # ---- DB helpers ----
 
-def _connect() -> sqlite3.Connection:
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Column name -> SQL type
+INCIDENT_COLUMNS = {
+    "id": "TEXT",
+    "thread_ts": "TEXT",
+    "channel_id": "TEXT",
+    "created_at": "TEXT",
+    "status": "TEXT",
+    "severity": "TEXT",
+    "summary": "TEXT",
+    "cloud": "TEXT",
+    "region": "TEXT",
+    "resources": "TEXT",
+    "probable_cause": "TEXT",
+    "analysis_text": "TEXT",
+    "plan_json": "TEXT",
+    "last_updated_at": "TEXT",
+    "resolved_at": "TEXT",
+    # The alert/message text the incident was opened from, as received.
+    "raw_text": "TEXT",
+}
+
+_archive = IncidentArchive(ARCHIVE_DB_PATH, INCIDENT_COLUMNS)
+
+# Cheap columns for list views; excludes the multi-KB analysis_text/plan_json blobs.
+SUMMARY_FIELDS = (
+    "id", "thread_ts", "channel_id", "created_at", "status", "severity",
+    "summary", "cloud", "region", "last_updated_at", "resolved_at",
+)
 
 def _table_cols(conn: sqlite3.Connection, table: str) -> Dict[str, str]:
     cur = conn.cursor()
@@ -42,7 +129,6 @@ def _ensure_table(conn: sqlite3.Connection) -> None:
         last_updated_at TEXT
     )
     """)
-    conn.commit()
 
 def _ensure_columns(conn: sqlite3.Connection) -> None:
     """
@@ -53,39 +139,633 @@ def _ensure_columns(conn: sqlite3.Connection) -> None:
     _ensure_table(conn)
     existing = _table_cols(conn, "incidents")
 
-    # Column name -> SQL type
-    required = {
-        "id": "TEXT",
-        "thread_ts": "TEXT",
-        "channel_id": "TEXT",
-        "created_at": "TEXT",
-        "status": "TEXT",
-        "severity": "TEXT",
-        "summary": "TEXT",
-        "cloud": "TEXT",
-        "region": "TEXT",
-        "resources": "TEXT",
-        "probable_cause": "TEXT",
-        "analysis_text": "TEXT",
-        "plan_json": "TEXT",
-        "last_updated_at": "TEXT",
-    }
-
     cur = conn.cursor()
-    for col, ctype in required.items():
+    for col, ctype in INCIDENT_COLUMNS.items():
         if col not in existing:
             cur.execute(f"ALTER TABLE incidents ADD COLUMN {col} {ctype}")
-    conn.commit()
+
+# Columns the list API can filter on. Each gets a composite index ending in
+# (created_at, id) so a filtered page is a single index range scan.
+FILTER_COLUMNS = ("status", "severity", "cloud", "region", "channel_id")
+# Filter combinations the dashboard uses together (open incidents by
+# severity, a channel's open incidents) get their own index too; other
+# combinations scan the first column's index and check the rest per row.
+FILTER_COMBINATIONS = (("status", "severity"), ("channel_id", "status"))
+# A multi-value keyset filter runs one range scan per value combination;
+# beyond this many combinations it falls back to IN (...).
+_MAX_KEYSET_BRANCHES = 16
+
+def _ensure_indexes(conn: sqlite3.Connection) -> None:
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_incidents_created ON incidents (created_at DESC, id DESC)")
+    for col in FILTER_COLUMNS:
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_incidents_{col}_created ON incidents ({col}, created_at DESC, id DESC)"
+        )
+    for cols in FILTER_COMBINATIONS:
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_incidents_{'_'.join(cols)}_created "
+            f"ON incidents ({', '.join(cols)}, created_at DESC, id DESC)"
+        )
+
+# Text columns indexed for full-text search, with their bm25 weights.
+FTS_COLUMNS = (("summary", 10.0), ("probable_cause", 5.0), ("analysis_text", 1.0))
+
+def _ensure_fts(conn: sqlite3.Connection) -> None:
+    """
+    External-content FTS5 index over incidents, kept in sync by triggers.
+
+    The content source is a view that runs stored values through
+    klynx_text(), so compressed analysis_text is indexed (and snippeted) as
+    plain text. Needs recursive_triggers so INSERT OR REPLACE fires the
+    delete trigger.
+    """
+    existing = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'incidents_fts'"
+    ).fetchone()
+    cols = ", ".join(c for c, _ in FTS_COLUMNS)
+    src_cols = ", ".join(f"klynx_text({c}) AS {c}" for c, _ in FTS_COLUMNS)
+    new_vals = ", ".join(f"klynx_text(new.{c})" for c, _ in FTS_COLUMNS)
+    old_vals = ", ".join(f"klynx_text(old.{c})" for c, _ in FTS_COLUMNS)
+
+    rebuild = existing is None
+    if existing is not None and "incidents_fts_src" not in existing["sql"]:
+        # Index created before the decoding view existed: recreate it.
+        conn.execute("DROP TABLE incidents_fts")
+        rebuild = True
+
+    conn.execute(
+        f"CREATE VIEW IF NOT EXISTS incidents_fts_src AS "
+        f"SELECT rowid AS incident_rowid, {src_cols} FROM incidents"
+    )
+    conn.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS incidents_fts USING fts5("
+        f"{cols}, content='incidents_fts_src', content_rowid='incident_rowid', "
+        f"tokenize='unicode61 remove_diacritics 2')"
+    )
+    # Triggers are recreated on every migration so definition changes reach existing DBs.
+    for name in ("incidents_fts_ai", "incidents_fts_ad", "incidents_fts_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute(f"""
+    CREATE TRIGGER incidents_fts_ai AFTER INSERT ON incidents BEGIN
+        INSERT INTO incidents_fts(rowid, {cols}) VALUES (new.rowid, {new_vals});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER incidents_fts_ad AFTER DELETE ON incidents BEGIN
+        INSERT INTO incidents_fts(incidents_fts, rowid, {cols}) VALUES ('delete', old.rowid, {old_vals});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER incidents_fts_au AFTER UPDATE OF {cols} ON incidents BEGIN
+        INSERT INTO incidents_fts(incidents_fts, rowid, {cols}) VALUES ('delete', old.rowid, {old_vals});
+        INSERT INTO incidents_fts(rowid, {cols}) VALUES (new.rowid, {new_vals});
+    END
+    """)
+    if rebuild:
+        # First run on an existing DB: index the rows already there.
+        conn.execute("INSERT INTO incidents_fts(incidents_fts) VALUES ('rebuild')")
+
+# Rollup grains -> length of the created_at prefix that names the bucket
+# ("2026-01-31T09" for hour, "2026-01-31" for day).
+STATS_GRAINS = {"hour": 13, "day": 10}
+
+def _ensure_stats(conn: sqlite3.Connection) -> None:
+    """
+    incident_stats holds per (grain, bucket, severity, status, cloud) counts
+    and the summed time to resolve (resolved_at - created_at, seconds; 0
+    while unresolved). Triggers move an incident between cells as it is
+    inserted, updated or deleted, so reads never touch the base table.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'incident_stats'"
+    ).fetchone()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS incident_stats (
+        grain TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        severity TEXT NOT NULL,
+        status TEXT NOT NULL,
+        cloud TEXT NOT NULL,
+        incidents INTEGER NOT NULL DEFAULT 0,
+        open_seconds REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (grain, bucket, severity, status, cloud)
+    ) WITHOUT ROWID
+    """)
+
+    def cell(row: str, grain: str, prefix_len: int, sign: str) -> str:
+        return f"""
+        INSERT INTO incident_stats (grain, bucket, severity, status, cloud, incidents, open_seconds)
+        VALUES (
+            '{grain}',
+            COALESCE(substr({row}.created_at, 1, {prefix_len}), 'unknown'),
+            COALESCE({row}.severity, 'unknown'),
+            COALESCE({row}.status, 'unknown'),
+            COALESCE({row}.cloud, 'unknown'),
+            {sign}1,
+            {sign}COALESCE((julianday({row}.resolved_at) - julianday({row}.created_at)) * 86400.0, 0)
+        )
+        ON CONFLICT (grain, bucket, severity, status, cloud) DO UPDATE SET
+            incidents = incidents + excluded.incidents,
+            open_seconds = open_seconds + excluded.open_seconds;
+        """
+
+    add_new = "".join(cell("new", g, n, "") for g, n in STATS_GRAINS.items())
+    remove_old = "".join(cell("old", g, n, "-") for g, n in STATS_GRAINS.items())
+    # Recreated on every migration so definition changes reach existing DBs.
+    for name in ("incident_stats_ai", "incident_stats_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute(f"CREATE TRIGGER incident_stats_ai AFTER INSERT ON incidents BEGIN {add_new} END")
+    # Rows moved to the archive by the retention job stay in the rollups: the
+    # job raises the 'archiving' flag inside its delete transaction.
+    conn.execute("CREATE TABLE IF NOT EXISTS repo_flags (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)")
+    conn.execute("INSERT OR IGNORE INTO repo_flags (name, value) VALUES ('archiving', 0)")
+    conn.execute("DROP TRIGGER IF EXISTS incident_stats_ad")
+    conn.execute(
+        "CREATE TRIGGER incident_stats_ad AFTER DELETE ON incidents "
+        "WHEN COALESCE((SELECT value FROM repo_flags WHERE name = 'archiving'), 0) = 0 "
+        f"BEGIN {remove_old} END"
+    )
+    conn.execute(
+        "CREATE TRIGGER incident_stats_au "
+        "AFTER UPDATE OF status, severity, cloud, created_at, resolved_at ON incidents "
+        f"BEGIN {remove_old} {add_new} END"
+    )
+
+    if not exists:
+        # First run on an existing DB: seed the rollups with one scan.
+        _seed_stats(conn)
+
+def _seed_stats(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM incident_stats")
+    for grain, prefix_len in STATS_GRAINS.items():
+        conn.execute(f"""
+        INSERT INTO incident_stats (grain, bucket, severity, status, cloud, incidents, open_seconds)
+        SELECT
+            '{grain}',
+            COALESCE(substr(created_at, 1, {prefix_len}), 'unknown'),
+            COALESCE(severity, 'unknown'),
+            COALESCE(status, 'unknown'),
+            COALESCE(cloud, 'unknown'),
+            COUNT(*),
+            SUM(COALESCE((julianday(resolved_at) - julianday(created_at)) * 86400.0, 0))
+        FROM incidents
+        GROUP BY 2, 3, 4, 5
+        """)
+
+def _ensure_resolved_at(conn: sqlite3.Connection) -> None:
+    """
+    resolved_at is stamped by triggers when an incident's status moves
+    into RESOLVED_STATUSES (resolved -> closed keeps the first stamp) and
+    cleared when it is reopened, so later notes or plan patches do not
+    move it. Triggers are recreated on every migration so a changed
+    INCIDENTS_RESOLVED_STATUSES applies to future transitions.
+    """
+    resolved = ", ".join("'" + s.replace("'", "''") + "'" for s in RESOLVED_STATUSES) or "NULL"
+    for name in ("incidents_resolved_ai", "incidents_resolved_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute(f"""
+    CREATE TRIGGER incidents_resolved_ai AFTER INSERT ON incidents
+    WHEN new.status IN ({resolved}) AND new.resolved_at IS NULL BEGIN
+        UPDATE incidents SET resolved_at = COALESCE(new.last_updated_at, new.created_at) WHERE rowid = new.rowid;
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER incidents_resolved_au AFTER UPDATE OF status ON incidents
+    WHEN new.status IS NOT old.status BEGIN
+        UPDATE incidents SET resolved_at = CASE
+            WHEN new.status NOT IN ({resolved}) THEN NULL
+            WHEN old.status IN ({resolved}) AND old.resolved_at IS NOT NULL THEN old.resolved_at
+            ELSE COALESCE(new.last_updated_at, new.created_at)
+        END
+        WHERE rowid = new.rowid;
+    END
+    """)
+    done = conn.execute("SELECT value FROM repo_flags WHERE name = 'resolved_at_backfilled'").fetchone()
+    if done is None:
+        # Existing DB: date each resolved incident by the timeline event
+        # that moved it into its status, else its last update, and rebuild
+        # the rollups that measured MTTR to last_updated_at.
+        conn.execute(f"""
+        UPDATE incidents SET resolved_at = COALESCE(
+            (SELECT MIN(e.at) FROM incident_events e
+             WHERE e.incident_id = incidents.id AND json_extract(e.data, '$.to') = incidents.status),
+            last_updated_at, created_at)
+        WHERE status IN ({resolved}) AND resolved_at IS NULL
+        """)
+        _seed_stats(conn)
+        conn.execute("INSERT INTO repo_flags (name, value) VALUES ('resolved_at_backfilled', 1)")
+
+def _ensure_change_feed(conn: sqlite3.Connection) -> None:
+    """
+    change_seq is a monotonic per-write sequence (repo_flags 'change_seq' is
+    the counter) stamped by triggers on every insert and on every update
+    that moves last_updated_at, so the change feed is a single range scan.
+    """
+    added = "change_seq" not in _table_cols(conn, "incidents")
+    if added:
+        conn.execute("ALTER TABLE incidents ADD COLUMN change_seq INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_incidents_change_seq ON incidents (change_seq)")
+    conn.execute("INSERT OR IGNORE INTO repo_flags (name, value) VALUES ('change_seq', 0)")
+    if added:
+        # Existing rows get sequence numbers in last-modified order.
+        conn.execute("""
+        UPDATE incidents SET change_seq = ordered.n
+        FROM (SELECT rowid AS rid, ROW_NUMBER() OVER (ORDER BY last_updated_at, rowid) AS n FROM incidents) AS ordered
+        WHERE ordered.rid = incidents.rowid
+        """)
+        conn.execute(
+            "UPDATE repo_flags SET value = (SELECT COALESCE(MAX(change_seq), 0) FROM incidents) "
+            "WHERE name = 'change_seq'"
+        )
+
+    stamp = """
+        UPDATE repo_flags SET value = value + 1 WHERE name = 'change_seq';
+        UPDATE incidents SET change_seq = (SELECT value FROM repo_flags WHERE name = 'change_seq')
+        WHERE rowid = new.rowid;
+    """
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS incidents_seq_ai AFTER INSERT ON incidents BEGIN {stamp} END")
+    # Only last_updated_at: background rewrites (codec migration) are not changes.
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS incidents_seq_au AFTER UPDATE OF last_updated_at ON incidents BEGIN {stamp} END"
+    )
+
+def _ensure_resources(conn: sqlite3.Connection) -> None:
+    """
+    incident_resources normalizes the comma-separated `resources` column
+    into one row per (resource_id, incident_id), so lookups by resource
+    are index seeks. Each row carries its incident's created_at so a page
+    of a resource's incidents is read newest-first straight from
+    idx_incident_resources_recent. Rows follow their incident (delete,
+    created_at change) via triggers.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'incident_resources'"
+    ).fetchone()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS incident_resources (
+        resource_id TEXT NOT NULL,
+        incident_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        created_at TEXT,
+        PRIMARY KEY (resource_id, incident_id)
+    ) WITHOUT ROWID
+    """)
+    if exists and "created_at" not in _table_cols(conn, "incident_resources"):
+        conn.execute("ALTER TABLE incident_resources ADD COLUMN created_at TEXT")
+        conn.execute(
+            "UPDATE incident_resources SET created_at = "
+            "(SELECT created_at FROM incidents WHERE incidents.id = incident_resources.incident_id)"
+        )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_incident_resources_incident ON incident_resources (incident_id)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_incident_resources_recent "
+        "ON incident_resources (resource_id, created_at DESC, incident_id DESC)"
+    )
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS incident_resources_ad AFTER DELETE ON incidents BEGIN
+        DELETE FROM incident_resources WHERE incident_id = old.id;
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS incident_resources_au AFTER UPDATE OF created_at ON incidents BEGIN
+        UPDATE incident_resources SET created_at = new.created_at WHERE incident_id = new.id;
+    END
+    """)
+    if not exists:
+        # First run on an existing DB: index the resources already stored.
+        for row in conn.execute(
+            "SELECT id, resources, created_at FROM incidents "
+            "WHERE id IS NOT NULL AND resources IS NOT NULL AND resources != ''"
+        ).fetchall():
+            _store_resources(conn, row["id"], row["resources"], row["created_at"])
+
+def _ensure_events(conn: sqlite3.Connection) -> None:
+    """
+    incident_events is the append-only timeline: one small row per change,
+    clustered by (incident_id, seq) so a timeline page is one range read.
+    `data` is compact JSON; large values (analysis text, plans) are
+    summarized, not copied.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS incident_events (
+        incident_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        at TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        actor TEXT,
+        data TEXT,
+        PRIMARY KEY (incident_id, seq)
+    ) WITHOUT ROWID
+    """)
+
+def _ensure_analysis_cache(conn: sqlite3.Connection) -> None:
+    """
+    analysis_cache holds LLM analyses keyed by a hash of the normalized
+    alert text, shared by every worker on this DB. Rows past expires_at
+    (unix seconds) are ignored on read and purged by put_cached_analysis.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS analysis_cache (
+        key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        data TEXT NOT NULL
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_cache_expires ON analysis_cache (expires_at)")
 
 def init_db() -> None:
-    conn = _connect()
+    """
+    Run schema migration once per process. Safe to call repeatedly.
+    """
+    global _migrated
+    if _migrated:
+        return
+    with _migrate_lock:
+        if _migrated:
+            return
+        with _pool.transaction() as conn:
+            _ensure_columns(conn)
+            _ensure_indexes(conn)
+            _ensure_fts(conn)
+            _ensure_stats(conn)
+            _ensure_change_feed(conn)
+            _ensure_resources(conn)
+            _ensure_events(conn)
+            _ensure_resolved_at(conn)
+            _ensure_analysis_cache(conn)
+        _migrated = True
+    if WRITE_BEHIND:
+        enable_write_behind()
+
+def _read():
+    init_db()
+    return _pool.connection()
+
+def _apply(thread_ts: str, op: Callable[[sqlite3.Connection], None]) -> None:
+    """
+    Run a write in its own transaction, or queue it for the next group
+    commit when write-behind mode is on.
+    """
+    init_db()
+    if _write_behind is not None:
+        _write_behind.submit(thread_ts, op)
+        return
+    with _pool.transaction() as conn:
+        op(conn)
+    _after_commit([thread_ts])
+
+def _after_commit(thread_ts_list: List[str]) -> None:
+    for ts in thread_ts_list:
+        _cache.invalidate(ts)
+    for listener in list(_change_listeners):
+        try:
+            listener(thread_ts_list)
+        except Exception:
+            _logger.exception("change listener failed")
+
+def add_change_listener(fn: Callable[[List[str]], None]) -> None:
+    """
+    Call `fn(thread_ts_list)` after every commit in this process. It runs on
+    the writing thread, so it must be quick and must not block.
+    """
+    _change_listeners.append(fn)
+
+def remove_change_listener(fn: Callable[[List[str]], None]) -> None:
     try:
-        _ensure_columns(conn)
-    finally:
-        conn.close()
+        _change_listeners.remove(fn)
+    except ValueError:
+        pass
+
+def add_status_listener(fn: Callable[[str, str], None]) -> None:
+    """
+    Call `fn(thread_ts, status)` after an incident's status is changed in
+    this process (update_incident_status, patch_incident_plan). Same rules
+    as change listeners: quick and non-blocking.
+    """
+    _status_listeners.append(fn)
+
+def _status_changed(thread_ts: str, status: str) -> None:
+    for listener in list(_status_listeners):
+        try:
+            listener(thread_ts, status)
+        except Exception:
+            _logger.exception("status listener failed")
+
+def enable_write_behind(
+    flush_interval_ms: int = WRITE_BEHIND_INTERVAL_MS,
+    max_batch: int = WRITE_BEHIND_MAX_BATCH,
+) -> None:
+    """
+    Switch writes to a single background writer that commits every
+    `flush_interval_ms` or `max_batch` ops, whichever comes first.
+    Reads by thread_ts wait for that incident's queued writes, so callers
+    always see their own writes; list queries may lag by one interval.
+    """
+    global _write_behind
+    with _migrate_lock:
+        if _write_behind is not None:
+            return
+        _write_behind = WriteBehindQueue(
+            _pool,
+            name="incidents_write_behind",
+            flush_interval_ms=flush_interval_ms,
+            max_batch=max_batch,
+            on_commit=_after_commit,
+        )
+    atexit.register(shutdown)
+
+def flush_writes(timeout: Optional[float] = None) -> None:
+    if _write_behind is not None:
+        _write_behind.flush(timeout)
+
+def pool_stats() -> Dict[str, Any]:
+    stats = _pool.stats()
+    stats["blob_codec"] = _codec
+    stats["cache"] = _cache.stats()
+    if _write_behind is not None:
+        stats["write_behind"] = _write_behind.stats()
+    return stats
+
+def close_db() -> None:
+    _pool.close_all()
+
+def shutdown() -> None:
+    """
+    Flush queued writes and close pooled connections.
+    """
+    global _write_behind
+    stop_retention_worker()
+    stop_codec_migration()
+    wb, _write_behind = _write_behind, None
+    if wb is not None:
+        wb.close()
+    close_db()
+    _archive.close()
 
 # ---- CRUD ----
 
+_NO_PLAN = object()
+
+class IncidentRecord(dict):
+    """
+    Incident row as a plain dict. `plan` is decoded from `plan_json` on first
+    access (or when the record is iterated/serialized), not when it is read.
+    """
+
+    def __init__(self, data: Dict[str, Any], plan_json: Any = _NO_PLAN) -> None:
+        super().__init__(data)
+        self._plan_json = plan_json
+
+    def _decode_plan(self) -> Dict[str, Any]:
+        raw, self._plan_json = self._plan_json, _NO_PLAN
+        plan: Dict[str, Any] = {}
+        if raw:
+            try:
+                plan = json.loads(decode_text(raw))
+            except Exception:
+                plan = {}
+        dict.__setitem__(self, "plan", plan)
+        return plan
+
+    def _materialize(self) -> None:
+        if self._plan_json is not _NO_PLAN:
+            self._decode_plan()
+
+    def __missing__(self, key: str) -> Any:
+        if key == "plan" and self._plan_json is not _NO_PLAN:
+            return self._decode_plan()
+        raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return dict.__contains__(self, key) or (key == "plan" and self._plan_json is not _NO_PLAN)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self else default
+
+    def __iter__(self):
+        self._materialize()
+        return dict.__iter__(self)
+
+    def __len__(self) -> int:
+        self._materialize()
+        return dict.__len__(self)
+
+    def keys(self):
+        self._materialize()
+        return dict.keys(self)
+
+    def values(self):
+        self._materialize()
+        return dict.values(self)
+
+    def items(self):
+        self._materialize()
+        return dict.items(self)
+
+def resolve_fields(fields: Any = None) -> Optional[Tuple[str, ...]]:
+    """
+    Normalize a projection: None/"all" -> every column plus `plan`,
+    "summary" -> SUMMARY_FIELDS, otherwise a list or comma-separated string
+    of column names (and/or "plan"). `id` and `created_at` are always kept
+    because pagination needs them.
+    """
+    if fields is None or fields == "all":
+        return None
+    if fields == "summary":
+        return SUMMARY_FIELDS
+    names = fields.split(",") if isinstance(fields, str) else list(fields)
+    out: List[str] = ["id", "created_at"]
+    for name in names:
+        name = name.strip()
+        if not name or name in out:
+            continue
+        if name != "plan" and name not in INCIDENT_COLUMNS:
+            raise ValueError(f"Unknown field: {name}")
+        out.append(name)
+    return tuple(out)
+
+def _select_list(fields: Optional[Tuple[str, ...]]) -> str:
+    if fields is None:
+        return "*"
+    cols = [f for f in fields if f != "plan"]
+    if "plan" in fields and "plan_json" not in cols:
+        cols.append("plan_json")
+    return ", ".join(cols)
+
+def _project_row(row: Dict[str, Any], fields: Optional[Tuple[str, ...]]) -> Dict[str, Any]:
+    if fields is None:
+        return row
+    cols = set(_select_list(fields).split(", "))
+    return {k: v for k, v in row.items() if k in cols}
+
+def _row_to_incident(row: Any, fields: Optional[Tuple[str, ...]] = None) -> IncidentRecord:
+    d = dict(row)
+    # Only the decoded plan was asked for: decompress it lazily too.
+    lazy_plan = fields is not None and "plan" in fields and "plan_json" not in fields
+    raw_plan = d.pop("plan_json", None) if lazy_plan else None
+    for c in BLOB_COLUMNS:
+        if c in d:
+            d[c] = decode_text(d[c])
+    if lazy_plan:
+        return IncidentRecord(d, raw_plan)
+    if fields is None:
+        return IncidentRecord(d, d.get("plan_json"))
+    if "plan" not in fields:
+        return IncidentRecord(d)
+    return IncidentRecord(d, d.get("plan_json"))
+
+def _append_event(
+    conn: sqlite3.Connection,
+    thread_ts: str,
+    kind: str,
+    actor: Optional[str],
+    at: str,
+    data: Dict[str, Any],
+    with_prev_status: bool = False,
+) -> None:
+    """
+    Append to the incident's timeline inside the caller's transaction.
+    Run it before the UPDATE when `with_prev_status` should record the
+    status being replaced as data.from.
+    """
+    data_sql = "json_set(?, '$.from', status)" if with_prev_status else "?"
+    conn.execute(
+        "INSERT INTO incident_events (incident_id, seq, at, kind, actor, data) "
+        "SELECT id, COALESCE((SELECT MAX(seq) FROM incident_events e WHERE e.incident_id = incidents.id), 0) + 1, "
+        f"?, ?, ?, {data_sql} FROM incidents WHERE thread_ts = ?",
+        (at, kind, actor, json.dumps(data, ensure_ascii=False, separators=(",", ":")), thread_ts),
+    )
+
+_NO_RESOURCES = ("", "n/a", "none", "unknown")
+
+def _split_resources(resources: Any) -> List[str]:
+    """
+    Resource ids from a comma/space separated string or a list, lower-cased
+    and de-duplicated. Placeholders such as "N/A" yield nothing.
+    """
+    if not resources:
+        return []
+    parts = resources.replace(",", " ").split() if isinstance(resources, str) else list(resources)
+    out: List[str] = []
+    for p in parts:
+        rid = str(p).strip().lower()
+        if rid not in _NO_RESOURCES and rid not in out:
+            out.append(rid)
+    return out
+
+def _resource_kind(resource_id: str) -> str:
+    # "vpc-0abc" -> "vpc", "i-123" -> "i"; ids without a prefix are "other".
+    prefix, sep, _ = resource_id.partition("-")
+    return prefix if sep and prefix.isalpha() else "other"
+
+def _store_resources(conn: sqlite3.Connection, incident_id: str, resources: Any, created_at: Optional[str]) -> None:
+    conn.executemany(
+        "INSERT OR IGNORE INTO incident_resources (resource_id, incident_id, kind, created_at) VALUES (?, ?, ?, ?)",
+        [(rid, incident_id, _resource_kind(rid), created_at) for rid in _split_resources(resources)],
+    )
+
 def save_incident(
     *,
     incident_id: str,
@@ -100,19 +780,21 @@ def save_incident(
     analysis_text: str,
     plan: Dict[str, Any],
     status: str = "open",
+    actor: Optional[str] = None,
+    raw_text: Optional[str] = None,
 ) -> None:
-    conn = _connect()
-    try:
-        _ensure_columns(conn)
-        now = datetime.utcnow().isoformat()
+    now = datetime.utcnow().isoformat()
+    plan_json = encode_text(json.dumps(plan, ensure_ascii=False), _codec)
+    analysis_blob = encode_text(analysis_text, _codec)
 
+    def op(conn: sqlite3.Connection) -> None:
         # Use explicit column list to avoid "N columns but M values"
         conn.execute(
             """
             INSERT OR REPLACE INTO incidents
             (id, thread_ts, channel_id, created_at, status, severity, summary, cloud, region,
-             resources, probable_cause, analysis_text, plan_json, last_updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+             resources, probable_cause, analysis_text, plan_json, last_updated_at, raw_text)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 incident_id,
@@ -126,92 +808,1027 @@ def save_incident(
                 region,
                 resources,
                 probable_cause,
-                analysis_text,
-                json.dumps(plan, ensure_ascii=False),
+                analysis_blob,
+                plan_json,
                 now,
+                raw_text,
             ),
         )
-        conn.commit()
-    finally:
-        conn.close()
+        # REPLACE already dropped the old rows through incident_resources_ad.
+        _store_resources(conn, incident_id, resources, now)
+        _append_event(conn, thread_ts, "saved", actor, now, {"status": status, "severity": severity})
+
+    _apply(thread_ts, op)
+
+def get_incident_by_thread_ts(thread_ts: str, fields: Any = None) -> Optional[Dict[str, Any]]:
+    projection = resolve_fields(fields)
+    if _write_behind is not None:
+        _write_behind.wait_for_key(thread_ts)
+
+    cached = _cache.get(thread_ts)
+    if cached is not None:
+        return _row_to_incident(_project_row(cached, projection), projection)
+
+    token = _cache.token()
+    with _read() as conn:
+        row = conn.execute(
+            f"SELECT {_select_list(projection)} FROM incidents WHERE thread_ts = ?", (thread_ts,)
+        ).fetchone()
+    if not row:
+        return _get_archived(thread_ts, projection)
+    if projection is None:
+        # Only full rows are cached; they can serve any projection later.
+        _cache.put(thread_ts, dict(row), token)
+    return _row_to_incident(row, projection)
 
-def get_incident_by_thread_ts(thread_ts: str) -> Optional[Dict[str, Any]]:
-    conn = _connect()
+def get_incidents_by_thread_ts(thread_ts_list: Sequence[str], fields: Any = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Rows for many thread_ts at once, keyed by thread_ts, read with one
+    query per 500 keys. Only the hot DB is read: archived or deleted
+    incidents are simply missing.
+    """
+    projection = resolve_fields(fields)
+    if projection is not None and "thread_ts" not in projection:
+        projection = projection + ("thread_ts",)
+    keys = list(dict.fromkeys(thread_ts_list))
+    out: Dict[str, Dict[str, Any]] = {}
+    with _read() as conn:
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            for row in conn.execute(
+                f"SELECT {_select_list(projection)} FROM incidents WHERE thread_ts IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall():
+                out[row["thread_ts"]] = _row_to_incident(row, projection)
+    return out
+
+def encode_cursor(created_at: str, incident_id: str) -> str:
+    raw = json.dumps([created_at, incident_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
     try:
-        _ensure_columns(conn)
-        cur = conn.execute("SELECT * FROM incidents WHERE thread_ts = ?", (thread_ts,))
-        row = cur.fetchone()
-        if not row:
-            return None
-        d = dict(row)
-        if d.get("plan_json"):
-            try:
-                d["plan"] = json.loads(d["plan_json"])
-            except Exception:
-                d["plan"] = {}
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, incident_id = json.loads(raw.decode("utf-8"))
+        return str(created_at), str(incident_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _filter_values(filters: Dict[str, Any]) -> List[Tuple[str, List[str]]]:
+    """
+    (column, values) per non-empty filter. Each filter value may be a
+    single value, a comma-separated string or a list.
+    """
+    out: List[Tuple[str, List[str]]] = []
+    for col in FILTER_COLUMNS:
+        value = filters.get(col)
+        if value is None or value == "":
+            continue
+        values = value.split(",") if isinstance(value, str) else list(value)
+        values = list(dict.fromkeys(str(v).strip() for v in values if v is not None and str(v).strip()))
+        if values:
+            out.append((col, values))
+    return out
+
+def _filter_clause(filters: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    where: List[str] = []
+    params: List[Any] = []
+    for col, values in _filter_values(filters):
+        if len(values) == 1:
+            where.append(f"{col} = ?")
         else:
-            d["plan"] = {}
-        return d
-    finally:
-        conn.close()
+            where.append(f"{col} IN ({','.join('?' * len(values))})")
+        params.extend(values)
+    return where, params
 
-def list_incidents(limit: int = 50) -> List[Dict[str, Any]]:
-    conn = _connect()
-    try:
-        _ensure_columns(conn)
-        cur = conn.execute("SELECT * FROM incidents ORDER BY created_at DESC LIMIT ?", (limit,))
-        rows = cur.fetchall()
-        out = []
-        for r in rows:
-            d = dict(r)
-            if d.get("plan_json"):
-                try:
-                    d["plan"] = json.loads(d["plan_json"])
-                except Exception:
-                    d["plan"] = {}
-            else:
-                d["plan"] = {}
-            out.append(d)
-        return out
-    finally:
-        conn.close()
+def _keyset_sql(
+    select: str, filters: Dict[str, Any], after: Optional[Tuple[str, str]], limit: int, *, desc: bool
+) -> Tuple[str, List[Any]]:
+    """
+    One keyset page of incidents past `after` in (created_at, id) order.
 
-def update_incident_status(thread_ts: str, status: str) -> None:
-    conn = _connect()
-    try:
-        _ensure_columns(conn)
-        now = datetime.utcnow().isoformat()
+    With multi-value filters each combination of values is its own index
+    range scan with its own LIMIT, and the branches are merged with UNION
+    ALL: the final sort only sees branches x limit rows, so the page cost
+    does not depend on table size or depth. `select` must include
+    created_at and id.
+    """
+    order = "created_at DESC, id DESC" if desc else "created_at, id"
+    values = _filter_values(filters)
+    combos = 1
+    for _, vs in values:
+        combos *= len(vs)
+
+    def page(where: List[str], params: List[Any]) -> Tuple[str, List[Any]]:
+        where, params = list(where), list(params)
+        if after is not None:
+            where.append(f"(created_at, id) {'<' if desc else '>'} (?, ?)")
+            params.extend(after)
+        sql = f"SELECT {select} FROM incidents"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return f"{sql} ORDER BY {order} LIMIT ?", params + [limit]
+
+    if combos == 1 or combos > _MAX_KEYSET_BRANCHES:
+        return page(*_filter_clause(filters))
+    parts: List[str] = []
+    params: List[Any] = []
+    for combo in product(*([(col, v) for v in vs] for col, vs in values)):
+        sql, args = page([f"{col} = ?" for col, _ in combo], [v for _, v in combo])
+        parts.append(f"SELECT * FROM ({sql})")
+        params.extend(args)
+    return " UNION ALL ".join(parts) + f" ORDER BY {order} LIMIT ?", params + [limit]
+
+def query_incidents(
+    *,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Any = None,
+    severity: Any = None,
+    cloud: Any = None,
+    region: Any = None,
+    channel_id: Any = None,
+    fields: Any = None,
+) -> Dict[str, Any]:
+    """
+    Newest-first page of incidents using keyset pagination on (created_at, id).
+
+    Returns {"items": [...], "next_cursor": str | None}. Pass `next_cursor`
+    back as `cursor` to get the following page; cost does not grow with depth.
+    `fields` is a projection as accepted by resolve_fields().
+    """
+    projection = resolve_fields(fields)
+    filters = {"status": status, "severity": severity, "cloud": cloud, "region": region, "channel_id": channel_id}
+    after = decode_cursor(cursor) if cursor else None
+    limit = max(1, int(limit))
+    sql, params = _keyset_sql(_select_list(projection), filters, after, limit + 1, desc=True)
+
+    with _read() as conn:
+        rows = conn.execute(sql, params).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+    return {"items": [_row_to_incident(r, projection) for r in rows], "next_cursor": next_cursor}
+
+def list_incidents(limit: int = 50, **filters: Any) -> List[Dict[str, Any]]:
+    return query_incidents(limit=limit, **filters)["items"]
+
+def update_incident_status(thread_ts: str, status: str, actor: Optional[str] = None) -> None:
+    now = datetime.utcnow().isoformat()
+
+    def op(conn: sqlite3.Connection) -> None:
+        _append_event(conn, thread_ts, "status", actor, now, {"to": status}, with_prev_status=True)
         conn.execute(
             "UPDATE incidents SET status = ?, last_updated_at = ? WHERE thread_ts = ?",
             (status, now, thread_ts),
         )
-        conn.commit()
-    finally:
-        conn.close()
 
-def update_incident_analysis(thread_ts: str, analysis_text: str, probable_cause: str = "") -> None:
-    conn = _connect()
-    try:
-        _ensure_columns(conn)
-        now = datetime.utcnow().isoformat()
+    _apply(thread_ts, op)
+    _status_changed(thread_ts, status)
+
+def update_incident_analysis(
+    thread_ts: str, analysis_text: str, probable_cause: str = "", actor: Optional[str] = None
+) -> None:
+    now = datetime.utcnow().isoformat()
+    analysis_blob = encode_text(analysis_text, _codec)
+
+    def op(conn: sqlite3.Connection) -> None:
         conn.execute(
             "UPDATE incidents SET analysis_text = ?, probable_cause = ?, last_updated_at = ? WHERE thread_ts = ?",
-            (analysis_text, probable_cause, now, thread_ts),
+            (analysis_blob, probable_cause, now, thread_ts),
+        )
+        _append_event(
+            conn, thread_ts, "analysis", actor, now,
+            {"probable_cause": probable_cause, "chars": len(analysis_text or "")},
         )
-        conn.commit()
-    finally:
-        conn.close()
 
-def update_incident_plan(thread_ts: str, plan: Dict[str, Any]) -> None:
-    conn = _connect()
-    try:
-        _ensure_columns(conn)
-        now = datetime.utcnow().isoformat()
+    _apply(thread_ts, op)
+
+def update_incident_plan(thread_ts: str, plan: Dict[str, Any], actor: Optional[str] = None) -> None:
+    now = datetime.utcnow().isoformat()
+    plan_json = encode_text(json.dumps(plan, ensure_ascii=False), _codec)
+
+    def op(conn: sqlite3.Connection) -> None:
         conn.execute(
             "UPDATE incidents SET plan_json = ?, last_updated_at = ? WHERE thread_ts = ?",
-            (json.dumps(plan, ensure_ascii=False), now, thread_ts),
+            (plan_json, now, thread_ts),
+        )
+        _append_event(conn, thread_ts, "plan", actor, now, {"steps": len(plan.get("steps") or [])})
+
+    _apply(thread_ts, op)
+
+def upgrade_incident_analysis(
+    thread_ts: str,
+    *,
+    severity: str,
+    summary: str,
+    cloud: str,
+    region: str,
+    resources: str,
+    probable_cause: str,
+    analysis_text: str,
+    plan: Dict[str, Any],
+    actor: Optional[str] = None,
+) -> None:
+    """
+    Replace a provisional (heuristic) analysis with a better one that
+    arrived later. Only incidents still "open" are touched: once someone
+    has acted on the incident the late answer is dropped.
+    """
+    now = datetime.utcnow().isoformat()
+    plan_json = encode_text(json.dumps(plan, ensure_ascii=False), _codec)
+    analysis_blob = encode_text(analysis_text, _codec)
+
+    def op(conn: sqlite3.Connection) -> None:
+        row = conn.execute(
+            "SELECT id, severity, created_at FROM incidents WHERE thread_ts = ? AND status = 'open'", (thread_ts,)
+        ).fetchone()
+        if row is None:
+            return
+        conn.execute(
+            """
+            UPDATE incidents SET severity = ?, summary = ?, cloud = ?, region = ?, resources = ?,
+                probable_cause = ?, analysis_text = ?, plan_json = ?, last_updated_at = ?
+            WHERE thread_ts = ?
+            """,
+            (severity, summary, cloud, region, resources, probable_cause, analysis_blob, plan_json, now, thread_ts),
+        )
+        conn.execute("DELETE FROM incident_resources WHERE incident_id = ?", (row["id"],))
+        _store_resources(conn, row["id"], resources, row["created_at"])
+        _append_event(
+            conn, thread_ts, "analysis_upgraded", actor, now,
+            {"from_severity": row["severity"], "severity": severity, "steps": len(plan.get("steps") or [])},
+        )
+
+    _apply(thread_ts, op)
+
+_JSON_PATH = re.compile(r"^\$(\.[A-Za-z_][A-Za-z0-9_]*|\[(\d+|#)\])*$")
+
+def _check_json_path(path: str) -> str:
+    if not _JSON_PATH.match(path):
+        raise ValueError(f"Unsupported JSON path: {path}")
+    return path
+
+def patch_incident_plan(
+    thread_ts: str,
+    *,
+    set_values: Optional[Dict[str, Any]] = None,
+    insert_values: Optional[Dict[str, Any]] = None,
+    append_values: Optional[Dict[str, Any]] = None,
+    status: Optional[str] = None,
+    actor: Optional[str] = None,
+    event_kind: str = "plan_patch",
+    event_data: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Apply targeted edits to the stored plan in one UPDATE, without reading
+    it into Python. Keys are JSON paths such as "$.execution" or
+    "$.steps[2].status"; values are any JSON-serializable object.
+
+    - set_values: json_set (create or overwrite)
+    - insert_values: json_insert (only if the path is missing)
+    - append_values: add to the array at the path, creating it if needed
+    - status: also update the incident status in the same statement
+
+    Concurrent patches to different paths never overwrite each other. The
+    change is logged to the timeline as `event_kind` with the touched
+    paths plus `event_data`.
+    """
+    expr = "COALESCE(klynx_text(plan_json), '{}')"
+    params: List[Any] = []
+
+    def wrap(fn: str, pairs: List[Tuple[str, Any]]) -> None:
+        nonlocal expr
+        expr = f"{fn}({expr}, {', '.join('?, json(?)' for _ in pairs)})"
+        for path, value in pairs:
+            params.extend([_check_json_path(path), json.dumps(value, ensure_ascii=False)])
+
+    if set_values:
+        wrap("json_set", list(set_values.items()))
+    if insert_values:
+        wrap("json_insert", list(insert_values.items()))
+    if append_values:
+        # json_insert on the bare path creates a missing array; "[#]" appends.
+        wrap("json_insert", [(path, []) for path in append_values])
+        wrap("json_insert", [(path + "[#]", value) for path, value in append_values.items()])
+    if not params and status is None:
+        return
+
+    now = datetime.utcnow().isoformat()
+    assignments = ["last_updated_at = ?"]
+    values: List[Any] = [now]
+    if params:
+        assignments.insert(0, f"plan_json = klynx_encode({expr}, ?)")
+        values = params + [_codec] + values
+    if status is not None:
+        assignments.append("status = ?")
+        values.append(status)
+    sql = f"UPDATE incidents SET {', '.join(assignments)} WHERE thread_ts = ?"
+    values.append(thread_ts)
+    event = dict(event_data or {})
+    event["paths"] = [*(set_values or {}), *(insert_values or {}), *(append_values or {})]
+    if status is not None:
+        event["to"] = status
+
+    def op(conn: sqlite3.Connection) -> None:
+        _append_event(conn, thread_ts, event_kind, actor, now, event, with_prev_status=status is not None)
+        conn.execute(sql, values)
+
+    _apply(thread_ts, op)
+    if status is not None:
+        _status_changed(thread_ts, status)
+
+# ---- Timeline ----
+
+def append_incident_event(
+    thread_ts: str, kind: str, data: Optional[Dict[str, Any]] = None, actor: Optional[str] = None
+) -> None:
+    """
+    Record an event that doesn't change the incident row (e.g. a comment).
+    """
+    now = datetime.utcnow().isoformat()
+
+    def op(conn: sqlite3.Connection) -> None:
+        _append_event(conn, thread_ts, kind, actor, now, data or {})
+
+    _apply(thread_ts, op)
+
+def append_incident_events(events: Iterable[Tuple[str, str, Optional[Dict[str, Any]], Optional[str]]]) -> int:
+    """
+    append_incident_event() for many (thread_ts, kind, data, actor) tuples
+    in one transaction. Returns how many were given.
+    """
+    init_db()
+    flush_writes()
+    now = datetime.utcnow().isoformat()
+    keys: List[str] = []
+    with _pool.transaction() as conn:
+        for thread_ts, kind, data, actor in events:
+            _append_event(conn, thread_ts, kind, actor, now, data or {})
+            keys.append(thread_ts)
+    if keys:
+        _after_commit(list(dict.fromkeys(keys)))
+    return len(keys)
+
+def incident_timeline(incident_id: str, *, limit: int = 50, before: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Newest-first page of an incident's events. Pass `next_before` back as
+    `before` for older events; None means the start of the timeline.
+    """
+    limit = max(1, int(limit))
+    sql = "SELECT seq, at, kind, actor, data FROM incident_events WHERE incident_id = ?"
+    params: List[Any] = [incident_id]
+    if before is not None:
+        sql += " AND seq < ?"
+        params.append(int(before))
+    sql += " ORDER BY seq DESC LIMIT ?"
+    params.append(limit + 1)
+    with _read() as conn:
+        rows = conn.execute(sql, params).fetchall()
+
+    next_before = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_before = rows[-1]["seq"]
+    items = []
+    for r in rows:
+        d = dict(r)
+        d["data"] = json.loads(d["data"]) if d["data"] else {}
+        items.append(d)
+    return {"items": items, "next_before": next_before}
+
+# ---- Bulk export / import ----
+
+def export_incidents(
+    *,
+    cursor: Optional[str] = None,
+    batch_size: int = 1000,
+    status: Any = None,
+    severity: Any = None,
+    cloud: Any = None,
+    region: Any = None,
+    channel_id: Any = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every incident oldest-first as a plain dict (blobs decoded, `plan`
+    parsed), one keyset page of `batch_size` rows at a time.
+
+    Memory stays constant and no read transaction is held between pages.
+    To resume an interrupted export pass
+    encode_cursor(last["created_at"], last["id"]) of the last row received.
+    """
+    filters = {"status": status, "severity": severity, "cloud": cloud, "region": region, "channel_id": channel_id}
+    after = decode_cursor(cursor) if cursor else None
+    batch_size = max(1, int(batch_size))
+    cols = ", ".join(INCIDENT_COLUMNS)
+    while True:
+        sql, args = _keyset_sql(cols, filters, after, batch_size, desc=False)
+        with _read() as conn:
+            rows = conn.execute(sql, args).fetchall()
+        for r in rows:
+            d = dict(r)
+            d["analysis_text"] = decode_text(d["analysis_text"])
+            plan_json = decode_text(d.pop("plan_json"))
+            try:
+                d["plan"] = json.loads(plan_json) if plan_json else {}
+            except ValueError:
+                d["plan"] = {}
+            yield d
+        if len(rows) < batch_size:
+            return
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+def import_incidents(
+    records: Iterable[Any],
+    *,
+    batch_size: int = 1000,
+    on_conflict: str = "replace",
+    actor: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Bulk-load incidents as produced by export_incidents().
+
+    `records` may be dicts or NDJSON lines (e.g. an open file). Rows are
+    inserted `batch_size` per transaction, bypassing write-behind. Existing
+    incidents (same id or thread_ts) are replaced, or kept when
+    on_conflict="skip", so re-running an interrupted import is safe.
+    With `actor`, every written row also gets a "saved" timeline event,
+    as save_incident() would record (bulk ingest of new incidents).
+    """
+    if on_conflict not in ("replace", "skip"):
+        raise ValueError("on_conflict must be 'replace' or 'skip'")
+    init_db()
+    flush_writes()
+    names = list(INCIDENT_COLUMNS)
+    sql = (
+        f"INSERT OR {'REPLACE' if on_conflict == 'replace' else 'IGNORE'} INTO incidents "
+        f"({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+    )
+    batch_size = max(1, int(batch_size))
+    result = {"imported": 0, "skipped": 0, "invalid": 0, "batches": 0}
+
+    id_idx, res_idx = names.index("id"), names.index("resources")
+    status_idx, sev_idx = names.index("status"), names.index("severity")
+    at_idx = names.index("created_at")
+
+    def _flush(batch: List[Tuple[Any, ...]], keys: List[str]) -> None:
+        with _pool.transaction() as conn:
+            if actor is None and on_conflict == "replace":
+                # REPLACE writes every row.
+                conn.executemany(sql, batch)
+                stored = batch
+            else:
+                # Row by row to know which ones were written (and get an event);
+                # rows IGNORE skipped keep the existing incident's resources.
+                stored = []
+                for values, thread_ts in zip(batch, keys):
+                    if conn.execute(sql, values).rowcount:
+                        stored.append(values)
+                        if actor is not None:
+                            _append_event(
+                                conn, thread_ts, "saved", actor, values[at_idx],
+                                {"status": values[status_idx], "severity": values[sev_idx]},
+                            )
+            for values in stored:
+                _store_resources(conn, values[id_idx], values[res_idx], values[at_idx])
+        _after_commit(keys)
+        written = len(stored)
+        result["imported"] += written
+        result["skipped"] += len(batch) - written
+        result["batches"] += 1
+
+    batch: List[Tuple[Any, ...]] = []
+    keys: List[str] = []
+    now = datetime.utcnow().isoformat()
+    for rec in records:
+        if isinstance(rec, (str, bytes)):
+            if not rec.strip():
+                continue
+            try:
+                rec = json.loads(rec)
+            except ValueError:
+                result["invalid"] += 1
+                continue
+        if not isinstance(rec, dict) or not rec.get("id") or not rec.get("thread_ts"):
+            result["invalid"] += 1
+            continue
+        row = dict(rec)
+        if "plan_json" not in row:
+            row["plan_json"] = json.dumps(row.get("plan") or {}, ensure_ascii=False)
+        row.setdefault("created_at", now)
+        row.setdefault("last_updated_at", row["created_at"])
+        for c in BLOB_COLUMNS:
+            row[c] = encode_text(row.get(c), _codec)
+        batch.append(tuple(row.get(c) for c in names))
+        keys.append(row["thread_ts"])
+        if len(batch) >= batch_size:
+            _flush(batch, keys)
+            batch, keys = [], []
+    if batch:
+        _flush(batch, keys)
+    return result
+
+# ---- Change feed ----
+
+def encode_change_cursor(change_seq: int, last_updated_at: Optional[str]) -> str:
+    raw = json.dumps([change_seq, last_updated_at], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_change_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        change_seq, _ = json.loads(raw.decode("utf-8"))
+        return int(change_seq)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def change_cursor() -> str:
+    """
+    Cursor for "now": changes() from here returns only later writes.
+    """
+    with _read() as conn:
+        row = conn.execute(
+            "SELECT change_seq, last_updated_at FROM incidents ORDER BY change_seq DESC LIMIT 1"
+        ).fetchone()
+    if row is None or row["change_seq"] is None:
+        return encode_change_cursor(0, None)
+    return encode_change_cursor(row["change_seq"], row["last_updated_at"])
+
+def incident_changes(*, since: Optional[str] = None, limit: int = 200, fields: Any = "summary") -> Dict[str, Any]:
+    """
+    Incidents inserted or updated after `since`, oldest change first.
+
+    Returns {"items", "next_cursor", "has_more"}; each item carries its
+    change_seq. `since=None` replays from the beginning. An incident
+    changed several times shows up once, at its latest position.
+    """
+    projection = resolve_fields(fields)
+    after = decode_change_cursor(since) if since else 0
+    limit = max(1, int(limit))
+    cols = _select_list(projection)
+    if projection is not None:
+        cols += ", change_seq, last_updated_at" if "last_updated_at" not in projection else ", change_seq"
+    with _read() as conn:
+        rows = conn.execute(
+            f"SELECT {cols} FROM incidents WHERE change_seq > ? ORDER BY change_seq LIMIT ?",
+            (after, limit + 1),
+        ).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = since
+    if rows:
+        next_cursor = encode_change_cursor(rows[-1]["change_seq"], rows[-1]["last_updated_at"])
+    elif not since:
+        next_cursor = encode_change_cursor(0, None)
+    return {
+        "items": [_row_to_incident(r, projection) for r in rows],
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }
+
+# ---- Resources ----
+
+def find_incidents_by_resource(
+    resource_id: str,
+    *,
+    prefix: bool = False,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    fields: Any = "summary",
+) -> Dict[str, Any]:
+    """
+    Newest-first incidents that mention `resource_id` (case-insensitive),
+    paginated like query_incidents(). `prefix=True` matches every resource
+    starting with it (e.g. "vpc-0abc"), still as an index range scan.
+    Archived incidents are merged in from the archive's resource index.
+    """
+    projection = resolve_fields(fields)
+    rid = resource_id.strip().lower()
+    if not rid:
+        raise ValueError("resource_id is required")
+    if prefix:
+        where = ["r.resource_id >= ?", "r.resource_id < ?"]
+        params: List[Any] = [rid, rid + "\uffff"]
+    else:
+        where = ["r.resource_id = ?"]
+        params = [rid]
+    after = decode_cursor(cursor) if cursor else None
+    if after is not None:
+        where.append("(r.created_at, r.incident_id) < (?, ?)")
+        params.extend(after)
+
+    limit = max(1, int(limit))
+    cols = "i.*" if projection is None else ", ".join(f"i.{c}" for c in _select_list(projection).split(", "))
+    # Ordered by the resource rows' copy of created_at: for one resource the
+    # page is read in order from idx_incident_resources_recent. A prefix
+    # spans several resources, so its matches are sorted.
+    sql = (
+        f"SELECT {'DISTINCT ' if prefix else ''}{cols} FROM incident_resources r JOIN incidents i ON i.id = r.incident_id "
+        f"WHERE {' AND '.join(where)} ORDER BY r.created_at DESC, r.incident_id DESC LIMIT ?"
+    )
+    params.append(limit + 1)
+    with _read() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    items = [_row_to_incident(r, projection) for r in rows]
+    if os.path.exists(ARCHIVE_DB_PATH):
+        archived = _archive.find_by_resource(rid, prefix=prefix, after=after, limit=limit + 1)
+        if archived:
+            hot = {d["id"] for d in items}
+            items.extend(_archived_record(d, projection) for d in archived if d["id"] not in hot)
+            items.sort(key=lambda d: (d["created_at"] or "", d["id"] or ""), reverse=True)
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1]["created_at"], items[-1]["id"])
+    return {"items": items, "next_cursor": next_cursor}
+
+def incident_resources(incident_id: str) -> List[Dict[str, str]]:
+    with _read() as conn:
+        rows = conn.execute(
+            "SELECT resource_id, kind FROM incident_resources WHERE incident_id = ? ORDER BY kind, resource_id",
+            (incident_id,),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+# ---- Full-text search ----
+
+def _fts_query(query: str) -> str:
+    """
+    Turn free text into a safe FTS5 query: every whitespace-separated term
+    becomes a quoted phrase, so IDs like vpc-0abc or "503:" never hit FTS
+    syntax. Terms are ANDed.
+    """
+    terms = []
+    for term in (query or "").split():
+        term = term.replace('"', "").strip()
+        if term:
+            terms.append(f'"{term}"')
+    return " ".join(terms)
+
+def search_incidents(
+    query: str,
+    limit: int = 20,
+    filters: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Ranked (bm25) full-text search over summary, probable_cause and
+    analysis_text. `filters` takes the same keys as query_incidents().
+    Each hit carries the summary columns plus `score` and `snippet`.
+    """
+    match = _fts_query(query)
+    if not match:
+        return []
+
+    where, params = _filter_clause(filters or {})
+    weights = ", ".join(str(w) for _, w in FTS_COLUMNS)
+    cols = ", ".join(f"i.{c}" for c in SUMMARY_FIELDS)
+    sql = (
+        f"SELECT {cols}, bm25(incidents_fts, {weights}) AS score, "
+        f"snippet(incidents_fts, -1, '[', ']', '…', 12) AS snippet "
+        f"FROM incidents_fts JOIN incidents i ON i.rowid = incidents_fts.rowid "
+        f"WHERE incidents_fts MATCH ?"
+    )
+    if where:
+        sql += " AND " + " AND ".join(f"i.{w}" for w in where)
+    sql += " ORDER BY score LIMIT ?"
+
+    limit = max(1, int(limit))
+    with _read() as conn:
+        rows = conn.execute(sql, [match, *params, limit]).fetchall()
+    results = [dict(r) for r in rows]
+
+    # Top up from the archive; its hits rank after all hot hits.
+    if len(results) < limit and os.path.exists(ARCHIVE_DB_PATH):
+        results.extend(_archive.search(match, SUMMARY_FIELDS, limit - len(results), where, params))
+    return results
+
+# ---- Stats rollups ----
+
+def incident_stats(
+    *,
+    grain: str = "day",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    severity: Any = None,
+    status: Any = None,
+    cloud: Any = None,
+) -> Dict[str, Any]:
+    """
+    Counts by severity/status/cloud and MTTR per bucket, read from the
+    incident_stats rollups. `since`/`until` are ISO timestamps or bucket
+    prefixes; `until` is exclusive. MTTR is the mean time from created_at
+    to resolved_at of incidents whose status is in RESOLVED_STATUSES.
+    """
+    if grain not in STATS_GRAINS:
+        raise ValueError(f"grain must be one of: {', '.join(STATS_GRAINS)}")
+    prefix_len = STATS_GRAINS[grain]
+
+    where, params = _filter_clause({"severity": severity, "status": status, "cloud": cloud})
+    where.insert(0, "grain = ?")
+    params.insert(0, grain)
+    if since:
+        where.append("bucket >= ?")
+        params.append(since[:prefix_len])
+    if until:
+        where.append("bucket < ?")
+        params.append(until[:prefix_len])
+
+    with _read() as conn:
+        rows = conn.execute(
+            "SELECT bucket, severity, status, cloud, incidents, open_seconds FROM incident_stats "
+            f"WHERE {' AND '.join(where)} AND incidents > 0 ORDER BY bucket",
+            params,
+        ).fetchall()
+
+    def empty() -> Dict[str, Any]:
+        return {"incidents": 0, "by_severity": {}, "by_status": {}, "by_cloud": {}, "_resolved": 0, "_resolved_s": 0.0}
+
+    def add(agg: Dict[str, Any], r: sqlite3.Row) -> None:
+        n = r["incidents"]
+        agg["incidents"] += n
+        for key, col in (("by_severity", "severity"), ("by_status", "status"), ("by_cloud", "cloud")):
+            agg[key][r[col]] = agg[key].get(r[col], 0) + n
+        if r["status"] in RESOLVED_STATUSES:
+            agg["_resolved"] += n
+            agg["_resolved_s"] += r["open_seconds"]
+
+    def finish(agg: Dict[str, Any]) -> Dict[str, Any]:
+        resolved = agg.pop("_resolved")
+        resolved_s = agg.pop("_resolved_s")
+        agg["resolved"] = resolved
+        agg["mttr_seconds"] = round(resolved_s / resolved, 1) if resolved else None
+        return agg
+
+    buckets: Dict[str, Dict[str, Any]] = {}
+    totals = empty()
+    for r in rows:
+        add(buckets.setdefault(r["bucket"], empty()), r)
+        add(totals, r)
+
+    return {
+        "grain": grain,
+        "buckets": [dict(bucket=b, **finish(agg)) for b, agg in buckets.items()],
+        "totals": finish(totals),
+    }
+
+# ---- Retention / archive ----
+
+def _get_archived(thread_ts: str, projection: Optional[Tuple[str, ...]]) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(ARCHIVE_DB_PATH):
+        return None
+    d = _archive.get(thread_ts)
+    if d is None:
+        return None
+    return _archived_record(d, projection)
+
+def _archived_record(d: Dict[str, Any], projection: Optional[Tuple[str, ...]]) -> Dict[str, Any]:
+    plan_json = d.get("plan_json")
+    if projection is not None:
+        keep = set(projection) | {"archived"}
+        d = {k: v for k, v in d.items() if k in keep}
+        if "plan" not in projection:
+            return IncidentRecord(d)
+    return IncidentRecord(d, plan_json)
+
+def archive_old_incidents(
+    *,
+    older_than_days: float = RETENTION_DAYS,
+    batch_size: int = RETENTION_BATCH,
+    max_batches: Optional[int] = None,
+    pause_ms: float = RETENTION_PAUSE_MS,
+    stop: Optional[threading.Event] = None,
+) -> Dict[str, Any]:
+    """
+    Move incidents created more than `older_than_days` ago to the archive DB.
+
+    Works in small batches: read the oldest rows (no write lock), copy them
+    and their resource rows to the archive, then delete them from the hot
+    DB in a short transaction only if they were not modified in between;
+    the archive copies of rows that were are dropped again. Copying is
+    idempotent, so an interrupted run just resumes on the next call.
+    """
+    if older_than_days <= 0:
+        return {"moved": 0, "batches": 0, "cutoff": None}
+    init_db()
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).isoformat()
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        if stop is not None and stop.is_set():
+            break
+        with _pool.connection() as conn:
+            rows = [
+                {k: (decode_text(v) if k in BLOB_COLUMNS else v) for k, v in dict(r).items()}
+                for r in conn.execute(
+                    "SELECT * FROM incidents WHERE created_at < ? ORDER BY created_at, id LIMIT ?",
+                    (cutoff, batch_size),
+                ).fetchall()
+            ]
+            if not rows:
+                break
+            resources = [
+                dict(r) for r in conn.execute(
+                    "SELECT resource_id, incident_id, kind, created_at FROM incident_resources "
+                    f"WHERE incident_id IN ({','.join('?' * len(rows))})",
+                    [r["id"] for r in rows],
+                ).fetchall()
+            ]
+
+        _archive.put_many(rows, resources)
+        kept: List[str] = []
+        with _pool.transaction() as conn:
+            conn.execute("UPDATE repo_flags SET value = 1 WHERE name = 'archiving'")
+            for r in rows:
+                if not conn.execute(
+                    "DELETE FROM incidents WHERE id = ? AND last_updated_at IS ?", (r["id"], r["last_updated_at"])
+                ).rowcount:
+                    kept.append(r["id"])
+            conn.execute("UPDATE repo_flags SET value = 0 WHERE name = 'archiving'")
+        _after_commit([r["thread_ts"] for r in rows])
+        # Rows modified since they were read stay hot; their archive copy
+        # would show up twice in search. The next run archives them again.
+        _archive.delete_many(kept)
+        deleted = len(rows) - len(kept)
+
+        moved += deleted
+        batches += 1
+        last = rows[-1]
+        _archive.set_state("last_run", {
+            "at": datetime.utcnow().isoformat(),
+            "cutoff": cutoff,
+            "moved": moved,
+            "last_created_at": last["created_at"],
+            "last_id": last["id"],
+        })
+        if deleted == 0:
+            # Every row in the batch changed under us; try again next run.
+            break
+        if pause_ms > 0:
+            time.sleep(pause_ms / 1000.0)
+    return {"moved": moved, "batches": batches, "cutoff": cutoff}
+
+def _retention_loop(interval_s: float) -> None:
+    while not _retention_stop.is_set():
+        try:
+            archive_old_incidents(stop=_retention_stop)
+        except Exception:
+            _logger.exception("retention run failed")
+        _retention_stop.wait(interval_s)
+
+def start_retention_worker(interval_s: float = RETENTION_INTERVAL_S) -> Optional[threading.Thread]:
+    """
+    Start the background retention job if INCIDENTS_RETENTION_DAYS > 0.
+    """
+    global _retention_thread
+    if RETENTION_DAYS <= 0 or (_retention_thread is not None and _retention_thread.is_alive()):
+        return _retention_thread
+    _retention_stop.clear()
+    _retention_thread = threading.Thread(
+        target=_retention_loop, args=(interval_s,), name="incidents-retention", daemon=True
+    )
+    _retention_thread.start()
+    return _retention_thread
+
+def stop_retention_worker(timeout: float = 10.0) -> None:
+    _retention_stop.set()
+    if _retention_thread is not None:
+        _retention_thread.join(timeout)
+
+def archive_stats() -> Dict[str, Any]:
+    if not os.path.exists(ARCHIVE_DB_PATH):
+        return {"path": ARCHIVE_DB_PATH, "archived": 0}
+    return _archive.stats()
+
+# ---- LLM analysis cache ----
+
+# Expired analysis_cache rows are purged on every Nth put.
+_ANALYSIS_PURGE_EVERY = 256
+_analysis_puts = 0
+
+def get_cached_analysis(key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+    """
+    (analysis, expires_at) for an unexpired cache row, else None.
+    """
+    with _read() as conn:
+        row = conn.execute(
+            "SELECT data, expires_at FROM analysis_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+    if not row:
+        return None
+    try:
+        return json.loads(row["data"]), row["expires_at"]
+    except ValueError:
+        return None
+
+def put_cached_analysis(key: str, model: str, data: Dict[str, Any], ttl_s: float) -> float:
+    """
+    Store an analysis for `ttl_s` seconds; returns its expires_at.
+    """
+    global _analysis_puts
+    init_db()
+    now = time.time()
+    expires_at = now + ttl_s
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    _analysis_puts += 1
+    purge = _analysis_puts % _ANALYSIS_PURGE_EVERY == 0
+    with _pool.transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO analysis_cache (key, model, created_at, expires_at, data) VALUES (?, ?, ?, ?, ?)",
+            (key, model, now, expires_at, payload),
         )
-        conn.commit()
-    finally:
-        conn.close()
+        if purge:
+            conn.execute("DELETE FROM analysis_cache WHERE expires_at <= ?", (now,))
+    return expires_at
+
+def analysis_cache_size() -> int:
+    with _read() as conn:
+        return conn.execute("SELECT COUNT(*) FROM analysis_cache WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+
+# ---- Blob codec ----
+
+def set_blob_codec(codec: str) -> None:
+    """
+    Change the codec used for new writes. Existing rows are left as they
+    are until migrate_blob_codec() rewrites them; reads handle both.
+    """
+    global _codec
+    _codec = resolve_codec(codec)
+
+def migrate_blob_codec(
+    *,
+    batch_size: int = 500,
+    pause_ms: float = 20,
+    stop: Optional[threading.Event] = None,
+) -> Dict[str, Any]:
+    """
+    Rewrite plan_json/analysis_text of every row into the current codec.
+
+    Walks the table by rowid in short transactions; a row that changed
+    since it was read is skipped (the concurrent write already used the
+    current codec). last_updated_at is not touched.
+    """
+    init_db()
+    codec = _codec
+    last_rowid = 0
+    scanned = converted = 0
+    while not (stop is not None and stop.is_set()):
+        with _pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT rowid, analysis_text, plan_json FROM incidents WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, batch_size),
+            ).fetchall()
+        if not rows:
+            break
+        last_rowid = rows[-1]["rowid"]
+        scanned += len(rows)
+
+        updates = []
+        for r in rows:
+            if all(r[c] is None or codec_of(r[c]) == codec for c in BLOB_COLUMNS):
+                continue
+            updates.append((
+                encode_text(decode_text(r["analysis_text"]), codec),
+                encode_text(decode_text(r["plan_json"]), codec),
+                r["rowid"],
+                r["analysis_text"],
+                r["plan_json"],
+            ))
+        if updates:
+            with _pool.transaction() as conn:
+                cur = conn.executemany(
+                    "UPDATE incidents SET analysis_text = ?, plan_json = ? "
+                    "WHERE rowid = ? AND analysis_text IS ? AND plan_json IS ?",
+                    updates,
+                )
+                converted += cur.rowcount
+        if pause_ms > 0:
+            time.sleep(pause_ms / 1000.0)
+    return {"codec": codec, "scanned": scanned, "converted": converted}
+
+def _codec_migration_loop() -> None:
+    try:
+        result = migrate_blob_codec(stop=_codec_stop)
+        _logger.info("blob codec migration finished: %s", result)
+    except Exception:
+        _logger.exception("blob codec migration failed")
+
+def start_codec_migration() -> Optional[threading.Thread]:
+    """
+    Convert existing rows in the background if INCIDENTS_BLOB_CODEC_MIGRATE is set.
+    """
+    global _codec_thread
+    if not BLOB_CODEC_MIGRATE or (_codec_thread is not None and _codec_thread.is_alive()):
+        return _codec_thread
+    _codec_stop.clear()
+    _codec_thread = threading.Thread(target=_codec_migration_loop, name="incidents-codec-migration", daemon=True)
+    _codec_thread.start()
+    return _codec_thread
 
+def stop_codec_migration(timeout: float = 10.0) -> None:
+    _codec_stop.set()
+    if _codec_thread is not None:
+        _codec_thread.join(timeout)
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from blob_codec import best_codec, decode_text, encode_text
+from sqlite_pool import SQLitePool
+
+# Large text columns stored compressed; everything else is kept as-is.
+COMPRESSED_COLUMNS = ("analysis_text", "plan_json")
+
+
+class IncidentArchive:
+    """
+    Cold store for incidents moved out of the hot DB by the retention job.
+
+    A separate SQLite file: same columns as `incidents`, with analysis_text
+    and plan_json compressed, plus a contentless FTS5 index so archived
+    incidents stay searchable without keeping their text uncompressed.
+    archived_resources keeps their incident_resources rows, so lookups by
+    resource still find them.
+    """
+
+    def __init__(self, path: str, columns: Iterable[str]) -> None:
+        self.path = path
+        self.columns = list(columns)
+        self.codec = best_codec()
+        self._pool = SQLitePool(path, name="incidents_archive_pool", max_connections=4)
+        self._ready = False
+        self._lock = threading.Lock()
+
+    # ---- schema ----
+
+    def _ensure_schema(self) -> None:
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            cols = ", ".join(f"{c} {'BLOB' if c in COMPRESSED_COLUMNS else 'TEXT'}" for c in self.columns)
+            with self._pool.transaction() as conn:
+                # AUTOINCREMENT so a re-archived row never reuses a rowid that
+                # still has stale entries in the contentless FTS index.
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS archived_incidents "
+                    f"(seq INTEGER PRIMARY KEY AUTOINCREMENT, {cols}, archived_at TEXT)"
+                )
+                existing = {r["name"] for r in conn.execute("PRAGMA table_info(archived_incidents)")}
+                for c in self.columns:
+                    if c not in existing:
+                        ctype = "BLOB" if c in COMPRESSED_COLUMNS else "TEXT"
+                        conn.execute(f"ALTER TABLE archived_incidents ADD COLUMN {c} {ctype}")
+                conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_archived_id ON archived_incidents (id)")
+                conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_archived_thread ON archived_incidents (thread_ts)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_archived_created ON archived_incidents (created_at DESC, id DESC)")
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS archived_fts USING fts5("
+                    "summary, probable_cause, analysis_text, content='', tokenize='unicode61 remove_diacritics 2')"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS archived_resources ("
+                    "resource_id TEXT NOT NULL, incident_id TEXT NOT NULL, kind TEXT NOT NULL, created_at TEXT, "
+                    "PRIMARY KEY (resource_id, incident_id)) WITHOUT ROWID"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_archived_resources_incident ON archived_resources (incident_id)")
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_archived_resources_recent "
+                    "ON archived_resources (resource_id, created_at DESC, incident_id DESC)"
+                )
+                conn.execute("CREATE TABLE IF NOT EXISTS archive_state (key TEXT PRIMARY KEY, value TEXT)")
+            self._ready = True
+
+    # ---- writes ----
+
+    def put_many(self, rows: List[Dict[str, Any]], resources: Sequence[Dict[str, Any]] = ()) -> None:
+        """
+        Idempotent: re-archiving a row (e.g. after a crash before the hot
+        delete) replaces it, its FTS entry and its resources. `resources`
+        are the rows' incident_resources rows.
+        """
+        self._ensure_schema()
+        now = datetime.utcnow().isoformat()
+        names = self.columns + ["archived_at"]
+        sql = (
+            f"INSERT INTO archived_incidents ({', '.join(names)}) "
+            f"VALUES ({', '.join('?' * len(names))})"
+        )
+        with self._pool.transaction() as conn:
+            for row in rows:
+                # Contentless FTS can't take 'delete'; the old seq simply stops
+                # joining to a row.
+                conn.execute(
+                    "DELETE FROM archived_incidents WHERE id = ? OR thread_ts = ?",
+                    (row.get("id"), row.get("thread_ts")),
+                )
+                values = [
+                    encode_text(row.get(c), self.codec) if c in COMPRESSED_COLUMNS else row.get(c)
+                    for c in self.columns
+                ]
+                cur = conn.execute(sql, values + [now])
+                conn.execute(
+                    "INSERT INTO archived_fts (rowid, summary, probable_cause, analysis_text) VALUES (?, ?, ?, ?)",
+                    (cur.lastrowid, row.get("summary"), row.get("probable_cause"), row.get("analysis_text")),
+                )
+                conn.execute("DELETE FROM archived_resources WHERE incident_id = ?", (row.get("id"),))
+            conn.executemany(
+                "INSERT OR IGNORE INTO archived_resources (resource_id, incident_id, kind, created_at) VALUES (?, ?, ?, ?)",
+                [(r["resource_id"], r["incident_id"], r["kind"], r["created_at"]) for r in resources],
+            )
+
+    def delete_many(self, ids: Sequence[str]) -> None:
+        """Drop archive copies of incidents that stayed in the hot DB."""
+        if not ids:
+            return
+        self._ensure_schema()
+        with self._pool.transaction() as conn:
+            conn.executemany("DELETE FROM archived_incidents WHERE id = ?", [(i,) for i in ids])
+            conn.executemany("DELETE FROM archived_resources WHERE incident_id = ?", [(i,) for i in ids])
+
+    def set_state(self, key: str, value: Any) -> None:
+        self._ensure_schema()
+        with self._pool.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO archive_state (key, value) VALUES (?, ?)",
+                (key, json.dumps(value)),
+            )
+
+    def get_state(self, key: str, default: Any = None) -> Any:
+        self._ensure_schema()
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT value FROM archive_state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row["value"]) if row else default
+
+    # ---- reads ----
+
+    def _decode(self, row: sqlite3.Row) -> Dict[str, Any]:
+        d = dict(row)
+        for c in COMPRESSED_COLUMNS:
+            if c in d:
+                d[c] = decode_text(d[c])
+        d["archived"] = True
+        return d
+
+    def get(self, thread_ts: str) -> Optional[Dict[str, Any]]:
+        self._ensure_schema()
+        with self._pool.connection() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(self.columns)} FROM archived_incidents WHERE thread_ts = ?", (thread_ts,)
+            ).fetchone()
+        return self._decode(row) if row else None
+
+    def search(self, match: str, columns: Iterable[str], limit: int, where: List[str], params: List[Any]) -> List[Dict[str, Any]]:
+        """
+        `match` is an FTS5 query; `where`/`params` are extra conditions on
+        archived_incidents columns (aliased `a`).
+        """
+        self._ensure_schema()
+        cols = ", ".join(f"a.{c}" for c in columns)
+        sql = (
+            f"SELECT {cols}, bm25(archived_fts) AS score FROM archived_fts "
+            f"JOIN archived_incidents a ON a.seq = archived_fts.rowid WHERE archived_fts MATCH ?"
+        )
+        if where:
+            sql += " AND " + " AND ".join(f"a.{w}" for w in where)
+        sql += " ORDER BY score LIMIT ?"
+        with self._pool.connection() as conn:
+            rows = conn.execute(sql, [match, *params, limit]).fetchall()
+        out = []
+        for r in rows:
+            d = dict(r)
+            d["snippet"] = d.get("summary") or ""
+            d["archived"] = True
+            out.append(d)
+        return out
+
+    def find_by_resource(
+        self, resource_id: str, *, prefix: bool, after: Optional[Tuple[str, str]], limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Archived incidents mentioning `resource_id` (already lower-cased),
+        newest first, like the hot incident_resources lookup.
+        """
+        self._ensure_schema()
+        if prefix:
+            where = ["r.resource_id >= ?", "r.resource_id < ?"]
+            params: List[Any] = [resource_id, resource_id + "\uffff"]
+        else:
+            where = ["r.resource_id = ?"]
+            params = [resource_id]
+        if after is not None:
+            where.append("(r.created_at, r.incident_id) < (?, ?)")
+            params.extend(after)
+        cols = ", ".join(f"a.{c}" for c in self.columns)
+        sql = (
+            f"SELECT {'DISTINCT ' if prefix else ''}{cols} FROM archived_resources r "
+            f"JOIN archived_incidents a ON a.id = r.incident_id "
+            f"WHERE {' AND '.join(where)} ORDER BY r.created_at DESC, r.incident_id DESC LIMIT ?"
+        )
+        with self._pool.connection() as conn:
+            rows = conn.execute(sql, [*params, limit]).fetchall()
+        return [self._decode(r) for r in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        self._ensure_schema()
+        with self._pool.connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM archived_incidents").fetchone()[0]
+        return {
+            "path": self.path,
+            "codec": self.codec,
+            "archived": count,
+            "last_run": self.get_state("last_run"),
+        }
+
+    def close(self) -> None:
+        self._pool.close_all()
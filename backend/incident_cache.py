@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from metrics import counter
+
+# How many recent invalidations are remembered individually. Older ones
+# collapse into a single watermark, which only makes put() more conservative.
+_INVALIDATION_HISTORY = 4096
+
+
+def _approx_size(row: Dict[str, Any]) -> int:
+    size = 64
+    for k, v in row.items():
+        size += 48 + len(k)
+        if isinstance(v, (str, bytes)):
+            size += len(v)
+    return size
+
+
+class IncidentCache:
+    """
+    Thread-safe LRU + TTL cache of raw incident rows keyed by thread_ts,
+    bounded by entry count and approximate bytes.
+
+    Readers take a `token()` before going to the DB and pass it to `put()`;
+    if the key was invalidated in between, the (possibly stale) row is
+    dropped instead of cached. Writers call `invalidate()` after commit.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = 1024,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl_s: float = 60.0,
+        name: str = "incident_cache",
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._bytes = 0
+        self._gen = 0
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        self._invalidated_floor = 0
+
+        self._hits = counter(f"{name}_hits")
+        self._misses = counter(f"{name}_misses")
+        self._evictions = counter(f"{name}_evictions")
+        self._invalidations = counter(f"{name}_invalidations")
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def token(self) -> int:
+        return self._gen
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses.inc()
+                return None
+            expires_at, size, row = entry
+            if expires_at <= now:
+                self._drop(key)
+                self._misses.inc()
+                return None
+            self._entries.move_to_end(key)
+            self._hits.inc()
+            return row
+
+    def put(self, key: str, row: Dict[str, Any], token: int) -> None:
+        if not self.enabled:
+            return
+        size = _approx_size(row)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            last = self._invalidated.get(key, self._invalidated_floor)
+            if last > token:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_s, size, row)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._evictions.inc()
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._gen += 1
+            self._invalidated[key] = self._gen
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > _INVALIDATION_HISTORY:
+                _, gen = self._invalidated.popitem(last=False)
+                self._invalidated_floor = max(self._invalidated_floor, gen)
+            if key in self._entries:
+                self._drop(key)
+        self._invalidations.inc()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._gen += 1
+            self._invalidated.clear()
+            self._invalidated_floor = self._gen
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, nbytes = len(self._entries), self._bytes
+        return {
+            "entries": entries,
+            "bytes": nbytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "hits": self._hits.value,
+            "misses": self._misses.value,
+            "evictions": self._evictions.value,
+            "invalidations": self._invalidations.value,
+        }
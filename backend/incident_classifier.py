@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+import history_repository as repo
+from analysis_cache import alert_tokens
+from metrics import counter, histogram
+
+_logger = logging.getLogger("klynx.incident_classifier")
+
+CLASSIFIER_PATH = os.getenv(
+    "KLYNX_CLASSIFIER_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "incident_classifier.npz"),
+)
+# Predictions at least this confident override the keyword guesses of the heuristic analyzers.
+CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("KLYNX_CLASSIFIER_MIN_CONFIDENCE", "0.8"))
+# Both heads at least this confident: analyze_cloud_issue answers locally, without the LLM (>1 disables).
+CLASSIFIER_SKIP_LLM_CONFIDENCE = float(os.getenv("KLYNX_CLASSIFIER_SKIP_LLM_CONFIDENCE", "0.97"))
+
+SEVERITIES = ("SEV-1", "SEV-2", "SEV-3", "SEV-4", "SEV-5")
+CLOUDS = ("aws", "azure", "gcp", "kubernetes", "unknown")
+# Training examples are the stored alert text, i.e. what predict() sees
+# at serve time. summary/probable_cause/analysis_text are the analyzer's
+# own output and would teach the model text it never gets to read.
+TRAIN_FIELD = "raw_text"
+
+_DIMS = 1 << 16
+_MAX_TOKENS = 512
+# Predictions need this many features the model has seen, else they fall back to the prior.
+_MIN_KNOWN = 2
+
+_predictions = counter("classifier_predictions")
+_predict_ms = histogram("classifier_predict_ms", (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10))
+
+
+class Prediction(NamedTuple):
+    label: str
+    confidence: float
+
+
+def _hashed(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    # crc32 rather than hash(): models are saved, so it must be stable across processes.
+    tokens = alert_tokens(text)[:_MAX_TOKENS]
+    grams = Counter(tokens)
+    grams.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    if not grams:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    idx = np.fromiter((zlib.crc32(g.encode("utf-8")) % _DIMS for g in grams), dtype=np.int64, count=len(grams))
+    counts = np.fromiter(grams.values(), dtype=np.float32, count=len(grams))
+    return idx, counts
+
+
+class _Head:
+    """One Naive Bayes classifier (severity or cloud)."""
+
+    def __init__(self, classes: Sequence[str], log_prior: np.ndarray, log_prob: np.ndarray, known: np.ndarray) -> None:
+        self.classes = tuple(classes)
+        self.log_prior = log_prior.astype(np.float32)
+        self.log_prob = log_prob.astype(np.float32)  # classes x dims
+        self.known = known.astype(bool)  # features seen in training
+
+    @classmethod
+    def fit(cls, examples: Sequence[Tuple[np.ndarray, np.ndarray]], labels: Sequence[str], classes: Sequence[str], alpha: float) -> "_Head":
+        counts = np.zeros((len(classes), _DIMS), dtype=np.float64)
+        docs = np.zeros(len(classes), dtype=np.float64)
+        pos = {c: i for i, c in enumerate(classes)}
+        for (idx, cnt), label in zip(examples, labels):
+            k = pos[label]
+            np.add.at(counts[k], idx, cnt)
+            docs[k] += 1
+        log_prior = np.log((docs + 1.0) / (docs.sum() + len(classes)))
+        smoothed = counts + alpha
+        log_prob = np.log(smoothed / smoothed.sum(axis=1, keepdims=True))
+        return cls(classes, log_prior, log_prob, counts.sum(axis=0) > 0)
+
+    def predict(self, idx: np.ndarray, cnt: np.ndarray) -> Prediction:
+        if int(self.known[idx].sum()) < _MIN_KNOWN:
+            # Nothing to go on but the prior: no confidence.
+            return Prediction(self.classes[int(np.argmax(self.log_prior))], 0.0)
+        scores = self.log_prior + self.log_prob[:, idx] @ cnt
+        p = np.exp(scores - scores.max())
+        p /= p.sum()
+        k = int(np.argmax(p))
+        return Prediction(self.classes[k], float(p[k]))
+
+
+class IncidentClassifier:
+    """
+    Multinomial Naive Bayes over hashed word and word-pair counts of the
+    incident text, with a severity head and a cloud-provider head. Saved
+    as one .npz (float16 weights) with a JSON header.
+    """
+
+    def __init__(self, severity: _Head, cloud: _Head, info: Optional[Dict[str, Any]] = None) -> None:
+        self.severity = severity
+        self.cloud = cloud
+        self.info = info or {}
+
+    @classmethod
+    def fit(cls, texts: Sequence[str], severities: Sequence[Optional[str]], clouds: Sequence[Optional[str]], *, alpha: float = 0.1) -> "IncidentClassifier":
+        feats = [_hashed(t) for t in texts]
+        sev = [(f, s) for f, s in zip(feats, severities) if s in SEVERITIES]
+        cld = [(f, c) for f, c in zip(feats, clouds) if c in CLOUDS]
+        if not sev or not cld:
+            raise ValueError("no labeled incidents to train on")
+        return cls(
+            _Head.fit([f for f, _ in sev], [s for _, s in sev], SEVERITIES, alpha),
+            _Head.fit([f for f, _ in cld], [c for _, c in cld], CLOUDS, alpha),
+            {"trained_at": time.time(), "examples": len(texts), "dims": _DIMS, "alpha": alpha},
+        )
+
+    def predict(self, text: str) -> Tuple[Prediction, Prediction]:
+        """(severity, cloud) predictions for `text`, each with its confidence."""
+        start = time.perf_counter()
+        idx, cnt = _hashed(text)
+        out = (self.severity.predict(idx, cnt), self.cloud.predict(idx, cnt))
+        _predictions.inc()
+        _predict_ms.observe((time.perf_counter() - start) * 1000.0)
+        return out
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp,
+            info=np.frombuffer(json.dumps(self.info).encode("utf-8"), dtype=np.uint8),
+            severity_prior=self.severity.log_prior,
+            severity_prob=self.severity.log_prob.astype(np.float16),
+            severity_known=np.packbits(self.severity.known),
+            cloud_prior=self.cloud.log_prior,
+            cloud_prob=self.cloud.log_prob.astype(np.float16),
+            cloud_known=np.packbits(self.cloud.known),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IncidentClassifier":
+        with np.load(path) as z:
+            info = json.loads(z["info"].tobytes().decode("utf-8"))
+            if info.get("dims") != _DIMS:
+                raise ValueError(f"{path}: model has {info.get('dims')} dims, expected {_DIMS}")
+            return cls(
+                _Head(SEVERITIES, z["severity_prior"], z["severity_prob"], np.unpackbits(z["severity_known"])[:_DIMS]),
+                _Head(CLOUDS, z["cloud_prior"], z["cloud_prob"], np.unpackbits(z["cloud_known"])[:_DIMS]),
+                info,
+            )
+
+
+def training_text(row: Dict[str, Any]) -> str:
+    return str(row.get(TRAIN_FIELD) or "")
+
+
+def _label_cloud(value: Any) -> Optional[str]:
+    v = str(value or "").strip().lower()
+    return v if v in CLOUDS else None
+
+
+def labeled_rows(*, limit: Optional[int] = None) -> Iterable[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    (text, severity, cloud) of incidents in the DB, newest first. Incidents
+    stored without their alert text (saved before raw_text existed) are
+    skipped.
+    """
+    cursor, seen = None, 0
+    while True:
+        page = repo.query_incidents(limit=5000, cursor=cursor, fields=["severity", "cloud", TRAIN_FIELD])
+        for row in page["items"]:
+            text = training_text(row)
+            if not text.strip():
+                continue
+            yield text, (row.get("severity") or "").upper() or None, _label_cloud(row.get("cloud"))
+            seen += 1
+            if limit is not None and seen >= limit:
+                return
+        cursor = page["next_cursor"]
+        if not cursor:
+            return
+
+
+def evaluate(model: IncidentClassifier, rows: Sequence[Tuple[str, Optional[str], Optional[str]]]) -> Dict[str, Any]:
+    """Accuracy of each head, overall and above CLASSIFIER_MIN_CONFIDENCE."""
+    out: Dict[str, Any] = {}
+    for head, pos in (("severity", 1), ("cloud", 2)):
+        total = right = confident = confident_right = 0
+        for row in rows:
+            if row[pos] is None:
+                continue
+            pred = model.predict(row[0])[pos - 1]
+            total += 1
+            right += pred.label == row[pos]
+            if pred.confidence >= CLASSIFIER_MIN_CONFIDENCE:
+                confident += 1
+                confident_right += pred.label == row[pos]
+        out[head] = {
+            "examples": total,
+            "accuracy": round(right / total, 4) if total else None,
+            "confident_share": round(confident / total, 4) if total else None,
+            "confident_accuracy": round(confident_right / confident, 4) if confident else None,
+        }
+    return out
+
+
+def train(rows: Sequence[Tuple[str, Optional[str], Optional[str]]], *, holdout: float = 0.1, seed: int = 0) -> IncidentClassifier:
+    """
+    Fit on `rows` minus a random `holdout` share, record the held-out
+    accuracy in the model info, then refit on everything.
+    """
+    rows = list(rows)
+    if holdout > 0 and len(rows) >= 20:
+        shuffled = rows[:]
+        random.Random(seed).shuffle(shuffled)
+        cut = int(len(shuffled) * holdout)
+        probe = IncidentClassifier.fit(*zip(*shuffled[cut:]))
+        held_out = evaluate(probe, shuffled[:cut])
+    else:
+        held_out = None
+    model = IncidentClassifier.fit(*zip(*rows))
+    model.info["holdout"] = held_out
+    return model
+
+
+_path = CLASSIFIER_PATH
+_model: Optional[IncidentClassifier] = None
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def get_classifier() -> Optional[IncidentClassifier]:
+    """The model at KLYNX_CLASSIFIER_PATH, loaded once; None if there is none."""
+    global _model, _loaded
+    if not _loaded:
+        with _load_lock:
+            if not _loaded:
+                model = None
+                if os.path.exists(_path):
+                    try:
+                        model = IncidentClassifier.load(_path)
+                        _logger.info("loaded incident classifier from %s", _path)
+                    except Exception:
+                        _logger.exception("could not load incident classifier from %s", _path)
+                _model, _loaded = model, True
+    return _model
+
+
+def load_classifier(path: Optional[str] = None) -> Optional[IncidentClassifier]:
+    """(Re)load the model, e.g. at startup or after retraining."""
+    global _path, _loaded
+    with _load_lock:
+        _path = path or _path
+        _loaded = False
+    return get_classifier()
+
+
+def confident(text: str, min_confidence: float = CLASSIFIER_MIN_CONFIDENCE) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (severity, cloud) predicted for `text`, each None unless the model is
+    loaded and at least `min_confidence` sure.
+    """
+    model = get_classifier()
+    if model is None:
+        return None, None
+    sev, cloud = model.predict(text)
+    return (
+        sev.label if sev.confidence >= min_confidence else None,
+        cloud.label if cloud.confidence >= min_confidence else None,
+    )
+
+
+def classifier_stats() -> Dict[str, Any]:
+    model = get_classifier()
+    return {
+        "loaded": model is not None,
+        "path": _path,
+        "info": model.info if model is not None else None,
+        "predictions": _predictions.value,
+        "predict_ms": _predict_ms.snapshot(),
+    }
+
+
+def main() -> None:
+    # python incident_classifier.py --out data/incident_classifier.npz
+    ap = argparse.ArgumentParser(
+        description="Train the severity/cloud classifier from the incidents DB (INCIDENTS_DB_PATH)."
+    )
+    ap.add_argument("--out", default=CLASSIFIER_PATH)
+    ap.add_argument("--limit", type=int, default=None, help="newest N incidents only")
+    ap.add_argument("--holdout", type=float, default=0.1)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    start = time.perf_counter()
+    rows = list(labeled_rows(limit=args.limit))
+    model = train(rows, holdout=args.holdout)
+    model.save(args.out)
+    _logger.info(
+        "trained on %d incidents in %.2f s: %s (%d bytes), holdout %s",
+        len(rows), time.perf_counter() - start, args.out, os.path.getsize(args.out), model.info.get("holdout"),
+    )
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,21 @@
 from __future__ import annotations
 
 import os
-import json
 import re
-from typing import List, Optional
+import time
+import asyncio
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from models import Incident
+from text_matcher import Matcher
+import rule_engine
+from analysis_cache import cache_key, get_analysis_cache, rebind, volatile_values
+from prompt_compactor import compact_alert_text
+from json_stream import JSONObjectStream
+from incident_classifier import CLASSIFIER_SKIP_LLM_CONFIDENCE, confident, get_classifier
+from metrics import counter, histogram
 
 try:
     from openai import OpenAI  # type: ignore
@@ -12,7 +23,58 @@ try:
 except Exception:
     _openai_client = None
 
-_REGION_CANDIDATES = ["us-east-1","us-west-2","eu-west-1","ap-south-1","westeurope","eastus","centralus","us-central1"]
+_logger = logging.getLogger("klynx.incident_engine")
+
+# How long analyze_cloud_issue_async waits for the LLM before answering
+# with the heuristic analysis.
+LLM_DEADLINE_S = float(os.getenv("KLYNX_LLM_DEADLINE_S", "3"))
+# Threads for blocking LLM calls, so they never run on the event loop.
+LLM_WORKERS = int(os.getenv("KLYNX_LLM_WORKERS", "4"))
+# Stream LLM answers and parse them as they arrive, so fields are usable
+# before the completion ends; off waits for the whole completion.
+LLM_STREAM = os.getenv("KLYNX_LLM_STREAM", "true").lower() in ("1", "true", "yes")
+# analyze_cloud_issue_async answers once these LLM fields have streamed in
+# (the rest upgrades the incident later); empty waits for the whole answer.
+LLM_EARLY_FIELDS = tuple(f.strip() for f in os.getenv("KLYNX_LLM_EARLY_FIELDS", "severity,summary").split(",") if f.strip())
+
+# analyze_many(): LLM calls in flight at once, per-item budget (including
+# retries, counted once the item has a slot) and retries per item. Bursts
+# get their own threads so a replay cannot starve interactive analyses.
+LLM_BATCH_CONCURRENCY = int(os.getenv("KLYNX_LLM_BATCH_CONCURRENCY", "16"))
+LLM_BATCH_DEADLINE_S = float(os.getenv("KLYNX_LLM_BATCH_DEADLINE_S", "30"))
+# Optional cap on a whole analyze_many() call, from when it starts; items
+# still without an answer then keep the heuristic (0 = no cap).
+LLM_BATCH_TOTAL_DEADLINE_S = float(os.getenv("KLYNX_LLM_BATCH_TOTAL_DEADLINE_S", "0"))
+LLM_RETRIES = int(os.getenv("KLYNX_LLM_RETRIES", "2"))
+_RETRY_BASE_S = 0.5
+
+_llm_executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+_batch_executor = ThreadPoolExecutor(max_workers=max(1, LLM_BATCH_CONCURRENCY), thread_name_prefix="llm-batch")
+_llm_ms = histogram("analysis_llm_ms")
+_heuristic_ms = histogram("analysis_heuristic_ms")
+_llm_errors = counter("analysis_llm_errors")
+_llm_deadline_missed = counter("analysis_llm_deadline_missed")
+_llm_retries = counter("analysis_llm_retries")
+_llm_skipped = counter("analysis_llm_skipped")
+_llm_severity_ms = histogram("analysis_llm_severity_ms")
+_llm_repaired = counter("analysis_llm_repaired")
+_llm_early = counter("analysis_llm_early")
+
+# Cloud keyword tags for the heuristic analyzer, all found in one Matcher
+# pass. Incident categories live in rules/ (see rule_engine).
+_MATCHER = Matcher({
+    "aws": ["aws","ec2","lambda","vpc","route 53","alb","cloudwatch","rds","eks"],
+    "azure": ["azure","app service","aks","resource group","eastus","westeurope"],
+    "gcp": ["gcp","gke","cloud run","us-central1","projects/"],
+    "kubernetes": ["kubernetes","k8s","pod","deployment","node not ready"],
+})
+
+def extract_resources(message_text: str) -> List[str]:
+    """
+    Cloud resource ids mentioned in the text (vpc-, eni-, i-, sg-, subnet-),
+    de-duplicated in order of appearance.
+    """
+    return _MATCHER.scan(message_text).resources
 
 def _decide(incident: Incident) -> str:
     if not incident.raw_text or incident.raw_text.strip() in ("<@U0A2NUD5JNP>", "<@"):
@@ -23,32 +85,23 @@ def _decide(incident: Incident) -> str:
         return "dry_run_only"
     return "needs_more_info"
 
-def _llm_analyze_issue(message_text: str) -> Incident:
-    if _openai_client is None:
-        raise RuntimeError("OpenAI client not available")
-
-    model = os.environ.get("OPENAI_MODEL", "gpt-4.1-mini")
-
-    system_prompt = (
-        "You are a senior cloud SRE (AWS/Azure/GCP/Kubernetes). "
-        "Given a message describing an incident, return ONLY valid JSON with keys: "
-        "severity, summary, probable_cause, suggested_steps, auto_fix_plan, cloud_provider, region, resources. "
-        "severity must be one of SEV-1..SEV-5. "
-        "cloud_provider must be aws|azure|gcp|kubernetes|unknown. "
-        "resources is a list of ids/names. Do not include any extra text."
-    )
-
-    resp = _openai_client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role":"system","content":system_prompt},
-            {"role":"user","content":message_text},
-        ],
-        temperature=0.2,
-    )
-    content = resp.choices[0].message.content.strip()
-    data = json.loads(content)
+_SYSTEM_PROMPT = (
+    "You are a senior cloud SRE (AWS/Azure/GCP/Kubernetes). "
+    "Given a message describing an incident, return ONLY valid JSON with keys: "
+    "severity, summary, probable_cause, suggested_steps, auto_fix_plan, cloud_provider, region, resources. "
+    "severity must be one of SEV-1..SEV-5. "
+    "cloud_provider must be aws|azure|gcp|kubernetes|unknown. "
+    "resources is a list of ids/names. Do not include any extra text."
+)
 
+def _incident_from_analysis(data: dict, message_text: str, *, cached: bool = False) -> Incident:
+    resources = list(data.get("resources",[]) or [])
+    if cached:
+        # The cache key ignores resource ids, so take them from this message
+        # and keep only the names the analysis found beyond those.
+        resources = extract_resources(message_text) + [
+            r for r in resources if not extract_resources(str(r))
+        ]
     inc = Incident(
         severity=data.get("severity","SEV-3"),
         summary=data.get("summary","Cloud / DevOps incident reported"),
@@ -57,96 +110,131 @@ def _llm_analyze_issue(message_text: str) -> Incident:
         auto_fix_plan=list(data.get("auto_fix_plan",[]) or []),
         cloud_provider=data.get("cloud_provider","unknown"),
         region=data.get("region"),
-        resources=list(data.get("resources",[]) or []),
+        resources=resources,
         raw_text=message_text,
     )
     inc.decision = _decide(inc)
     return inc
 
+def _completion_chunks(model: str, prompt: str, timeout: Optional[float] = None) -> Iterator[str]:
+    kwargs: Dict[str, Any] = dict(
+        model=model,
+        messages=[
+            {"role":"system","content":_SYSTEM_PROMPT},
+            {"role":"user","content":prompt},
+        ],
+        temperature=0.2,
+    )
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    if not LLM_STREAM:
+        yield _openai_client.chat.completions.create(**kwargs).choices[0].message.content or ""
+        return
+    for chunk in _openai_client.chat.completions.create(stream=True, **kwargs):
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def _llm_analysis(
+    message_text: str,
+    on_field: Optional[Callable[[str, Any], None]] = None,
+    give_up: Optional[float] = None,
+) -> Tuple[dict, Optional[Dict[str, int]]]:
+    """
+    The LLM's JSON analysis of `message_text`, plus the prompt's token
+    counts before/after compaction (None when the cache answered).
+
+    The answer is parsed as it streams in and each top-level field goes to
+    `on_field` (on this thread) as soon as it is complete. Malformed or
+    truncated answers are repaired, keeping the fields that parse, and are
+    not cached. Past `give_up` (a time.monotonic() value) the LLM is not
+    called, or stops being read: nobody waits for the answer any more.
+    """
+    if _openai_client is None:
+        raise RuntimeError("OpenAI client not available")
+
+    model = os.environ.get("OPENAI_MODEL", "gpt-4.1-mini")
+    cache = get_analysis_cache()
+    key = cache_key(message_text, model=model, prompt=_SYSTEM_PROMPT)
+    cached = cache.get(key, message_text)
+    if cached is not None:
+        return cached, None
+
+    timeout = None
+    if give_up is not None:
+        timeout = give_up - time.monotonic()
+        if timeout <= 0:
+            raise TimeoutError("LLM deadline passed before the call")
+
+    prompt = compact_alert_text(message_text, model=model)
+    _logger.debug("LLM prompt: %d tokens, %d before compaction", prompt.tokens_after, prompt.tokens_before)
+    parser = JSONObjectStream()
+    start = time.perf_counter()
+    chunks = _completion_chunks(model, prompt.text, timeout)
+    try:
+        for chunk in chunks:
+            if give_up is not None and time.monotonic() >= give_up:
+                raise TimeoutError("LLM deadline passed mid-answer")
+            for field, value in parser.feed(chunk):
+                if field == "severity":
+                    _llm_severity_ms.observe((time.perf_counter() - start) * 1000.0)
+                if on_field is not None:
+                    on_field(field, value)
+    except Exception as e:
+        # A stream that broke off is a truncated answer: keep what arrived.
+        if not parser.fields:
+            raise
+        _logger.warning("LLM stream failed after %d fields: %s", len(parser.fields), e)
+    finally:
+        chunks.close()
+        _llm_ms.observe((time.perf_counter() - start) * 1000.0)
+    data = parser.close()
+    if not data:
+        raise ValueError("LLM answer has no JSON object")
+    if parser.repaired:
+        _llm_repaired.inc()
+        _logger.warning("LLM answer was malformed; kept %s", ", ".join(data))
+    else:
+        cache.put(key, model, data, message_text)
+    return data, {"before": prompt.tokens_before, "after": prompt.tokens_after}
+
+def _llm_analyze_issue(message_text: str, on_field: Optional[Callable[[str, Any], None]] = None) -> Incident:
+    data, tokens = _llm_analysis(message_text, on_field)
+    inc = _incident_from_analysis(data, message_text, cached=tokens is None)
+    inc.prompt_tokens = tokens
+    return inc
+
 def _heuristic_analyze_issue(message_text: str) -> Incident:
-    text_lower = (message_text or "").lower()
+    match = _MATCHER.scan(message_text)
     probable_cause: List[str] = []
     steps: List[str] = []
     fix_plan: List[str] = []
     severity = "SEV-3"
     summary = "Cloud / DevOps incident reported"
-    region: Optional[str] = None
-    resources: List[str] = []
+    region: Optional[str] = match.region
+    resources: List[str] = match.resources
     cloud_provider = "unknown"
+    region_cloud = match.region_cloud
 
-    for r in _REGION_CANDIDATES:
-        if r in text_lower:
-            region = r
-            break
-
-    if any(k in text_lower for k in ["aws","ec2","lambda","vpc","route 53","alb","cloudwatch","rds","eks"]):
+    if match.has("aws"):
         cloud_provider = "aws"
-    elif any(k in text_lower for k in ["azure","app service","aks","resource group","eastus","westeurope"]):
+    elif match.has("azure") or region_cloud == "azure":
         cloud_provider = "azure"
-    elif any(k in text_lower for k in ["gcp","gke","cloud run","us-central1","projects/"]):
+    elif match.has("gcp") or region_cloud == "gcp":
         cloud_provider = "gcp"
-    elif any(k in text_lower for k in ["kubernetes","k8s","pod","deployment","node not ready"]):
+    elif match.has("kubernetes"):
         cloud_provider = "kubernetes"
+    elif region_cloud:
+        cloud_provider = region_cloud
 
-    for pat in [r"(vpc-[0-9a-f]+)", r"(eni-[0-9a-f]+)", r"(i-[0-9a-f]+)", r"(sg-[0-9a-f]+)", r"(subnet-[0-9a-f]+)"]:
-        for m in re.findall(pat, message_text or "", flags=re.IGNORECASE):
-            resources.append(m)
-
-    if "unable to delete vpc" in text_lower or "unable to remove vpc" in text_lower:
-        summary = "Unable to delete VPC"
-        severity = "SEV-3"
-        cloud_provider = "aws"
-        probable_cause = [
-            "VPC still has dependent resources (subnets, ENIs, NAT gateways, IGW, route tables, SGs, endpoints)",
-            "ENIs are still attached to services (Lambda, EKS, ALB, RDS, etc.)",
-        ]
-        steps = [
-            "List and delete subnets; detach and delete IGW; delete NAT gateways; remove VPC endpoints.",
-            "Find and delete/detach ENIs and security groups that reference the VPC.",
-            "Retry VPC deletion after dependencies are removed.",
-        ]
-        fix_plan = [
-            "Enumerate dependent resources (subnets, NAT, IGW, endpoints, ENIs).",
-            "Safely detach/delete unused dependents.",
-            "Re-attempt VPC deletion.",
-        ]
-
-    elif "insufficient subnets" in text_lower and "lambda" in text_lower:
-        summary = "Lambda deployment failing: insufficient subnets"
-        severity = "SEV-2"
-        cloud_provider = "aws"
-        probable_cause = [
-            "Lambda is configured for VPC but selected subnets are invalid/exhausted",
-            "Subnets have no free IPs or are not in distinct AZs",
-        ]
-        steps = [
-            "Check Lambda VPC config (subnets/security groups).",
-            "Select >=2 subnets across different AZs with free IP capacity.",
-            "Redeploy/update stack.",
-        ]
-        fix_plan = [
-            "Validate subnet health and IP availability.",
-            "Update Lambda config to use healthy subnets in >=2 AZs.",
-        ]
-
-    elif "503" in text_lower or "504" in text_lower or "bad gateway" in text_lower:
-        summary = "ALB / upstream 5xx errors observed"
-        severity = "SEV-2"
-        cloud_provider = "aws"
-        probable_cause = [
-            "Targets unhealthy or failing health checks",
-            "Upstream timeouts / saturation / dependency failures",
-        ]
-        steps = [
-            "Check ALB target group health; verify health check path/port/timeouts.",
-            "Review app logs and downstream dependencies (DB, cache, external APIs).",
-            "Check scaling and CPU/memory saturation.",
-        ]
-        fix_plan = [
-            "If safe: increase target group timeout and/or scale service.",
-            "Recycle unhealthy targets after confirming deploy stability.",
-        ]
-
+    rule = rule_engine.evaluate(message_text).first("incident")
+    if rule is not None:
+        fields = rule.render("incident", region=region or "unknown", cloud=cloud_provider)
+        summary = fields.get("summary", summary)
+        severity = fields.get("severity", severity)
+        cloud_provider = fields.get("cloud_provider", cloud_provider)
+        probable_cause = list(fields.get("probable_cause", []))
+        steps = list(fields.get("suggested_steps", []))
+        fix_plan = list(fields.get("auto_fix_plan", []))
     else:
         if not (message_text or "").strip() or re.fullmatch(r"<@[^>]+>", (message_text or "").strip()):
             summary = "No issue described in the message."
@@ -155,6 +243,11 @@ def _heuristic_analyze_issue(message_text: str) -> Incident:
             steps = ["Ask the user to share the error text/log snippet or screenshot."]
             fix_plan = ["No action until more information is provided."]
         else:
+            # No rule: the trained classifier's labels, when it is sure of them.
+            learned_severity, learned_cloud = confident(message_text)
+            severity = learned_severity or severity
+            if cloud_provider == "unknown" and learned_cloud:
+                cloud_provider = learned_cloud
             probable_cause = ["Underlying service may be unhealthy or missing required dependencies."]
             steps = [
                 "Identify the primary component and timeframe.",
@@ -173,15 +266,254 @@ def _heuristic_analyze_issue(message_text: str) -> Incident:
         region=region,
         resources=resources,
         raw_text=message_text or "",
+        rule_id=rule.id if rule is not None else None,
     )
     inc.decision = _decide(inc)
     return inc
 
+def _heuristic_timed(message_text: str) -> Incident:
+    start = time.perf_counter()
+    try:
+        return _heuristic_analyze_issue(message_text)
+    finally:
+        _heuristic_ms.observe((time.perf_counter() - start) * 1000.0)
+
+def _local_analysis(message_text: str, heuristic: Optional[Incident] = None) -> Optional[Incident]:
+    """
+    The heuristic incident, without the LLM, when the trained classifier is
+    sure enough of both severity and cloud. With no rule matched it takes
+    the classifier's labels; a rule's labels are kept, and only answered
+    locally when the classifier agrees with them.
+    """
+    model = get_classifier()
+    if model is None or CLASSIFIER_SKIP_LLM_CONFIDENCE > 1:
+        return None
+    severity, cloud = model.predict(message_text)
+    if min(severity.confidence, cloud.confidence) < CLASSIFIER_SKIP_LLM_CONFIDENCE:
+        return None
+    inc = heuristic or _heuristic_timed(message_text)
+    if inc.rule_id is not None:
+        if severity.label != inc.severity or cloud.label not in ("unknown", inc.cloud_provider):
+            return None
+    else:
+        inc.severity = severity.label
+        if cloud.label != "unknown" or inc.cloud_provider == "unknown":
+            inc.cloud_provider = cloud.label
+        inc.decision = _decide(inc)
+    _llm_skipped.inc()
+    return inc
+
 def analyze_cloud_issue(message_text: str) -> Incident:
+    if _openai_client is not None:
+        local = _local_analysis(message_text)
+        if local is not None:
+            return local
     try:
         return _llm_analyze_issue(message_text)
     except Exception:
-        return _heuristic_analyze_issue(message_text)
+        if _openai_client is not None:
+            _llm_errors.inc()
+        return _heuristic_timed(message_text)
+
+_FIELD_TYPES = {
+    "severity": str, "summary": str, "cloud_provider": str, "region": str,
+    "probable_cause": list, "suggested_steps": list, "auto_fix_plan": list,
+}
+
+def _with_fields(inc: Incident, fields: Dict[str, Any]) -> Incident:
+    """`inc` with the well-typed analysis fields in `fields` applied."""
+    for field, value in fields.items():
+        if isinstance(value, _FIELD_TYPES.get(field, ())):
+            setattr(inc, field, value)
+    inc.decision = _decide(inc)
+    return inc
+
+async def analyze_cloud_issue_async(
+    message_text: str, *, deadline_s: Optional[float] = None
+) -> Tuple[Incident, Optional["asyncio.Future[Incident]"]]:
+    """
+    Non-blocking analyze_cloud_issue for async handlers.
+
+    The LLM call runs on a worker thread while the heuristic analysis is
+    computed. If the LLM answers within `deadline_s` (KLYNX_LLM_DEADLINE_S)
+    its incident is returned. Otherwise the heuristic one is, carrying the
+    LLM fields that have streamed in so far; it is returned as soon as
+    all of KLYNX_LLM_EARLY_FIELDS (severity, summary) have, without
+    waiting for the deadline. The future for the late LLM answer comes
+    with it so the caller can upgrade what it stored (see
+    await_llm_upgrade); it is None when there is nothing left to wait for.
+    """
+    if _openai_client is None:
+        return _heuristic_timed(message_text), None
+    local = _local_analysis(message_text)
+    if local is not None:
+        return local, None
+    deadline = LLM_DEADLINE_S if deadline_s is None else deadline_s
+    loop = asyncio.get_running_loop()
+    streamed: Dict[str, Any] = {}
+    early = asyncio.Event()
+
+    def got_field(field: str, value: Any) -> None:
+        streamed[field] = value
+        if LLM_EARLY_FIELDS and all(f in streamed for f in LLM_EARLY_FIELDS):
+            early.set()
+
+    def on_field(field: str, value: Any) -> None:
+        # Called on the LLM thread; the fields belong to the loop.
+        try:
+            loop.call_soon_threadsafe(got_field, field, value)
+        except RuntimeError:
+            pass  # loop closed
+
+    pending = loop.run_in_executor(_llm_executor, _llm_analyze_issue, message_text, on_field)
+    heuristic = _heuristic_timed(message_text)
+    waiter = asyncio.ensure_future(early.wait())
+    try:
+        await asyncio.wait({pending, waiter}, timeout=max(deadline, 0), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        waiter.cancel()
+    if not pending.done():
+        if early.is_set():
+            _llm_early.inc()
+        else:
+            _llm_deadline_missed.inc()
+        return _with_fields(heuristic, streamed), pending
+    try:
+        inc = pending.result()
+    except Exception:
+        _llm_errors.inc()
+        _logger.exception("LLM analysis failed; using heuristic")
+        return heuristic, None
+    inc.incident_id = heuristic.incident_id
+    return inc, None
+
+async def await_llm_upgrade(pending: "asyncio.Future[Incident]", incident_id: str) -> Optional[Incident]:
+    """
+    The late LLM incident from analyze_cloud_issue_async, renamed to
+    `incident_id`, or None if the call failed.
+    """
+    try:
+        inc = await pending
+    except Exception:
+        _llm_errors.inc()
+        _logger.exception("late LLM analysis for %s failed", incident_id)
+        return None
+    inc.incident_id = incident_id
+    return inc
+
+async def _llm_analysis_with_retries(
+    message_text: str, give_up: float, retries: int
+) -> Optional[Tuple[dict, Optional[Dict[str, int]]]]:
+    """
+    _llm_analysis on the batch threads until `give_up` (time.monotonic()).
+    A call still queued when it passes is cancelled; one already running
+    stops reading the answer (see _llm_analysis).
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(retries + 1):
+        remaining = give_up - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(_batch_executor, _llm_analysis, message_text, None, give_up), timeout=remaining
+            )
+        except asyncio.TimeoutError:
+            break
+        except Exception as e:
+            _llm_errors.inc()
+            if attempt == retries:
+                _logger.warning("LLM analysis failed after %d attempts: %s", attempt + 1, e)
+                return None
+            _llm_retries.inc()
+            # Exponential backoff with jitter, within the item's budget.
+            delay = _RETRY_BASE_S * (2 ** attempt) * random.uniform(0.5, 1.0)
+            await asyncio.sleep(min(delay, max(give_up - time.monotonic(), 0)))
+    _llm_deadline_missed.inc()
+    return None
+
+async def analyze_many(
+    texts: Iterable[str],
+    *,
+    concurrency: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+    retries: Optional[int] = None,
+    total_deadline_s: Optional[float] = None,
+) -> List[Tuple[Incident, str]]:
+    """
+    Analyze a burst of messages. Returns (incident, source) per input, in
+    input order; source is "llm", "cache", "local" (the classifier was
+    sure enough to skip the LLM) or "heuristic".
+
+    Heuristic analyses are computed first, one input after another in a
+    single job on a worker thread (not vectorized: each is a regex scan
+    plus a rule lookup), and stand wherever the LLM is unavailable, keeps
+    failing after `retries` retries or misses the per-item `deadline_s`,
+    counted from when the item gets one of the `concurrency` slots. With
+    `total_deadline_s` (KLYNX_LLM_BATCH_TOTAL_DEADLINE_S) > 0 no item is
+    waited for past that many seconds after the call either. Inputs that
+    normalize to the same text share one LLM call.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    loop = asyncio.get_running_loop()
+    total = LLM_BATCH_TOTAL_DEADLINE_S if total_deadline_s is None else total_deadline_s
+    batch_give_up = time.monotonic() + total if total > 0 else None
+
+    def first_pass() -> List[Tuple[Incident, str]]:
+        out = []
+        for t in texts:
+            inc = _heuristic_timed(t)
+            local = _openai_client is not None and _local_analysis(t, inc) is not None
+            out.append((inc, "local" if local else "heuristic"))
+        return out
+
+    results = await loop.run_in_executor(_batch_executor, first_pass)
+    heuristics = [inc for inc, _ in results]
+    if _openai_client is None:
+        return results
+
+    deadline = LLM_BATCH_DEADLINE_S if deadline_s is None else deadline_s
+    attempts = LLM_RETRIES if retries is None else max(0, retries)
+    sem = asyncio.Semaphore(max(1, min(concurrency or LLM_BATCH_CONCURRENCY, LLM_BATCH_CONCURRENCY)))
+    model = os.environ.get("OPENAI_MODEL", "gpt-4.1-mini")
+    groups: Dict[str, List[int]] = {}
+    for i, t in enumerate(texts):
+        if results[i][1] == "local":
+            continue
+        groups.setdefault(cache_key(t, model=model, prompt=_SYSTEM_PROMPT), []).append(i)
+
+    async def run(indices: List[int]) -> None:
+        async with sem:
+            give_up = time.monotonic() + deadline
+            if batch_give_up is not None:
+                give_up = min(give_up, batch_give_up)
+            found = await _llm_analysis_with_retries(texts[indices[0]], give_up, attempts)
+        if found is None:
+            return
+        data, tokens = found
+        source = volatile_values(texts[indices[0]])
+        for n, i in enumerate(indices):
+            # Later members of a group reuse the first one's answer like a
+            # cache hit, with their own ids put in.
+            reused = tokens is None or n > 0
+            mine = rebind(data, source, volatile_values(texts[i])) if n > 0 else data
+            if mine is None:
+                continue
+            try:
+                inc = _incident_from_analysis(mine, texts[i], cached=reused)
+            except Exception:
+                _llm_errors.inc()
+                _logger.exception("unusable LLM analysis; keeping heuristic")
+                return
+            inc.incident_id = heuristics[i].incident_id
+            if not reused:
+                inc.prompt_tokens = tokens
+            results[i] = (inc, "cache" if reused else "llm")
+
+    await asyncio.gather(*(run(ix) for ix in groups.values()))
+    return results
 
 def format_incident_for_slack(incident: Incident) -> str:
     cause_lines = "\n".join(f"- {c}" for c in (incident.probable_cause or ["N/A"]))
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Top-level parser states.
+_START, _KEY, _KEY_STR, _COLON, _VALUE, _IN_VALUE, _AFTER, _END = range(8)
+_TRAILING_COMMA = re.compile(r",\s*([\]}])")
+
+
+def _loads(raw: str) -> Tuple[bool, Any]:
+    try:
+        return True, json.loads(raw)
+    except ValueError:
+        pass
+    # LLMs like trailing commas; retry without them.
+    try:
+        return True, json.loads(_TRAILING_COMMA.sub(r"\1", raw))
+    except ValueError:
+        return False, None
+
+
+class JSONObjectStream:
+    """
+    Incremental parser for one JSON object arriving in chunks (an LLM
+    answer being streamed). feed() returns the top-level fields completed
+    by each chunk, so callers can act on e.g. "severity" before the rest
+    has arrived. close() returns every field it could recover: text before
+    the opening brace (prose, code fences) is skipped, a field that does
+    not parse is dropped, and an answer cut off mid-value keeps that value
+    up to its last complete element. `repaired` is set whenever anything
+    had to be dropped or closed.
+    """
+
+    def __init__(self) -> None:
+        self.fields: Dict[str, Any] = {}
+        self.repaired = False
+        self._text = ""
+        self._pos = 0
+        self._state = _START
+        self._key: Optional[str] = None
+        self._start = 0  # where the current key or value starts
+        self._in_string = False
+        self._escape = False
+        self._scalar = False
+        # Open containers inside the current value: closer, end of the
+        # last complete element, and (objects) whether a ':' was seen.
+        self._stack: List[List[Any]] = []
+
+    @property
+    def done(self) -> bool:
+        return self._state == _END
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        if self._state == _END or not chunk:
+            return []
+        self._text += chunk
+        text = self._text
+        out: List[Tuple[str, Any]] = []
+        i = self._pos
+        n = len(text)
+        while i < n and self._state != _END:
+            c = text[i]
+            state = self._state
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if state == _KEY_STR:
+                        ok, key = _loads(text[self._start:i + 1])
+                        self._key = key if ok else text[self._start + 1:i]
+                        self._state = _COLON
+                    elif not self._stack:
+                        self._complete(i + 1, out)
+                    else:
+                        top = self._stack[-1]
+                        if top[0] == "]" or top[2]:
+                            top[1] = i + 1
+            elif state == _START:
+                if c == "{":
+                    self._state = _KEY
+            elif state == _KEY:
+                if c == '"':
+                    self._start = i
+                    self._in_string = True
+                    self._state = _KEY_STR
+                elif c == "}":
+                    self._state = _END
+            elif state == _COLON:
+                if c == ":":
+                    self._state = _VALUE
+            elif state == _VALUE:
+                if not c.isspace():
+                    self._start = i
+                    self._state = _IN_VALUE
+                    self._scalar = False
+                    if c == '"':
+                        self._in_string = True
+                    elif c in "[{":
+                        self._stack.append(["]" if c == "[" else "}", i + 1, False])
+                    else:
+                        self._scalar = True
+            elif state == _IN_VALUE:
+                if self._scalar:
+                    if c in ",}]" or c.isspace():
+                        self._complete(i, out)
+                        continue  # the delimiter is handled in _AFTER
+                elif c == '"':
+                    self._in_string = True
+                elif c in "[{":
+                    self._stack.append(["]" if c == "[" else "}", i + 1, False])
+                elif c in "]}":
+                    self._stack.pop()
+                    if not self._stack:
+                        self._complete(i + 1, out)
+                    else:
+                        top = self._stack[-1]
+                        if top[0] == "]" or top[2]:
+                            top[1] = i + 1
+                elif c == ",":
+                    top = self._stack[-1]
+                    top[1] = i
+                    top[2] = False
+                elif c == ":":
+                    self._stack[-1][2] = True
+            elif state == _AFTER:
+                if c == ",":
+                    self._state = _KEY
+                elif c == "}":
+                    self._state = _END
+            i += 1
+        self._pos = i
+        return out
+
+    def _complete(self, end: int, out: List[Tuple[str, Any]]) -> None:
+        ok, value = _loads(self._text[self._start:end])
+        if ok and self._key is not None:
+            self.fields[self._key] = value
+            out.append((self._key, value))
+        else:
+            self.repaired = True
+        self._key = None
+        self._state = _AFTER
+
+    def close(self) -> Dict[str, Any]:
+        """Every field recovered from what was fed; no more input expected."""
+        if self._state == _END:
+            return self.fields
+        self.repaired = True
+        if self._state == _IN_VALUE and self._key is not None:
+            raw = self._text[self._start:]
+            if self._scalar:
+                ok, value = _loads(raw.strip())
+            elif not self._stack:
+                # A string value cut off: keep what arrived, minus a half escape.
+                raw = raw[:-1] if self._escape else re.sub(r"(?<!\\)\\u[0-9a-fA-F]{0,3}$", "", raw)
+                ok, value = _loads(raw + '"')
+            else:
+                end = self._stack[-1][1] - self._start
+                closers = "".join(entry[0] for entry in reversed(self._stack))
+                ok, value = _loads(raw[:end].rstrip().rstrip(",") + closers)
+            if ok:
+                self.fields[self._key] = value
+        self._state = _END
+        return self.fields
+
+
+def parse_json_object(text: str) -> Tuple[Dict[str, Any], bool]:
+    """
+    The JSON object in `text` and whether it had to be repaired (see
+    JSONObjectStream). Well-formed objects take the json.loads fast path.
+    """
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data, False
+    except ValueError:
+        pass
+    stream = JSONObjectStream()
+    stream.feed(text)
+    fields = stream.close()
+    return fields, stream.repaired
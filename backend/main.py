@@ -1,8 +1,16 @@
-from fastapi import FastAPI
+import json
+from typing import Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import Body
-from history_repository import init_db, list_incidents, get_incident_by_thread_ts
+from history_repository import init_db, query_incidents, change_cursor, get_incident_by_thread_ts, export_incidents, decode_cursor, incident_changes, find_incidents_by_resource, start_retention_worker, start_codec_migration, shutdown as shutdown_db
 from slack_handler import slack_router
+from otel_handler import otel_router
+from ui_dashboard import ui_router
+from incident_classifier import load_classifier
+from similarity_index import start_similarity_index
+import async_repository
 
 app = FastAPI(title="KLYNX AI Backend", version="1.0.0")
 
@@ -16,24 +24,130 @@ app.add_middleware(
 
 init_db()
 
+@app.on_event("startup")
+def on_startup():
+    # Both are no-ops unless enabled via INCIDENTS_RETENTION_DAYS / INCIDENTS_BLOB_CODEC_MIGRATE.
+    start_retention_worker()
+    start_codec_migration()
+    # Builds the similar-incident index in the background.
+    start_similarity_index()
+    # No-op without a trained model at KLYNX_CLASSIFIER_PATH.
+    load_classifier()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    # Drain in-flight async DB calls, then flush any write-behind queue.
+    async_repository.shutdown()
+    shutdown_db()
+
 @app.get("/")
 def root():
     return {"status": "ok", "service": "klynx-ai-backend"}
 
 # Slack
 app.include_router(slack_router)
+# OTel alerts and batch ingest
+app.include_router(otel_router)
 
 # --- APIs for Web UI ---
 
 @app.get("/api/incidents")
-def api_list_incidents(limit: int = 50):
-    return {"items": list_incidents(limit=limit)}
+def api_list_incidents(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    severity: Optional[str] = None,
+    cloud: Optional[str] = None,
+    region: Optional[str] = None,
+    channel_id: Optional[str] = None,
+    fields: str = "summary",
+):
+    try:
+        # Taken before the list so nothing written in between is missed.
+        changes_cursor = change_cursor()
+        page = query_incidents(
+            limit=min(max(limit, 1), 500),
+            cursor=cursor,
+            status=status,
+            severity=severity,
+            cloud=cloud,
+            region=region,
+            channel_id=channel_id,
+            fields=fields,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": page["items"], "next_cursor": page["next_cursor"], "changes_cursor": changes_cursor}
+
+@app.get("/api/incidents/export")
+def api_export_incidents(
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    severity: Optional[str] = None,
+    cloud: Optional[str] = None,
+    region: Optional[str] = None,
+    channel_id: Optional[str] = None,
+):
+    # Validate up front: errors raised once streaming has started can't become a 400.
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    def lines():
+        chunk = []
+        for inc in export_incidents(
+            cursor=cursor, status=status, severity=severity, cloud=cloud, region=region, channel_id=channel_id
+        ):
+            chunk.append(json.dumps(inc, ensure_ascii=False))
+            if len(chunk) >= 500:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="incidents.ndjson"'},
+    )
+
+@app.get("/api/incidents/changes")
+def api_incident_changes(since: Optional[str] = None, limit: int = 200, fields: Optional[str] = "summary"):
+    try:
+        return incident_changes(since=since, limit=min(max(limit, 1), 1000), fields=fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/incidents/by-resource/{resource_id}")
+def api_incidents_by_resource(
+    resource_id: str,
+    prefix: bool = False,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = "summary",
+):
+    try:
+        return find_incidents_by_resource(
+            resource_id, prefix=prefix, limit=min(max(limit, 1), 500), cursor=cursor, fields=fields
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/api/incidents/by-thread/{thread_ts}")
-def api_incident(thread_ts: str):
-    inc = get_incident_by_thread_ts(thread_ts)
+def api_incident(thread_ts: str, fields: Optional[str] = None):
+    try:
+        inc = get_incident_by_thread_ts(thread_ts, fields=fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"item": inc}
 
+# Dashboard routes (search, stats, change stream, timeline, similar
+# incidents, metrics, ...). Mounted after the routes above so its
+# /api/incidents/{thread_ts} cannot shadow /api/incidents/export and friends.
+app.include_router(ui_router)
+
 @app.post("/chat")
 async def chat(message: dict = Body(...)):
     return {
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+# Upper bounds (milliseconds) for latency histograms; the last bucket is open-ended.
+DEFAULT_BUCKETS_MS: Sequence[float] = (
+    0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000,
+)
+
+
+class Counter:
+    """
+    Thread-safe monotonically increasing counter.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def snapshot(self) -> int:
+        return self._value
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Quantiles are approximated by the upper bound
+    of the bucket they fall in, which is plenty for dashboards.
+    """
+
+    def __init__(self, buckets: Optional[Sequence[float]] = None) -> None:
+        self._bounds: List[float] = list(buckets or DEFAULT_BUCKETS_MS)
+        self._counts: List[int] = [0] * (len(self._bounds) + 1)
+        self._lock = threading.Lock()
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    def observe(self, value: float) -> None:
+        idx = len(self._bounds)
+        for i, bound in enumerate(self._bounds):
+            if value <= bound:
+                idx = i
+                break
+        with self._lock:
+            self._counts[idx] += 1
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    def _quantile(self, q: float) -> float:
+        if not self._count:
+            return 0.0
+        target = q * self._count
+        seen = 0
+        for i, c in enumerate(self._counts):
+            seen += c
+            if seen >= target:
+                return self._bounds[i] if i < len(self._bounds) else self._max
+        return self._max
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "count": self._count,
+                "sum": round(self._sum, 3),
+                "avg": round(self._sum / self._count, 3) if self._count else 0.0,
+                "max": round(self._max, 3),
+                "p50": self._quantile(0.50),
+                "p95": self._quantile(0.95),
+                "p99": self._quantile(0.99),
+            }
+
+
+_registry: Dict[str, Any] = {}
+_registry_lock = threading.Lock()
+
+
+def counter(name: str) -> Counter:
+    with _registry_lock:
+        m = _registry.get(name)
+        if m is None:
+            m = _registry[name] = Counter()
+        return m
+
+
+def histogram(name: str, buckets: Optional[Sequence[float]] = None) -> Histogram:
+    with _registry_lock:
+        m = _registry.get(name)
+        if m is None:
+            m = _registry[name] = Histogram(buckets)
+        return m
+
+
+def snapshot() -> Dict[str, Any]:
+    with _registry_lock:
+        items = list(_registry.items())
+    return {name: m.snapshot() for name, m in sorted(items)}
@@ -15,6 +15,10 @@ class Incident(BaseModel):
     region: Optional[str] = None
     resources: List[str] = Field(default_factory=list)
     raw_text: str = ""
+    # Id of the rule that set the heuristic analysis, if one matched.
+    rule_id: Optional[str] = None
+    # Estimated prompt tokens of the alert text before/after compaction, when the LLM was called.
+    prompt_tokens: Optional[Dict[str, int]] = None
 
 class AutoFixResult(BaseModel):
     ok: bool
@@ -34,3 +38,9 @@ class OTelAlert(BaseModel):
 
 class OTelPayload(BaseModel):
     alerts: List[OTelAlert] = Field(default_factory=list)
+
+class AlertBatch(BaseModel):
+    alerts: List[OTelAlert] = Field(default_factory=list)
+    messages: List[str] = Field(default_factory=list)
+    channel_id: str = "batch"
+    fold_duplicates: bool = True
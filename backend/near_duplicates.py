@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from analysis_cache import alert_tokens
+from history_repository import RESOLVED_STATUSES, add_status_listener
+from metrics import counter, histogram
+
+# Alerts this similar (estimated Jaccard over word 3-grams) fold into the earlier incident.
+DEDUP_THRESHOLD = float(os.getenv("KLYNX_DEDUP_THRESHOLD", "0.7"))
+# How long after it opened an incident keeps absorbing look-alikes; 0 disables folding.
+DEDUP_WINDOW_S = float(os.getenv("KLYNX_DEDUP_WINDOW_S", "900"))
+DEDUP_MAX_ENTRIES = int(os.getenv("KLYNX_DEDUP_MAX_ENTRIES", "10000"))
+
+# Only the head of very long payloads is shingled; it bounds the per-call cost.
+_MAX_CHARS = 8192
+_SHINGLE = 3
+_MASK = (1 << 64) - 1
+_EMPTY = _MASK
+
+# (thread_ts, kind, data, actor), as taken by append_incident_events().
+Event = Tuple[str, str, Optional[Dict[str, Any]], Optional[str]]
+
+
+class DuplicateEntry:
+    __slots__ = ("key", "incident_id", "scope", "created", "folded", "sig", "bands")
+
+    def __init__(self, key: str, incident_id: str, scope: str, sig: "array[int]", bands: List[int]) -> None:
+        self.key = key
+        self.incident_id = incident_id
+        self.scope = scope
+        self.created = time.monotonic()
+        self.folded = 0
+        self.sig = sig
+        self.bands = bands
+
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSH index of recent alert texts, for folding alert storms
+    into the incident that is already open.
+
+    Texts are normalized like analysis-cache keys (ids and timestamps
+    removed), cut into word 3-grams and hashed once each; a
+    one-permutation MinHash of `perms` slots is split into `bands` LSH
+    bands, so a lookup only compares signatures that share a band with
+    the query. Entries expire `window_s` after they were registered (an
+    alert that keeps firing opens a new incident once the window is over)
+    and the oldest are evicted beyond `max_entries`.
+    """
+
+    def __init__(
+        self,
+        *,
+        threshold: float = DEDUP_THRESHOLD,
+        window_s: float = DEDUP_WINDOW_S,
+        max_entries: int = DEDUP_MAX_ENTRIES,
+        perms: int = 64,
+        bands: int = 16,
+    ) -> None:
+        if perms % bands:
+            raise ValueError("perms must be a multiple of bands")
+        self.threshold = threshold
+        self.window_s = window_s
+        self.max_entries = max_entries
+        self.perms = perms
+        self.bands = bands
+        self._rows = perms // bands
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, DuplicateEntry]" = OrderedDict()
+        # band key -> entry key, or a list of them once a band collides
+        # (most buckets hold a single entry; a bare str saves the list).
+        self._buckets: Dict[int, Union[str, List[str]]] = {}
+        # Keys claimed but not saved yet -> events held until the row exists
+        # (an event appended before the incident row commits would be lost).
+        self._unsaved: Dict[str, List[Event]] = {}
+
+        self._checks = counter("dedup_checks")
+        self._folded = counter("dedup_folded")
+        self._evictions = counter("dedup_evictions")
+        self._check_ms = histogram("dedup_check_ms")
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_s > 0 and self.max_entries > 0
+
+    def signature(self, text: str) -> Optional["array[int]"]:
+        tokens = alert_tokens((text or "")[:_MAX_CHARS])
+        if not tokens:
+            return None
+        # Word 3-grams as tuples: hashing reuses each token's cached str hash.
+        grams = zip(*(tokens[i:] for i in range(_SHINGLE))) if len(tokens) >= _SHINGLE else [tuple(tokens)]
+        k = self.perms
+        sig = [_EMPTY] * k
+        for g in grams:
+            h = hash(g) & _MASK
+            b = h % k
+            v = h // k
+            if v < sig[b]:
+                sig[b] = v
+        if _EMPTY in sig:
+            # Densify: an empty slot borrows the next filled one, offset by
+            # the distance so borrowed values stay distinct across slots.
+            filled = [i for i in range(k) if sig[i] != _EMPTY]
+            dense = list(sig)
+            for i in range(k):
+                if sig[i] == _EMPTY:
+                    j = next((f for f in filled if f > i), filled[0])
+                    dense[i] = sig[j] + ((j - i) % k) * (1 << 58)
+            sig = dense
+        return array("Q", sig)
+
+    def _band_keys(self, sig: "array[int]") -> List[int]:
+        r = self._rows
+        return [hash((b, *sig[b * r:(b + 1) * r])) for b in range(self.bands)]
+
+    def _similarity(self, a: "array[int]", b: "array[int]") -> float:
+        return sum(1 for x, y in zip(a, b) if x == y) / self.perms
+
+    def _evict(self, now: float) -> None:
+        cutoff = now - self.window_s
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.created > cutoff and len(self._entries) <= self.max_entries:
+                break
+            self._drop(key)
+            self._evictions.inc()
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for bk in entry.bands:
+            bucket = self._buckets.get(bk)
+            if bucket is None:
+                continue
+            if isinstance(bucket, str):
+                if bucket == key:
+                    del self._buckets[bk]
+                continue
+            if key in bucket:
+                bucket.remove(key)
+            if len(bucket) == 1:
+                self._buckets[bk] = bucket[0]
+
+    def _best(self, sig: "array[int]", bands: List[int], scope: str) -> Optional[Tuple[DuplicateEntry, float]]:
+        best: Optional[Tuple[DuplicateEntry, float]] = None
+        seen = set()
+        for bk in bands:
+            bucket = self._buckets.get(bk, ())
+            for key in (bucket,) if isinstance(bucket, str) else bucket:
+                if key in seen:
+                    continue
+                seen.add(key)
+                entry = self._entries[key]
+                if entry.scope != scope:
+                    continue
+                sim = self._similarity(sig, entry.sig)
+                if sim >= self.threshold and (best is None or sim > best[1]):
+                    best = (entry, sim)
+        return best
+
+    def claim(
+        self, text: str, *, scope: str, key: str, incident_id: str
+    ) -> Optional[Tuple[DuplicateEntry, float]]:
+        """
+        Atomically either find the incident `text` duplicates within
+        `scope`, returning (entry, similarity), or register `text` as incident `incident_id` under `key` and
+        return None. Call saved(key) once that incident's row is committed,
+        or forget(key) if it is never saved.
+        """
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        sig = self.signature(text)
+        if sig is None:
+            return None
+        bands = self._band_keys(sig)
+        self._checks.inc()
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            found = self._best(sig, bands, scope)
+            if found is not None:
+                # The window stays anchored to when the incident opened.
+                found[0].folded += 1
+                self._folded.inc()
+            else:
+                self._drop(key)
+                self._unsaved[key] = []
+                self._entries[key] = DuplicateEntry(key, incident_id, scope, sig, bands)
+                for bk in bands:
+                    bucket = self._buckets.get(bk)
+                    if bucket is None:
+                        self._buckets[bk] = key
+                    elif isinstance(bucket, str):
+                        self._buckets[bk] = [bucket, key]
+                    else:
+                        bucket.append(key)
+                self._evict(now)
+        self._check_ms.observe((time.perf_counter() - start) * 1000.0)
+        return found
+
+    def hold(self, key: str, event: Event) -> bool:
+        """
+        Keep `event` for incident `key` until saved(key) if that incident's
+        row isn't committed yet. Returns False when the caller should append
+        it now.
+        """
+        with self._lock:
+            held = self._unsaved.get(key)
+            if held is None:
+                return False
+            held.append(event)
+            return True
+
+    def saved(self, key: str) -> List[Event]:
+        """Mark incident `key` as stored; returns the events held for it."""
+        with self._lock:
+            return self._unsaved.pop(key, None) or []
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            self._drop(key)
+            self._unsaved.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._unsaved.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, buckets, unsaved = len(self._entries), len(self._buckets), len(self._unsaved)
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "window_s": self.window_s,
+            "entries": entries,
+            "buckets": buckets,
+            "unsaved": unsaved,
+            "max_entries": self.max_entries,
+            "checks": self._checks.value,
+            "folded": self._folded.value,
+            "evictions": self._evictions.value,
+            "check_ms": self._check_ms.snapshot(),
+        }
+
+
+_index = NearDuplicateIndex()
+
+
+def _on_status(thread_ts: str, status: str) -> None:
+    # Resolved incidents stop absorbing alerts; a re-fire opens a new one.
+    if status in RESOLVED_STATUSES:
+        _index.forget(thread_ts)
+
+
+add_status_listener(_on_status)
+
+
+def get_dedup_index() -> NearDuplicateIndex:
+    return _index
@@ -1,8 +1,14 @@
 from __future__ import annotations
-from fastapi import APIRouter
-from models import OTelPayload
-from incident_engine import analyze_cloud_issue, format_incident_for_slack
-from history_repository import save_incident
+import asyncio
+import logging
+import time
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict, List, Optional, Set
+from models import AlertBatch, Incident, OTelAlert, OTelPayload
+from incident_engine import analyze_cloud_issue_async, analyze_many, await_llm_upgrade, format_incident_for_slack
+from autofix_engine import generate_incident_id
+import async_repository as incidents_db
+from near_duplicates import get_dedup_index
 import os
 
 try:
@@ -13,37 +19,192 @@ except Exception:
 
 otel_router = APIRouter()
 
+# Largest batch /api/alerts/batch accepts in one request.
+BATCH_MAX_ITEMS = int(os.getenv("KLYNX_BATCH_MAX_ITEMS", "10000"))
+
+_logger = logging.getLogger("klynx.otel_handler")
+# Strong refs to background upgrade tasks (the loop only keeps weak ones).
+_background: Set["asyncio.Task[None]"] = set()
+
+def _plan_from_incident(inc: Incident, analysis_text: str) -> Dict[str, Any]:
+    # Same shape as autofix_engine.build_plan so the UI and Slack actions can read it.
+    meta: Dict[str, Any] = {
+        "cloud": inc.cloud_provider,
+        "region": inc.region or "unknown",
+        "severity": inc.severity,
+        "summary": inc.summary,
+    }
+    if inc.prompt_tokens:
+        meta["prompt_tokens"] = inc.prompt_tokens
+    return {
+        "meta": meta,
+        "probable_cause": "; ".join(inc.probable_cause),
+        "analysis_text": analysis_text,
+        "steps": [
+            {"id": f"s{i}", "title": step, "risk": "unknown", "dry_run_cmd": None, "apply_cmd": None}
+            for i, step in enumerate(inc.auto_fix_plan, start=1)
+        ],
+    }
+
+def _incident_fields(inc: Incident, analysis_text: str) -> Dict[str, Any]:
+    return {
+        "severity": inc.severity,
+        "summary": inc.summary,
+        "cloud": inc.cloud_provider,
+        "region": inc.region or "unknown",
+        "resources": ",".join(inc.resources) if inc.resources else "",
+        "probable_cause": "; ".join(inc.probable_cause),
+        "analysis_text": analysis_text,
+        "plan": _plan_from_incident(inc, analysis_text),
+    }
+
+async def _upgrade_when_ready(
+    pending: "asyncio.Future[Incident]", incident_id: str, slack_channel: Optional[str], slack_ts: Optional[str]
+) -> None:
+    inc = await await_llm_upgrade(pending, incident_id)
+    if inc is None:
+        return
+    analysis_text = format_incident_for_slack(inc)
+    await incidents_db.upgrade_incident_analysis(incident_id, **_incident_fields(inc, analysis_text), actor="llm")
+    if _slack and slack_channel and slack_ts:
+        await _slack.chat_update(channel=slack_channel, ts=slack_ts, text="🚨 OTEL Alert → Incident\n\n" + analysis_text)
+
+def _log_task_error(task: "asyncio.Task[None]") -> None:
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        _logger.error("OTel analysis upgrade failed", exc_info=task.exception())
+
+def _alert_line(a: OTelAlert) -> str:
+    title = a.name or a.summary or "OTEL alert"
+    sev = a.severity or "unknown"
+    desc = a.description or ""
+    return f"[{sev}] {title} - {desc}".strip()
+
 @otel_router.post("/api/alerts/otel")
 async def handle_otel(payload: OTelPayload):
     if not payload.alerts:
         return {"status": "no_alerts"}
 
-    parts = []
-    for a in payload.alerts[:20]:
-        title = a.name or a.summary or "OTEL alert"
-        sev = a.severity or "unknown"
-        desc = a.description or ""
-        parts.append(f"[{sev}] {title} - {desc}".strip())
+    # One incident per payload; backlogs go through /api/alerts/batch.
+    parts = [_alert_line(a) for a in payload.alerts[:20]]
 
     combined = "\n".join(parts)
-    inc = analyze_cloud_issue(combined)
-    analysis_text = format_incident_for_slack(inc)
 
-    save_incident(
-        incident_id=inc.incident_id,
-        slack_channel="otel",
-        slack_ts=inc.incident_id,
-        thread_ts=inc.incident_id,
-        severity=inc.severity,
-        summary=inc.summary,
-        cloud_provider=inc.cloud_provider,
-        region=inc.region,
-        resources=",".join(inc.resources) if inc.resources else "",
-        analysis_text=analysis_text,
-    )
+    # A batch that near-duplicates a recent OTel incident (the same alerts
+    # re-firing) goes on that incident's timeline: no LLM call, row or post.
+    incident_id = generate_incident_id()
+    dup = get_dedup_index().claim(combined, scope="otel", key=incident_id, incident_id=incident_id)
+    if dup is not None:
+        entry, similarity = dup
+        folded = (entry.key, "duplicate", {"similarity": round(similarity, 3), "alerts": len(parts), "text": combined[:500]}, "otel")
+        # Held until the original row commits if it is still being saved.
+        if not get_dedup_index().hold(entry.key, folded):
+            await incidents_db.append_incident_event(*folded)
+        return {"status": "duplicate", "incident_id": entry.incident_id}
+
+    try:
+        # Never blocks on the LLM past KLYNX_LLM_DEADLINE_S: a late answer
+        # upgrades the stored incident (and the Slack post) afterwards.
+        inc, pending = await analyze_cloud_issue_async(combined)
+        inc.incident_id = incident_id
+        analysis_text = format_incident_for_slack(inc)
+        await incidents_db.save_incident(
+            incident_id=inc.incident_id,
+            thread_ts=inc.incident_id,
+            channel_id="otel",
+            **_incident_fields(inc, analysis_text),
+            actor="otel",
+            raw_text=combined,
+        )
+    except Exception:
+        get_dedup_index().forget(incident_id)
+        raise
+    held = get_dedup_index().saved(incident_id)
+    if held:
+        await incidents_db.append_incident_events(held)
 
+    slack_channel, slack_ts = None, None
     channel = os.environ.get("SLACK_OTEL_CHANNEL")
     if _slack and channel:
-        await _slack.chat_postMessage(channel=channel, text="🚨 OTEL Alert → Incident\n\n" + analysis_text)
+        resp = await _slack.chat_postMessage(channel=channel, text="🚨 OTEL Alert → Incident\n\n" + analysis_text)
+        slack_channel, slack_ts = resp.get("channel"), resp.get("ts")
+
+    if pending is not None:
+        task = asyncio.create_task(_upgrade_when_ready(pending, incident_id, slack_channel, slack_ts))
+        _background.add(task)
+        task.add_done_callback(_log_task_error)
+
+    return {"status": "ok", "incident_id": inc.incident_id, "upgrade_pending": pending is not None}
+
+@otel_router.post("/api/alerts/batch")
+async def ingest_alert_batch(payload: AlertBatch):
+    """
+    Bulk ingest (e.g. replaying an alert backlog): one incident per alert
+    or message, analyzed together by analyze_many() and stored in batched
+    transactions. Nothing is posted to Slack.
+    """
+    texts = [_alert_line(a) for a in payload.alerts] + [m for m in payload.messages if m and m.strip()]
+    if not texts:
+        return {"status": "no_alerts"}
+    if len(texts) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"batch holds {len(texts)} items; the limit is {BATCH_MAX_ITEMS}")
+    start = time.perf_counter()
+
+    # Fold re-fires (within the batch and against recent incidents of the
+    # same channel) before spending any analysis on them.
+    index = get_dedup_index()
+    scope = f"batch:{payload.channel_id}"
+    ids: List[str] = []
+    fresh: List[int] = []
+    duplicates = []
+    folded = 0
+    for i, text in enumerate(texts):
+        incident_id = generate_incident_id()
+        dup = index.claim(text, scope=scope, key=incident_id, incident_id=incident_id) if payload.fold_duplicates else None
+        if dup is None:
+            ids.append(incident_id)
+            fresh.append(i)
+        else:
+            entry, similarity = dup
+            ids.append(entry.incident_id)
+            folded += 1
+            event = (entry.key, "duplicate", {"similarity": round(similarity, 3), "text": text[:500]}, "batch")
+            # Re-fires of this batch's own alerts (or of a save still in
+            # flight elsewhere) wait for the original row.
+            if not index.hold(entry.key, event):
+                duplicates.append(event)
+
+    try:
+        analyzed = await analyze_many([texts[i] for i in fresh])
+        records = []
+        sources: Dict[str, int] = {}
+        for i, (inc, source) in zip(fresh, analyzed):
+            inc.incident_id = ids[i]
+            sources[source] = sources.get(source, 0) + 1
+            records.append({
+                "id": inc.incident_id,
+                "thread_ts": inc.incident_id,
+                "channel_id": payload.channel_id,
+                "status": "open",
+                "raw_text": texts[i],
+                **_incident_fields(inc, format_incident_for_slack(inc)),
+            })
+        stored = await incidents_db.import_incidents(records, on_conflict="skip", actor="batch")
+    except Exception:
+        for i in fresh:
+            index.forget(ids[i])
+        raise
+    for i in fresh:
+        duplicates.extend(index.saved(ids[i]))
+    if duplicates:
+        await incidents_db.append_incident_events(duplicates)
 
-    return {"status": "ok", "incident_id": inc.incident_id}
+    return {
+        "status": "ok",
+        "received": len(texts),
+        "incidents": stored["imported"],
+        "duplicates": folded,
+        "sources": sources,
+        "incident_ids": ids,
+        "elapsed_s": round(time.perf_counter() - start, 3),
+    }
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import os
+import re
+from functools import lru_cache
+from typing import Callable, List, NamedTuple, Optional
+
+from analysis_cache import normalize_alert_text
+from metrics import counter, histogram
+
+try:
+    import tiktoken  # type: ignore
+except Exception:
+    tiktoken = None
+
+# Token budget for the alert text sent to the LLM (the system prompt is extra); 0 disables compaction.
+PROMPT_MAX_TOKENS = int(os.getenv("KLYNX_PROMPT_MAX_TOKENS", "2000"))
+# Blocks (runs of non-blank lines) longer than this keep only their head and tail.
+PROMPT_BLOCK_MAX_LINES = int(os.getenv("KLYNX_PROMPT_BLOCK_MAX_LINES", "60"))
+
+_FRAMES_KEPT = (3, 3)  # innermost frames matter as much as the entry point
+_LINE_MAX_CHARS = 2000
+_PIECE = re.compile(r"\w+|[^\w\s]")
+# Stack frame lines: Python ("File ..." plus its source line), JVM/.NET
+# and Node ("at ..."), Go (function line plus its "file.go:N" line).
+_FRAME = re.compile(
+    r'^\s*(?:File "[^"]*", line \d+'
+    r"|at [\w$.<>`/\\-]+\("
+    r"|at (?:async )?[\w$.<>\[\] ]+ \(\S+:\d+(?::\d+)?\)"
+    r"|at \S+:\d+:\d+$"
+    r")"
+)
+_PY_FRAME = re.compile(r'^\s*File "[^"]*", line \d+')
+_GO_FILE = re.compile(r"^\s+\S+\.go:\d+(?: \+0x[0-9a-f]+)?$")
+_GO_FUNC = re.compile(r"^[\w./*()-]+\(.*\)$")
+
+_before = histogram("prompt_tokens_before", (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768))
+_after = histogram("prompt_tokens_after", (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768))
+_saved = counter("prompt_tokens_saved")
+_compacted = counter("prompt_compactions")
+
+
+class Compacted(NamedTuple):
+    text: str
+    tokens_before: int
+    tokens_after: int
+
+
+@lru_cache(maxsize=8)
+def _encoder(model: str) -> Optional[Callable[[str], List[int]]]:
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model).encode
+    except Exception:
+        try:
+            return tiktoken.get_encoding("o200k_base").encode
+        except Exception:
+            return None
+
+
+@lru_cache(maxsize=16384)
+def _line_tokens(line: str, model: str) -> int:
+    encode = _encoder(model)
+    if encode is not None:
+        return len(encode(line)) + 1  # + the newline
+    # Without tiktoken: one token per punctuation mark and per ~4 chars of a word.
+    return sum((len(p) + 3) // 4 for p in _PIECE.findall(line)) + 1
+
+
+def estimate_tokens(text: str, model: str = "gpt-4.1-mini") -> int:
+    """
+    Token count of `text` for `model` (tiktoken if installed, else an
+    estimate). Counted per line and cached, since alert lines repeat.
+    """
+    return sum(_line_tokens(line, model) for line in (text or "").split("\n"))
+
+
+def _dedupe(lines: List[str]) -> List[str]:
+    # Lines equal up to ids/timestamps keep their first occurrence, with
+    # a count; blank-line runs shrink to one.
+    first: dict = {}
+    counts: List[int] = []
+    out: List[str] = []
+    for line in lines:
+        if not line.strip():
+            if out and out[-1]:
+                out.append("")
+                counts.append(1)
+            continue
+        key = normalize_alert_text(line)
+        at = first.get(key)
+        if at is None:
+            first[key] = len(out)
+            out.append(line)
+            counts.append(1)
+        else:
+            counts[at] += 1
+    return [f"{line} [x{n}]" if n > 1 else line for line, n in zip(out, counts)]
+
+
+def _frame_len(lines: List[str], i: int) -> int:
+    """Lines making up the stack frame that starts at lines[i], 0 if none."""
+    line = lines[i]
+    nxt = lines[i + 1] if i + 1 < len(lines) else ""
+    if _PY_FRAME.match(line):
+        return 2 if nxt.startswith(" ") and nxt.strip() and not _FRAME.match(nxt) else 1
+    if _FRAME.match(line) or _GO_FILE.match(line):
+        return 1
+    if _GO_FUNC.match(line) and _GO_FILE.match(nxt):
+        return 2
+    return 0
+
+
+def _collapse_frames(lines: List[str]) -> List[str]:
+    out: List[str] = []
+    i = 0
+    head, tail = _FRAMES_KEPT
+    while i < len(lines):
+        frames: List[List[str]] = []
+        n = _frame_len(lines, i)
+        while n:
+            frames.append(lines[i:i + n])
+            i += n
+            n = _frame_len(lines, i) if i < len(lines) else 0
+        if not frames:
+            out.append(lines[i])
+            i += 1
+            continue
+        if len(frames) > head + tail + 1:
+            frames = frames[:head] + [[f"    ... {len(frames) - head - tail} frames omitted ..."]] + frames[-tail:]
+        for frame in frames:
+            out.extend(frame)
+    return out
+
+
+def _head_tail(lines: List[str], keep: int, what: str) -> List[str]:
+    head = keep * 2 // 3
+    tail = keep - head
+    return lines[:head] + [f"... {len(lines) - keep} {what} omitted ..."] + (lines[-tail:] if tail else [])
+
+
+def _trim_blocks(lines: List[str], max_lines: int) -> List[str]:
+    out: List[str] = []
+    block: List[str] = []
+    for line in lines + [""]:
+        if line.strip():
+            if len(line) > _LINE_MAX_CHARS:
+                half = _LINE_MAX_CHARS // 2
+                line = f"{line[:half]} ... {len(line) - 2 * half} chars omitted ... {line[-half:]}"
+            block.append(line)
+            continue
+        out.extend(_head_tail(block, max_lines, "lines") if len(block) > max_lines else block)
+        block = []
+        out.append(line)
+    return out[:-1]
+
+
+def _fit(lines: List[str], budget: int, model: str) -> List[str]:
+    costs = [_line_tokens(line, model) for line in lines]
+    if sum(costs) <= budget:
+        return lines
+    # Keep the head (what fired) and the tail (the latest state) within budget.
+    budget -= _line_tokens("... 000000 lines omitted ...", model)
+    head: List[str] = []
+    tail: List[str] = []
+    used = 0
+    i, j = 0, len(lines) - 1
+    head_share = budget * 2 // 3
+    while i <= j and used + costs[i] <= head_share:
+        used += costs[i]
+        head.append(lines[i])
+        i += 1
+    while j >= i and used + costs[j] <= budget:
+        used += costs[j]
+        tail.append(lines[j])
+        j -= 1
+    if not head and i <= j:
+        # A single huge first line: cut it to the budget, ~4 chars a token.
+        head.append(lines[i][: max(budget - used, 0) * 4])
+        i += 1
+    omitted = j - i + 1
+    return head + ([f"... {omitted} lines omitted ..."] if omitted > 0 else []) + tail[::-1]
+
+
+def compact_alert_text(
+    text: str,
+    *,
+    max_tokens: int = PROMPT_MAX_TOKENS,
+    block_max_lines: int = PROMPT_BLOCK_MAX_LINES,
+    model: str = "gpt-4.1-mini",
+) -> Compacted:
+    """
+    Shrink alert text before it goes to the LLM: repeated lines (up to
+    ids and timestamps) are kept once with a count, long stack traces keep
+    their outer and innermost frames, over-long blocks and lines keep their
+    head and tail, and what is left is cut to `max_tokens` around the
+    middle. Text already within budget and free of repeats comes back
+    unchanged. Token counts before and after are returned and recorded.
+    """
+    text = text or ""
+    before = estimate_tokens(text, model)
+    if max_tokens <= 0:
+        return Compacted(text, before, before)
+    lines = [line.rstrip() for line in text.replace("\r\n", "\n").split("\n")]
+    lines = _dedupe(lines)
+    lines = _collapse_frames(lines)
+    lines = _trim_blocks(lines, max(block_max_lines, 3))
+    lines = _fit(lines, max_tokens, model)
+    out = "\n".join(lines).strip("\n")
+    after = estimate_tokens(out, model)
+    if after >= before:
+        out, after = text, before
+    else:
+        _compacted.inc()
+        _saved.inc(before - after)
+    _before.observe(before)
+    _after.observe(after)
+    return Compacted(out, before, after)
+
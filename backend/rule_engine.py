@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from metrics import counter, histogram
+from text_matcher import Matcher, TextMatch
+
+try:
+    import yaml  # type: ignore
+except Exception:
+    yaml = None
+
+_logger = logging.getLogger("klynx.rule_engine")
+
+# A rules file or a directory of *.json / *.yaml / *.yml files (YAML needs PyYAML).
+RULES_PATH = os.getenv("KLYNX_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules"))
+# How often evaluate() checks the rule files for changes; negative disables hot reload.
+RULES_RELOAD_S = float(os.getenv("KLYNX_RULES_RELOAD_S", "2"))
+
+_EXTENSIONS = (".json", ".yaml", ".yml")
+_SECTIONS = ("incident", "plan", "actions")
+_INCIDENT_FIELDS = ("severity", "summary", "cloud_provider", "probable_cause", "suggested_steps", "auto_fix_plan")
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+_CANDIDATE_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class RuleError(ValueError):
+    pass
+
+
+class Rule:
+    """
+    One classification rule. `match` lists phrases that are looked up at
+    word starts in the lower-cased text, like text_matcher keywords:
+
+        any:  at least one must appear
+        all:  every one must appear
+        none: none may appear
+
+    A rule carries one or more output sections: `incident` (fields of a
+    models.Incident), `plan` (autofix_engine plan: probable_cause,
+    analysis_text, steps) and `actions` (per-provider remediation lines).
+    """
+
+    __slots__ = ("id", "priority", "order", "any", "all", "none", "incident", "plan", "actions", "source")
+
+    def __init__(self, raw: Dict[str, Any], *, source: str, order: int) -> None:
+        if not isinstance(raw, dict):
+            raise RuleError(f"{source}: rule #{order} is not an object")
+        rid = raw.get("id")
+        if not isinstance(rid, str) or not rid.strip():
+            raise RuleError(f"{source}: rule #{order} has no id")
+        self.id = rid.strip()
+        self.source = source
+        self.order = order
+        try:
+            self.priority = int(raw.get("priority", 0))
+        except (TypeError, ValueError):
+            raise RuleError(f"{source}: rule {self.id}: priority must be an integer")
+
+        cond = raw.get("match") or {}
+        if not isinstance(cond, dict):
+            raise RuleError(f"{source}: rule {self.id}: match must be an object")
+        self.any = self._phrases(cond, "any")
+        self.all = self._phrases(cond, "all")
+        self.none = self._phrases(cond, "none")
+
+        self.incident: Optional[Dict[str, Any]] = raw.get("incident")
+        self.plan: Optional[Dict[str, Any]] = raw.get("plan")
+        self.actions: Optional[Dict[str, List[str]]] = raw.get("actions")
+        if not any(getattr(self, s) for s in _SECTIONS):
+            raise RuleError(f"{source}: rule {self.id} has none of {', '.join(_SECTIONS)}")
+        if self.incident is not None:
+            if not isinstance(self.incident, dict):
+                raise RuleError(f"{source}: rule {self.id}: incident must be an object")
+            unknown = set(self.incident) - set(_INCIDENT_FIELDS)
+            if unknown:
+                raise RuleError(f"{source}: rule {self.id}: unknown incident fields {sorted(unknown)}")
+        if self.plan is not None and not isinstance(self.plan, dict):
+            raise RuleError(f"{source}: rule {self.id}: plan must be an object")
+        if self.actions is not None and not (
+            isinstance(self.actions, dict) and all(isinstance(v, list) for v in self.actions.values())
+        ):
+            raise RuleError(f"{source}: rule {self.id}: actions must map provider -> list of lines")
+
+    def _phrases(self, cond: Dict[str, Any], key: str) -> Tuple[str, ...]:
+        values = cond.get(key) or []
+        if isinstance(values, str):
+            values = [values]
+        out = []
+        for v in values:
+            if not isinstance(v, str) or not v.strip():
+                raise RuleError(f"{self.source}: rule {self.id}: match.{key} entries must be non-empty strings")
+            out.append(v.strip().lower())
+        return tuple(out)
+
+    def matches(self, tags: Set[str]) -> bool:
+        if self.any and not any(p in tags for p in self.any):
+            return False
+        if any(p not in tags for p in self.all):
+            return False
+        return not any(p in tags for p in self.none)
+
+    def render(self, section: str, **context: Any) -> Any:
+        """
+        A copy of `section` with `{name}` placeholders filled from `context`;
+        unknown placeholders are left as they are.
+        """
+        return _render(getattr(self, section), context)
+
+
+def _render(value: Any, context: Dict[str, Any]) -> Any:
+    if isinstance(value, str):
+        return _PLACEHOLDER.sub(lambda m: str(context[m.group(1)]) if m.group(1) in context else m.group(0), value)
+    if isinstance(value, list):
+        return [_render(v, context) for v in value]
+    if isinstance(value, dict):
+        return {k: _render(v, context) for k, v in value.items()}
+    return value
+
+
+class RuleResult:
+    """
+    Matching rules for one text, highest priority first, plus the
+    underlying TextMatch.
+    """
+
+    __slots__ = ("match", "rules")
+
+    def __init__(self, match: TextMatch, rules: List[Rule]) -> None:
+        self.match = match
+        self.rules = rules
+
+    def first(self, section: str, provider: Optional[str] = None) -> Optional[Rule]:
+        for r in self.rules:
+            body = getattr(r, section)
+            if body and (provider is None or body.get(provider)):
+                return r
+        return None
+
+
+class RuleSet:
+    """
+    Rules compiled for dispatch: every phrase goes into one Matcher, and
+    each rule is indexed under the phrases that must appear for it to
+    match (its `any` list, else its longest `all` phrase). A scan therefore
+    only evaluates rules whose anchor phrase was seen, plus the few rules
+    with no positive condition.
+    """
+
+    def __init__(self, rules: Sequence[Rule]) -> None:
+        seen: Dict[str, str] = {}
+        for r in rules:
+            if r.id in seen:
+                raise RuleError(f"duplicate rule id {r.id} in {r.source} and {seen[r.id]}")
+            seen[r.id] = r.source
+        self.rules: List[Rule] = sorted(rules, key=lambda r: (-r.priority, r.order))
+
+        self._index: Dict[str, List[int]] = {}
+        self._always: List[int] = []
+        vocab: Set[str] = set()
+        for i, r in enumerate(self.rules):
+            anchors = r.any or ((max(r.all, key=len),) if r.all else ())
+            if not anchors:
+                self._always.append(i)
+            for p in anchors:
+                self._index.setdefault(p, []).append(i)
+            vocab.update(r.any, r.all, r.none)
+        self.phrases = len(vocab)
+        self._matcher = Matcher({p: [p] for p in vocab})
+
+    def evaluate(self, text: str) -> RuleResult:
+        match = self._matcher.scan(text)
+        candidates = set(self._always)
+        for tag in match.tags:
+            ids = self._index.get(tag)
+            if ids:
+                candidates.update(ids)
+        _candidates.observe(len(candidates))
+        tags = match.tags
+        return RuleResult(match, [self.rules[i] for i in sorted(candidates) if self.rules[i].matches(tags)])
+
+
+def _rule_files(path: str) -> List[str]:
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.endswith(_EXTENSIONS) and not name.startswith(".")
+        )
+    return [path] if os.path.exists(path) else []
+
+
+def _load_file(path: str) -> List[Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            data = json.load(f)
+        elif yaml is None:
+            raise RuleError(f"{path}: PyYAML is not installed; use JSON or pip install pyyaml")
+        else:
+            data = yaml.safe_load(f)
+    if isinstance(data, dict):
+        data = data.get("rules")
+    if data is None:
+        return []
+    if not isinstance(data, list):
+        raise RuleError(f"{path}: expected a list of rules or {{\"rules\": [...]}}")
+    return data
+
+
+def load_rules(path: str) -> RuleSet:
+    rules: List[Rule] = []
+    for file in _rule_files(path):
+        for raw in _load_file(file):
+            rules.append(Rule(raw, source=os.path.basename(file), order=len(rules)))
+    return RuleSet(rules)
+
+
+_reloads = counter("rule_engine_reloads")
+_reload_errors = counter("rule_engine_reload_errors")
+_eval_ms = histogram("rule_engine_eval_ms")
+_candidates = histogram("rule_engine_candidates", _CANDIDATE_BUCKETS)
+
+
+class RuleEngine:
+    """
+    Rules loaded from `path`, reloaded in place when the files change.
+
+    evaluate() checks file mtimes at most every `reload_s` seconds; the new
+    RuleSet is compiled off to the side and swapped in, so readers never
+    block on a reload. A file that fails to parse keeps the previous rules.
+    """
+
+    def __init__(self, path: str = RULES_PATH, *, reload_s: float = RULES_RELOAD_S) -> None:
+        self.path = path
+        self.reload_s = reload_s
+        self._lock = threading.Lock()
+        self._ruleset: Optional[RuleSet] = None
+        self._stamp: Optional[Tuple[Tuple[str, int, int], ...]] = None
+        self._checked_at = 0.0
+        self._loaded_at: Optional[float] = None
+        self._last_error: Optional[str] = None
+
+    def _files_stamp(self) -> Tuple[Tuple[str, int, int], ...]:
+        stamp = []
+        for file in _rule_files(self.path):
+            try:
+                st = os.stat(file)
+            except OSError:
+                continue
+            stamp.append((file, st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+
+    def reload(self, *, force: bool = False) -> bool:
+        """
+        Re-read the rule files if they changed (or `force`). Returns True if
+        a new rule set was installed.
+        """
+        with self._lock:
+            self._checked_at = time.monotonic()
+            stamp = self._files_stamp()
+            if not force and self._ruleset is not None and stamp == self._stamp:
+                return False
+            try:
+                ruleset = load_rules(self.path)
+            except Exception as e:
+                _reload_errors.inc()
+                self._last_error = str(e)
+                self._stamp = stamp
+                _logger.error("rule reload from %s failed, keeping previous rules: %s", self.path, e)
+                if self._ruleset is None:
+                    self._ruleset = RuleSet([])
+                return False
+            self._ruleset, self._stamp = ruleset, stamp
+            self._loaded_at = time.time()
+            self._last_error = None
+            _reloads.inc()
+            _logger.info("loaded %d rules from %s", len(ruleset.rules), self.path)
+            return True
+
+    def ruleset(self) -> RuleSet:
+        ruleset = self._ruleset
+        if ruleset is None:
+            self.reload()
+            return self._ruleset  # type: ignore[return-value]
+        if self.reload_s >= 0 and time.monotonic() - self._checked_at >= self.reload_s:
+            # Another thread already checking: keep serving the current rules.
+            if not self._lock.locked():
+                self.reload()
+            return self._ruleset  # type: ignore[return-value]
+        return ruleset
+
+    def evaluate(self, text: str) -> RuleResult:
+        start = time.perf_counter()
+        result = self.ruleset().evaluate(text or "")
+        _eval_ms.observe((time.perf_counter() - start) * 1000.0)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        ruleset = self._ruleset
+        return {
+            "path": self.path,
+            "rules": len(ruleset.rules) if ruleset else 0,
+            "phrases": ruleset.phrases if ruleset else 0,
+            "loaded_at": self._loaded_at,
+            "last_error": self._last_error,
+            "reloads": _reloads.value,
+            "reload_errors": _reload_errors.value,
+            "eval_ms": _eval_ms.snapshot(),
+            "candidates": _candidates.snapshot(),
+        }
+
+
+_engine = RuleEngine()
+
+
+def evaluate(text: str) -> RuleResult:
+    return _engine.evaluate(text)
+
+
+def reload_rules(force: bool = True) -> bool:
+    return _engine.reload(force=force)
+
+
+def rules_stats() -> Dict[str, Any]:
+    return _engine.stats()
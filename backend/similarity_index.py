@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+import history_repository as repo
+from analysis_cache import alert_tokens
+from metrics import counter, histogram
+
+_logger = logging.getLogger("klynx.similarity_index")
+
+# Width of the hashed TF-IDF vectors; memory is 4 bytes x dims per incident.
+SIMILAR_DIMS = int(os.getenv("KLYNX_SIMILAR_DIMS", "256"))
+# Most recent incidents kept in the index; 0 disables similar-incident lookups.
+SIMILAR_MAX_INCIDENTS = int(os.getenv("KLYNX_SIMILAR_MAX_INCIDENTS", "200000"))
+# Cosine similarity below which an incident is not reported as similar.
+SIMILAR_MIN_SCORE = float(os.getenv("KLYNX_SIMILAR_MIN_SCORE", "0.35"))
+# Full rebuild (fresh IDF weights, edits and deletions picked up) once the
+# index has grown by this factor since the last one, or is this old.
+SIMILAR_REBUILD_GROWTH = float(os.getenv("KLYNX_SIMILAR_REBUILD_GROWTH", "1.5"))
+SIMILAR_REBUILD_S = float(os.getenv("KLYNX_SIMILAR_REBUILD_S", "21600"))
+
+# Fields an incident is indexed and compared by.
+SIMILAR_FIELDS = ("thread_ts", "summary", "probable_cause", "cloud", "region", "resources")
+
+_FEATURES = 1 << 20  # document-frequency table size (hashed words and word pairs)
+_PROBE = 16          # heaviest query dimensions scanned across the whole index
+_RERANK = 100        # candidates per requested result that get an exact score
+_MAX_TOKENS = 256
+_PAGE = 5000
+_APPLY_BATCH = 500   # pending incidents read per query by the background sync
+
+_queries = counter("similar_queries")
+_rebuilds = counter("similar_rebuilds")
+_query_ms = histogram("similar_query_ms")
+_rebuild_ms = histogram("similar_rebuild_ms", (10, 100, 1000, 10000, 60000, 300000))
+
+
+def incident_text(row: Dict[str, Any]) -> str:
+    """The text an incident row is indexed by."""
+    return " ".join(str(row.get(f) or "") for f in SIMILAR_FIELDS[1:])
+
+
+def _features(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    # Words and adjacent word pairs of the normalized text (ids and
+    # timestamps already replaced), hashed; returns unique hashes + counts.
+    tokens = alert_tokens(text)[:_MAX_TOKENS]
+    grams = Counter(tokens)
+    grams.update(zip(tokens, tokens[1:]))
+    if not grams:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    hashes = np.fromiter((hash(g) & 0x7FFFFFFFFFFFFFFF for g in grams), dtype=np.int64, count=len(grams))
+    counts = np.fromiter(grams.values(), dtype=np.float32, count=len(grams))
+    return hashes, counts
+
+
+class SimilarityIndex:
+    """
+    Hashed TF-IDF vectors of recent incidents, one column each in a
+    (dims x capacity) float32 matrix.
+
+    Words and word pairs are hashed into a fixed number of dimensions with
+    a random sign, weighted by log term frequency times IDF and
+    L2-normalized, so a dot product is a cosine similarity. Columns make
+    the scan cheap: a query only reads the matrix rows of its heaviest
+    `_PROBE` dimensions to pick candidates, then scores those exactly.
+
+    New and changed incidents are appended (or overwritten in place) by a
+    background thread shortly after their commits are reported by
+    history_repository, weighted by the IDF of the moment; queries never
+    wait for them. A periodic rebuild from the database refreshes the
+    weights and drops deleted incidents. Beyond `max_items` the oldest
+    column is reused.
+    """
+
+    def __init__(
+        self,
+        *,
+        dims: int = SIMILAR_DIMS,
+        max_items: int = SIMILAR_MAX_INCIDENTS,
+        min_score: float = SIMILAR_MIN_SCORE,
+        rebuild_growth: float = SIMILAR_REBUILD_GROWTH,
+        rebuild_s: float = SIMILAR_REBUILD_S,
+    ) -> None:
+        self.dims = dims
+        self.max_items = max_items
+        self.min_score = min_score
+        self.rebuild_growth = rebuild_growth
+        self.rebuild_s = rebuild_s
+        self._lock = threading.Lock()
+        self._reset(0)
+        self._pending: Set[str] = set()
+        self._ready = False
+        # Background rebuild / pending sync running; set under self._lock.
+        self._building = False
+        self._applying = False
+        self._built_at = 0.0
+        self._built_size = 0
+        self._listening = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0
+
+    def _reset(self, capacity: int) -> None:
+        self._mat = np.zeros((self.dims, max(capacity, 1024)), dtype=np.float32)
+        self._keys: List[Optional[str]] = []
+        self._cols: Dict[str, int] = {}
+        self._df = np.zeros(_FEATURES, dtype=np.int32)
+        self._docs = 0
+        self._next = 0
+
+    # ---- vectors ----
+
+    def _idf(self, hashes: np.ndarray) -> np.ndarray:
+        df = self._df[hashes % _FEATURES]
+        return np.log((1.0 + self._docs) / (1.0 + df)).astype(np.float32) + 1.0
+
+    def _vector(self, hashes: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        v = np.zeros(self.dims, dtype=np.float32)
+        if hashes.size:
+            w = (1.0 + np.log(counts)) * self._idf(hashes)
+            sign = np.where((hashes >> 40) & 1, 1.0, -1.0).astype(np.float32)
+            np.add.at(v, hashes % self.dims, sign * w)
+            norm = float(np.linalg.norm(v))
+            if norm > 0:
+                v /= norm
+        return v
+
+    def vector(self, text: str) -> np.ndarray:
+        return self._vector(*_features(text))
+
+    # ---- writes ----
+
+    def _column_for(self, key: str) -> int:
+        col = self._cols.get(key)
+        if col is not None:
+            return col
+        if len(self._keys) < self.max_items:
+            col = len(self._keys)
+            if col >= self._mat.shape[1]:
+                grown = np.zeros((self.dims, min(self._mat.shape[1] * 2, self.max_items)), dtype=np.float32)
+                grown[:, :col] = self._mat[:, :col]
+                self._mat = grown
+            self._keys.append(key)
+        else:
+            # Full: reuse the oldest column.
+            col = self._next
+            self._next = (self._next + 1) % self.max_items
+            old = self._keys[col]
+            if old is not None:
+                self._cols.pop(old, None)
+            self._keys[col] = key
+        self._cols[key] = col
+        return col
+
+    def add(self, key: str, text: str) -> None:
+        """Index (or re-index) incident `key` under `text`."""
+        if not self.enabled:
+            return
+        hashes, counts = _features(text)
+        with self._lock:
+            if key not in self._cols:
+                # Old counts of a re-indexed incident stay until the next rebuild.
+                np.add.at(self._df, hashes % _FEATURES, 1)
+                self._docs += 1
+            # Column first: it may grow (replace) the matrix.
+            col = self._column_for(key)
+            self._mat[:, col] = self._vector(hashes, counts)
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            col = self._cols.pop(key, None)
+            if col is not None:
+                self._keys[col] = None
+                self._mat[:, col] = 0.0
+
+    def load(self, docs: Iterable[Tuple[str, str]]) -> int:
+        """
+        Replace the index with `docs` ((key, text), newest first), computing
+        IDF over all of them before weighting any. Returns the number indexed.
+        """
+        keys: List[str] = []
+        feats: List[Tuple[np.ndarray, np.ndarray]] = []
+        for key, text in docs:
+            if len(keys) >= self.max_items:
+                break
+            keys.append(key)
+            feats.append(_features(text))
+        keys.reverse()
+        feats.reverse()  # oldest first, so the ring evicts oldest
+
+        n = len(keys)
+        df = np.zeros(_FEATURES, dtype=np.int32)
+        mat = np.zeros((self.dims, max(n, 1024) if n < self.max_items else n), dtype=np.float32)
+        if n:
+            # All documents in one vectorized pass.
+            sizes = np.fromiter((h.size for h, _ in feats), dtype=np.int64, count=n)
+            hashes = np.concatenate([h for h, _ in feats])
+            counts = np.concatenate([c for _, c in feats])
+            cols = np.repeat(np.arange(n), sizes)
+            # Hashes are unique per document, so this counts documents.
+            df = np.bincount(hashes % _FEATURES, minlength=_FEATURES).astype(np.int32)
+            idf = np.log((1.0 + n) / (1.0 + df[hashes % _FEATURES])).astype(np.float32) + 1.0
+            sign = np.where((hashes >> 40) & 1, 1.0, -1.0).astype(np.float32)
+            np.add.at(mat, (hashes % self.dims, cols), sign * (1.0 + np.log(counts)) * idf)
+            norms = np.linalg.norm(mat[:, :n], axis=0)
+            norms[norms == 0] = 1.0
+            mat[:, :n] /= norms
+        with self._lock:
+            self._mat, self._df, self._docs = mat, df, n
+            self._keys = list(keys)
+            self._cols = {k: i for i, k in enumerate(keys)}
+            self._next = 0
+        return n
+
+    # ---- queries ----
+
+    def query(
+        self, text: str, *, k: int = 5, exclude: Sequence[str] = (), min_score: Optional[float] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Up to `k` (key, cosine) pairs most similar to `text`, best first,
+        scoring at least `min_score`.
+        """
+        start = time.perf_counter()
+        floor = self.min_score if min_score is None else min_score
+        hashes, counts = _features(text)
+        with self._lock:
+            q = self._vector(hashes, counts)
+            mat, keys = self._mat, self._keys
+            n = len(keys)
+        _queries.inc()
+        nz = np.flatnonzero(q)
+        if not n or not nz.size:
+            return []
+        want = k + len(exclude)
+        if nz.size > _PROBE and n > want * _RERANK:
+            # Candidates from the heaviest dimensions, exact scores for those.
+            probe = nz[np.argpartition(-np.abs(q[nz]), _PROBE)[:_PROBE]]
+            coarse = mat[probe[0], :n] * q[probe[0]]
+            for d in probe[1:]:
+                coarse += mat[d, :n] * q[d]
+            cand = np.argpartition(-coarse, want * _RERANK)[: want * _RERANK]
+            scores = q[nz] @ mat[np.ix_(nz, cand)]
+        else:
+            cand = np.arange(n)
+            scores = q[nz] @ mat[nz, :n]
+        order = np.argsort(-scores)
+        skip = set(exclude)
+        out: List[Tuple[str, float]] = []
+        for i in order:
+            score = float(scores[i])
+            if score < floor or len(out) >= k:
+                break
+            key = keys[cand[i]]
+            if key is None or key in skip:
+                continue
+            out.append((key, round(score, 4)))
+        _query_ms.observe((time.perf_counter() - start) * 1000.0)
+        return out
+
+    def __len__(self) -> int:
+        return len(self._cols)
+
+    # ---- sync with history_repository ----
+
+    def _on_change(self, thread_ts_list: List[str]) -> None:
+        # Runs on the writing thread: just note the keys.
+        with self._lock:
+            self._pending.update(thread_ts_list)
+
+    def rebuild(self) -> int:
+        """Reload the newest `max_items` incidents from the database."""
+        start = time.perf_counter()
+
+        def docs() -> Iterable[Tuple[str, str]]:
+            cursor = None
+            while True:
+                page = repo.query_incidents(limit=_PAGE, cursor=cursor, fields=list(SIMILAR_FIELDS))
+                for row in page["items"]:
+                    yield row["thread_ts"], incident_text(row)
+                cursor = page["next_cursor"]
+                if not cursor:
+                    return
+
+        if not self._listening:
+            repo.add_change_listener(self._on_change)
+            self._listening = True
+        with self._lock:
+            self._pending.clear()
+        n = self.load(docs())
+        self._built_at, self._built_size, self._ready = time.monotonic(), n, True
+        _rebuilds.inc()
+        _rebuild_ms.observe((time.perf_counter() - start) * 1000.0)
+        _logger.info("similarity index rebuilt: %d incidents in %.1f s", n, time.perf_counter() - start)
+        return n
+
+    def _rebuild_in_background(self) -> None:
+        try:
+            self.rebuild()
+        except Exception:
+            _logger.exception("similarity index rebuild failed")
+        finally:
+            with self._lock:
+                self._building = False
+
+    def apply_pending(self) -> int:
+        """
+        Index incidents written since the last sync, `_APPLY_BATCH` per
+        database read. Stops early when a rebuild starts (it reloads
+        everything anyway). Returns the number applied.
+        """
+        applied = 0
+        while True:
+            with self._lock:
+                if self._building or not self._pending:
+                    return applied
+                batch = [self._pending.pop() for _ in range(min(_APPLY_BATCH, len(self._pending)))]
+            rows = repo.get_incidents_by_thread_ts(batch, fields=list(SIMILAR_FIELDS))
+            for ts in batch:
+                row = rows.get(ts)
+                if row is None:
+                    self.remove(ts)
+                else:
+                    self.add(ts, incident_text(row))
+            applied += len(batch)
+
+    def _apply_in_background(self) -> None:
+        try:
+            self.apply_pending()
+        except Exception:
+            _logger.exception("similarity index sync failed")
+        finally:
+            with self._lock:
+                self._applying = False
+
+    def refresh(self) -> bool:
+        """
+        Start a background rebuild when due, or else a background sync of
+        incidents written since the last one; never waits for either.
+        Returns whether the index is usable yet.
+        """
+        if not self.enabled:
+            return False
+        due = not self._ready or (
+            len(self) > max(self._built_size, 1000) * self.rebuild_growth
+            or time.monotonic() - self._built_at > self.rebuild_s
+        )
+        with self._lock:
+            build = due and not self._building
+            if build:
+                self._building = True
+            # While a rebuild runs, changes wait for it to swap in.
+            apply = self._ready and not self._building and not self._applying and bool(self._pending)
+            if apply:
+                self._applying = True
+        if build:
+            threading.Thread(target=self._rebuild_in_background, name="similarity-index", daemon=True).start()
+        if apply:
+            threading.Thread(target=self._apply_in_background, name="similarity-index-sync", daemon=True).start()
+        return self._ready
+
+    def similar(
+        self, text: str, *, k: int = 5, exclude: Sequence[str] = (), min_score: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        The `k` past incidents most similar to `text`, as summary rows plus
+        `score`; empty while the index is still being built.
+        """
+        if not self.refresh():
+            return []
+        out = []
+        for ts, score in self.query(text, k=k, exclude=exclude, min_score=min_score):
+            row = repo.get_incident_by_thread_ts(ts, fields="summary")
+            if row is not None:
+                row["score"] = score
+                out.append(row)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "ready": self._ready,
+            "incidents": len(self),
+            "dims": self.dims,
+            "max_items": self.max_items,
+            "memory_mb": round(self._mat.nbytes / 1e6, 1),
+            "pending": len(self._pending),
+            "rebuilds": _rebuilds.value,
+            "query_ms": _query_ms.snapshot(),
+        }
+
+
+_index = SimilarityIndex()
+
+
+def get_similarity_index() -> SimilarityIndex:
+    return _index
+
+
+def start_similarity_index() -> None:
+    """Start the first build in the background (call at startup)."""
+    _index.refresh()
@@ -1,6 +1,7 @@
 import os
 import json
 import hmac
+import asyncio
 import hashlib
 from typing import Any, Dict, Optional
 
@@ -8,12 +9,17 @@ from fastapi import APIRouter, Request, HTTPException
 from slack_sdk import WebClient
 
 from autofix_engine import build_plan, execute_plan, generate_incident_id
-from history_repository import save_incident, get_incident_by_thread_ts, update_incident_status, update_incident_plan
+from incident_engine import extract_resources
+import async_repository as incidents_db
+from near_duplicates import get_dedup_index
+from similarity_index import get_similarity_index, incident_text
 
 slack_router = APIRouter(prefix="/api/slack")
 
 SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN", "")
 SLACK_SIGNING_SECRET = os.getenv("SLACK_SIGNING_SECRET", "")
+# Similar past incidents listed under a new incident's plan; 0 disables.
+SLACK_SIMILAR_INCIDENTS = int(os.getenv("KLYNX_SLACK_SIMILAR_INCIDENTS", "3"))
 
 client = WebClient(token=SLACK_BOT_TOKEN) if SLACK_BOT_TOKEN else None
 
@@ -54,11 +60,21 @@ def _blocks_for_plan(incident_id: str, plan: Dict[str, Any]) -> list:
         step_lines.append(f"• *{s.get('title')}* _(risk: {s.get('risk','unknown')})_")
     step_text = "\n".join(step_lines) if step_lines else "• (no steps)"
 
-    return [
+    blocks = [
         {"type": "section", "text": {"type": "mrkdwn", "text": f"*Incident ID:* `{incident_id}`\n*Severity:* `{severity}`\n*Cloud:* `{cloud}`\n*Region:* `{region}`"}},
         {"type": "section", "text": {"type": "mrkdwn", "text": f"*Summary:*\n{summary}"}},
         {"type": "section", "text": {"type": "mrkdwn", "text": f"*Probable Cause:*\n{probable}"}},
         {"type": "section", "text": {"type": "mrkdwn", "text": f"*Auto-fix plan (dry-run, cloud-safe):*\n{step_text}"}},
+    ]
+    similar = plan.get("similar") or []
+    if similar:
+        lines = [
+            f"• `{s.get('id')}` _{s.get('status', 'unknown')}_ · {str(s.get('created_at') or '')[:10]} · "
+            f"{round(100 * s.get('score', 0))}% match — {s.get('summary', '')}"
+            for s in similar
+        ]
+        blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": "*Similar past incidents:*\n" + "\n".join(lines)}})
+    blocks.append(
         {
             "type": "actions",
             "elements": [
@@ -76,8 +92,9 @@ def _blocks_for_plan(incident_id: str, plan: Dict[str, Any]) -> list:
                     "value": incident_id,
                 },
             ],
-        },
-    ]
+        }
+    )
+    return blocks
 
 @slack_router.post("/events")
 async def slack_events(request: Request):
@@ -108,6 +125,28 @@ async def slack_events(request: Request):
         raise HTTPException(status_code=500, detail="SLACK_BOT_TOKEN missing")
 
     incident_id = generate_incident_id()
+
+    # Alert storms: a top-level message that near-duplicates a recent
+    # incident in this channel is logged on that incident's timeline
+    # instead of opening a new one (no new plan, row or Slack post).
+    if not event.get("thread_ts"):
+        dup = get_dedup_index().claim(text, scope=channel, key=thread_ts, incident_id=incident_id)
+        if dup is not None:
+            entry, similarity = dup
+            if entry.key == thread_ts:
+                # Slack redelivered an event we already handled.
+                return {"ok": True}
+            folded = (
+                entry.key,
+                "duplicate",
+                {"similarity": round(similarity, 3), "channel": channel, "ts": event.get("ts"), "text": text[:500]},
+                event.get("user"),
+            )
+            # Held until the original row commits if it is still being saved.
+            if not get_dedup_index().hold(entry.key, folded):
+                await incidents_db.append_incident_event(*folded)
+            return {"ok": True, "duplicate_of": entry.incident_id}
+
     plan = build_plan(text=text, cloud="unknown")
 
     meta = plan.get("meta", {})
@@ -115,22 +154,45 @@ async def slack_events(request: Request):
     summary = meta.get("summary", text)
     cloud = meta.get("cloud", "unknown")
     region = meta.get("region", "unknown")
+    resources = ",".join(extract_resources(text))
+
+    # Past incidents that look like this one, kept with the plan.
+    if SLACK_SIMILAR_INCIDENTS > 0:
+        query = incident_text({
+            "summary": summary, "probable_cause": plan.get("probable_cause"),
+            "cloud": cloud, "region": region, "resources": resources,
+        })
+        similar = await asyncio.to_thread(
+            get_similarity_index().similar, query, k=SLACK_SIMILAR_INCIDENTS, exclude=[thread_ts]
+        )
+        if similar:
+            keep = ("id", "thread_ts", "status", "severity", "summary", "created_at", "score")
+            plan["similar"] = [{f: s.get(f) for f in keep} for s in similar]
 
     # Save to DB
-    save_incident(
-        incident_id=incident_id,
-        thread_ts=thread_ts,
-        channel_id=channel,
-        severity=severity,
-        summary=summary,
-        cloud=cloud if isinstance(cloud, str) else "unknown",
-        region=region if isinstance(region, str) else "unknown",
-        resources="N/A",
-        probable_cause=plan.get("probable_cause", ""),
-        analysis_text=plan.get("analysis_text", ""),
-        plan=plan,
-        status="open",
-    )
+    try:
+        await incidents_db.save_incident(
+            incident_id=incident_id,
+            thread_ts=thread_ts,
+            channel_id=channel,
+            severity=severity,
+            summary=summary,
+            cloud=cloud if isinstance(cloud, str) else "unknown",
+            region=region if isinstance(region, str) else "unknown",
+            resources=resources,
+            probable_cause=plan.get("probable_cause", ""),
+            analysis_text=plan.get("analysis_text", ""),
+            plan=plan,
+            status="open",
+            actor=event.get("user"),
+            raw_text=text,
+        )
+    except Exception:
+        get_dedup_index().forget(thread_ts)
+        raise
+    held = get_dedup_index().saved(thread_ts)
+    if held:
+        await incidents_db.append_incident_events(held)
 
     blocks = _blocks_for_plan(incident_id, plan)
 
@@ -159,25 +221,39 @@ async def slack_actions(request: Request):
     channel = payload.get("channel", {}).get("id", "")
     thread_ts = message.get("thread_ts") or message.get("ts")
 
-    inc = get_incident_by_thread_ts(thread_ts)
+    inc = await incidents_db.get_incident_by_thread_ts(thread_ts)
     if not inc:
         return {"text": "⚠️ Incident not found in DB for this thread."}
 
     plan = inc.get("plan", {}) or {}
 
     if action == "skip_fix":
-        update_incident_status(thread_ts, "skipped")
+        await incidents_db.update_incident_status(thread_ts, "skipped", actor=user)
         return {"text": f"⏭ Auto-fix skipped by *{user}*."}
 
     if action == "apply_fix":
         # Execute in DRY-RUN first (safe). You can flip to apply later.
-        update_incident_status(thread_ts, "fix_running")
+        await incidents_db.update_incident_status(thread_ts, "fix_running", actor=user)
         results = execute_plan(plan, dry_run=True)
 
-        # Save executed results into plan for UI later
-        plan["execution"] = results
-        update_incident_plan(thread_ts, plan)
-        update_incident_status(thread_ts, "fix_dry_run_complete")
+        # Save executed results into plan for UI later. Patched in place so a
+        # concurrent click can't overwrite the rest of the plan.
+        step_status = {
+            f"$.steps[{i}].status": r["status"]
+            for i, r in enumerate(results.get("results", []))
+        }
+        await incidents_db.patch_incident_plan(
+            thread_ts,
+            set_values={"$.execution": results, **step_status},
+            append_values={"$.execution_history": {**results, "approved_by": user}},
+            status="fix_dry_run_complete",
+            actor=user,
+            event_kind="execution",
+            event_data={
+                "mode": results.get("mode"),
+                "steps": {r["step_id"]: r["status"] for r in results.get("results", [])},
+            },
+        )
 
         # Post execution summary in thread
         lines = []
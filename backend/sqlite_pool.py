@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Set
+
+from metrics import counter, histogram
+
+# Applied to every new connection. WAL lets readers run alongside the single
+# writer; NORMAL sync is durable across app crashes (not power loss) in WAL.
+DEFAULT_PRAGMAS: Dict[str, Any] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+    "cache_size": -16000,      # KiB, i.e. 16 MB page cache per connection
+    "mmap_size": 134217728,    # 128 MB
+    "recursive_triggers": "ON",
+}
+
+
+def _close_conn(pool_ref: "weakref.ref[SQLitePool]", conn: sqlite3.Connection, pid: int) -> None:
+    if os.getpid() != pid:
+        return  # a forked child dropping the parent's connection: leave it alone
+    pool = pool_ref()
+    if pool is not None:
+        with pool._lock:
+            pool._conns.discard(conn)
+        pool._closed.inc()
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+class _ThreadConn:
+    """A thread's connection, held in its threading.local only."""
+
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+
+class SQLitePool:
+    """
+    Keeps one open SQLite connection per thread instead of connecting per call.
+
+    - Connections are created lazily and reused by the same thread, and
+      closed when that thread ends, so open connections never outnumber
+      the live threads that used the pool.
+    - At most `max_connections` callers hold a connection at once; the time
+      spent waiting for a slot is recorded in `<name>_wait_ms`.
+    - Connections run in autocommit mode; use `transaction()` for writes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        name: str = "db_pool",
+        max_connections: int = 32,
+        pragmas: Optional[Dict[str, Any]] = None,
+        on_connect: Optional[Callable[[sqlite3.Connection], None]] = None,
+    ) -> None:
+        self.path = path
+        self.name = name
+        self.max_connections = max_connections
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.on_connect = on_connect
+
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Open connections, for stats() and close_all(); each thread holds
+        # its own through a _ThreadConn in self._local.
+        self._conns: Set[sqlite3.Connection] = set()
+        self._pid = os.getpid()
+
+        self._wait_ms = histogram(f"{name}_wait_ms")
+        self._checkouts = counter(f"{name}_checkouts")
+        self._opened = counter(f"{name}_connections_opened")
+        self._closed = counter(f"{name}_connections_closed")
+
+    # ---- connection lifecycle ----
+
+    def _open(self) -> sqlite3.Connection:
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        for key, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {key}={value}")
+        if self.on_connect:
+            self.on_connect(conn)
+        self._opened.inc()
+        return conn
+
+    def _thread_conn(self) -> sqlite3.Connection:
+        if os.getpid() != self._pid:
+            # Forked worker: never share the parent's file handles.
+            self._reset_after_fork()
+
+        held = getattr(self._local, "held", None)
+        if held is not None:
+            return held.conn
+
+        conn = self._open()
+        held = _ThreadConn(conn)
+        with self._lock:
+            self._conns.add(conn)
+        # A thread's locals are dropped when it ends; so is its connection.
+        weakref.finalize(held, _close_conn, weakref.ref(self), conn, self._pid)
+        self._local.held = held
+        return conn
+
+    def _reset_after_fork(self) -> None:
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._conns = set()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+
+    def close_all(self) -> None:
+        with self._lock:
+            for conn in self._conns:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._conns.clear()
+        self._local = threading.local()
+
+    # ---- checkout ----
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        start = time.perf_counter()
+        self._slots.acquire()
+        self._wait_ms.observe((time.perf_counter() - start) * 1000.0)
+        self._checkouts.inc()
+        try:
+            yield self._thread_conn()
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        BEGIN IMMEDIATE ... COMMIT on this thread's connection.
+        Taking the write lock up front avoids SQLITE_BUSY on lock upgrade.
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                # Nested use from the same thread joins the outer transaction.
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            else:
+                conn.execute("COMMIT")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            open_conns = len(self._conns)
+        return {
+            "path": self.path,
+            "max_connections": self.max_connections,
+            "open_connections": open_conns,
+            "checkouts": self._checkouts.value,
+            "connections_opened": self._opened.value,
+            "connections_closed": self._closed.value,
+            "wait_ms": self._wait_ms.snapshot(),
+        }
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Backend modules are flat imports, and read their config at import time.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["INCIDENTS_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="klynx-test-"), "incidents.db")
+os.environ.setdefault("KLYNX_ANALYSIS_CACHE_DB", "false")
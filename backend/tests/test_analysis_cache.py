@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from analysis_cache import AnalysisCache, cache_key, rebind, volatile_values
+
+
+def test_hit_names_the_asking_alerts_resources():
+    cache = AnalysisCache(persist=False)
+    first, second = "vpc-0abc1 delete failed", "vpc-0def2 delete failed"
+    key = cache_key(first, model="m")
+    assert key == cache_key(second, model="m")
+    cache.put(key, "m", {
+        "summary": "Cannot delete vpc-0abc1",
+        "probable_cause": ["ENIs still attached to VPC-0ABC1"],
+        "resources": ["vpc-0abc1"],
+    }, first)
+
+    hit = cache.get(key, second)
+    assert hit == {
+        "summary": "Cannot delete vpc-0def2",
+        "probable_cause": ["ENIs still attached to VPC-0def2"],
+        "resources": ["vpc-0def2"],
+    }
+    assert cache.get(key, first)["summary"] == "Cannot delete vpc-0abc1"
+
+
+def test_rebind_refuses_what_does_not_line_up():
+    source = volatile_values("sg-0aaa1 blocks sg-0aaa1")
+    assert rebind({"summary": "sg-0aaa1"}, source, volatile_values("sg-0bbb2 blocks sg-0ccc3")) is None
+    assert rebind({"summary": "x"}, [], volatile_values("sg-0bbb2 blocks")) is None
+    assert rebind({"summary": "x"}, [], []) == {"summary": "x"}
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import incident_engine
+
+_WORDS = ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot")
+_ANSWER = json.dumps({"severity": "SEV-2", "summary": "LLM", "cloud_provider": "aws"})
+
+
+class _SlowLLM:
+    def __init__(self, latency_s: float) -> None:
+        self.latency_s = latency_s
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, stream: bool = False, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency_s)
+        return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=_ANSWER))])])
+
+
+def test_deadline_is_per_item_from_its_slot(monkeypatch):
+    llm = _SlowLLM(0.2)
+    monkeypatch.setattr(incident_engine, "_openai_client", llm)
+    texts = [f"{w} queue backlog growing on the per item worker" for w in _WORDS[:4]]
+
+    # One call at a time, 0.8 s in all, yet each item only waits 0.2 s for its own answer.
+    results = asyncio.run(incident_engine.analyze_many(texts, concurrency=1, deadline_s=0.5, retries=0))
+    assert [source for _, source in results] == ["llm"] * 4
+
+
+def test_total_deadline_caps_the_batch(monkeypatch):
+    llm = _SlowLLM(0.2)
+    monkeypatch.setattr(incident_engine, "_openai_client", llm)
+    texts = [f"{w} queue backlog growing on the capped batch worker" for w in _WORDS]
+
+    start = time.perf_counter()
+    results = asyncio.run(incident_engine.analyze_many(
+        texts, concurrency=1, deadline_s=5, retries=0, total_deadline_s=0.5,
+    ))
+    elapsed = time.perf_counter() - start
+
+    sources = [source for _, source in results]
+    # About two answers fit in the cap; the rest keep the heuristic, and
+    # calls still queued when it passes are never sent.
+    assert sources[0] == "llm"
+    assert set(sources[2:]) == {"heuristic"}
+    assert llm.calls <= 3
+    assert elapsed < 1.0
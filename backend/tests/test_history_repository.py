@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import history_repository as repo
+
+
+def _save(thread_ts: str, **overrides) -> None:
+    fields = dict(
+        incident_id=f"INC-{thread_ts[-4:]}",
+        thread_ts=thread_ts,
+        channel_id="C1",
+        severity="SEV-2",
+        summary="checkout 5xx spike",
+        cloud="aws",
+        region="us-east-1",
+        resources="vpc-0abc",
+        probable_cause="bad deploy",
+        analysis_text="long analysis " * 50,
+        plan={"meta": {"severity": "SEV-2"}},
+        status="open",
+    )
+    fields.update(overrides)
+    repo.save_incident(**fields)
+
+
+def test_plan_projection_decodes_other_blobs(monkeypatch):
+    monkeypatch.setattr(repo, "_codec", "zlib")
+    _save("1700000001.000001")
+    inc = repo.get_incident_by_thread_ts("1700000001.000001", fields="analysis_text,plan")
+    assert inc["analysis_text"].startswith("long analysis")
+    assert inc["plan"] == {"meta": {"severity": "SEV-2"}}
+
+
+def test_multi_value_keyset_pages_match_full_sort():
+    rows = [
+        {
+            "id": f"INC-K{i:04d}", "thread_ts": f"1700001000.{i:06d}", "channel_id": "C-keyset",
+            "status": ("open", "resolved", "skipped")[i % 3], "severity": f"SEV-{i % 5 + 1}",
+            "created_at": f"2025-02-01T00:{i // 60 % 60:02d}:{i % 60:02d}", "summary": "s",
+        }
+        for i in range(400)
+    ]
+    repo.import_incidents(rows)
+    want = sorted(
+        (r for r in rows if r["status"] in ("open", "skipped") and r["severity"] in ("SEV-1", "SEV-2")),
+        key=lambda r: (r["created_at"], r["id"]), reverse=True,
+    )
+    got, cursor = [], None
+    while True:
+        page = repo.query_incidents(
+            limit=7, cursor=cursor, channel_id="C-keyset", status="open,skipped", severity=["SEV-1", "SEV-2"], fields="id"
+        )
+        got += [r["id"] for r in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert got == [r["id"] for r in want]
+    exported = repo.export_incidents(channel_id="C-keyset", status="open,skipped", severity="SEV-1,SEV-2", batch_size=5)
+    assert [r["id"] for r in exported] == got[::-1]
+
+
+def test_by_resource_pages_newest_first():
+    repo.import_incidents([
+        {"id": f"INC-R{i:03d}", "thread_ts": f"1700002000.{i:06d}", "resources": "vpc-0feed, i-0beef",
+         "created_at": f"2025-03-01T00:00:{i:02d}"}
+        for i in range(25)
+    ])
+    got, cursor = [], None
+    while True:
+        page = repo.find_incidents_by_resource("VPC-0FEED", limit=4, cursor=cursor, fields="id")
+        got += [r["id"] for r in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert got == [f"INC-R{i:03d}" for i in reversed(range(25))]
+
+
+def test_resolved_at_is_stamped_once_and_drives_mttr():
+    ts = "1700003000.000001"
+    repo.import_incidents([{
+        "id": "INC-MTTR", "thread_ts": ts, "status": "open", "severity": "SEV-1", "cloud": "mttr-cloud",
+        "created_at": "2024-06-01T00:00:00", "last_updated_at": "2024-06-01T00:00:00",
+    }])
+    repo.update_incident_status(ts, "fix_dry_run_complete")
+    assert repo.get_incident_by_thread_ts(ts)["resolved_at"] is None
+    repo.update_incident_status(ts, "resolved")
+    resolved_at = repo.get_incident_by_thread_ts(ts)["resolved_at"]
+    assert resolved_at
+    repo.update_incident_status(ts, "closed")
+    repo.update_incident_plan(ts, {"steps": []})
+    repo.append_incident_event(ts, "note", {"text": "later"})
+    inc = repo.get_incident_by_thread_ts(ts)
+    assert inc["resolved_at"] == resolved_at and inc["last_updated_at"] > resolved_at
+
+    stats = repo.incident_stats(grain="day", since="2024-06-01", until="2024-06-02", cloud="mttr-cloud")
+    want = (datetime.fromisoformat(resolved_at) - datetime(2024, 6, 1)).total_seconds()
+    assert abs(stats["totals"]["mttr_seconds"] - want) < 1
+
+    repo.update_incident_status(ts, "open")
+    assert repo.get_incident_by_thread_ts(ts)["resolved_at"] is None
+
+
+def test_archive_drops_copies_of_rows_modified_meanwhile(monkeypatch):
+    rows = [
+        {
+            "id": f"INC-A{i}", "thread_ts": f"1600000000.00000{i}", "channel_id": "C-archive",
+            "status": "open", "severity": "SEV-3", "created_at": f"2020-01-0{i + 1}T00:00:00",
+            "summary": "zebracorn outage", "resources": "i-0archived",
+        }
+        for i in range(3)
+    ]
+    repo.import_incidents(rows)
+    put_many = repo._archive.put_many
+
+    def put_then_touch(batch, resources=()):
+        put_many(batch, resources)
+        repo.update_incident_status("1600000000.000001", "resolved")
+
+    monkeypatch.setattr(repo._archive, "put_many", put_then_touch)
+    days = (datetime.utcnow() - datetime(2021, 1, 1)).days
+    result = repo.archive_old_incidents(older_than_days=days, max_batches=1)
+    assert result["moved"] == 2
+
+    assert repo._archive.get("1600000000.000001") is None
+    hits = [h["id"] for h in repo.search_incidents("zebracorn")]
+    assert sorted(hits) == ["INC-A0", "INC-A1", "INC-A2"]
+    page = repo.find_incidents_by_resource("i-0archived", fields="id")
+    assert [d["id"] for d in page["items"]] == ["INC-A2", "INC-A1", "INC-A0"]
+    assert [d.get("archived", False) for d in page["items"]] == [True, False, True]
+
+
+def test_skipped_imports_leave_resources_alone():
+    _save("1700006000.000001", incident_id="INC-KEEP", resources="vpc-0keep1")
+    repo.flush_writes()
+    result = repo.import_incidents([
+        {"id": "INC-KEEP", "thread_ts": "1700006000.000001", "resources": "vpc-0new01"},
+        {"id": "INC-OTHER", "thread_ts": "1700006000.000001", "resources": "vpc-0orphan"},
+    ], on_conflict="skip")
+    assert result["imported"] == 0 and result["skipped"] == 2
+
+    assert [r["resource_id"] for r in repo.incident_resources("INC-KEEP")] == ["vpc-0keep1"]
+    assert repo.incident_resources("INC-OTHER") == []
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import history_repository as repo
+import incident_classifier
+import incident_engine
+from incident_classifier import Prediction
+
+
+class _Model:
+    def __init__(self, severity: str, cloud: str) -> None:
+        self.labels = (Prediction(severity, 0.99), Prediction(cloud, 0.99))
+
+    def predict(self, text):
+        return self.labels
+
+
+def test_training_text_is_the_stored_alert_text():
+    repo.save_incident(
+        incident_id="INC-RAW1", thread_ts="1700003000.000001", channel_id="C-train",
+        severity="SEV-2", summary="Checkout errors (analyzer summary)", cloud="aws",
+        region="us-east-1", resources="", probable_cause="bad deploy",
+        analysis_text="SEV-2 aws", plan={}, raw_text="ALB 503 on checkout-api",
+    )
+    rows = [r for r in incident_classifier.labeled_rows() if r[0] == "ALB 503 on checkout-api"]
+    assert rows == [("ALB 503 on checkout-api", "SEV-2", "aws")]
+
+
+def test_classifier_keeps_a_matched_rule(monkeypatch):
+    text = "bad gateway from the alb in front of checkout on aws"
+    assert incident_engine._heuristic_analyze_issue(text).rule_id == "aws.alb-upstream-5xx"
+
+    monkeypatch.setattr(incident_engine, "get_classifier", lambda: _Model("SEV-4", "aws"))
+    assert incident_engine._local_analysis(text) is None
+
+    monkeypatch.setattr(incident_engine, "get_classifier", lambda: _Model("SEV-2", "aws"))
+    inc = incident_engine._local_analysis(text)
+    assert (inc.severity, inc.cloud_provider) == ("SEV-2", "aws")
+
+
+def test_classifier_labels_when_no_rule_matched(monkeypatch):
+    text = "payments worker is slow since this morning"
+    monkeypatch.setattr(incident_engine, "get_classifier", lambda: _Model("SEV-4", "gcp"))
+    inc = incident_engine._local_analysis(text)
+    assert inc.rule_id is None
+    assert (inc.severity, inc.cloud_provider) == ("SEV-4", "gcp")
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import asyncio
+
+import history_repository as repo
+import near_duplicates
+import otel_handler
+from models import OTelAlert, OTelPayload
+from near_duplicates import NearDuplicateIndex, get_dedup_index
+
+ALERT = "checkout-api 5xx ratio above 5% on alb prod-checkout in us-east-1 for 5 minutes"
+
+
+def test_window_is_anchored_to_creation(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(near_duplicates.time, "monotonic", lambda: clock[0])
+    index = NearDuplicateIndex(window_s=60)
+    assert index.claim(ALERT, scope="c", key="t1", incident_id="INC-1") is None
+    clock[0] += 50
+    assert index.claim(ALERT, scope="c", key="t2", incident_id="INC-2")[0].key == "t1"
+    # The fold at +50 s did not extend the window: at +70 s the alert opens a new incident.
+    clock[0] += 20
+    assert index.claim(ALERT, scope="c", key="t3", incident_id="INC-3") is None
+
+
+def test_resolved_incident_stops_absorbing():
+    index = get_dedup_index()
+    index.clear()
+    repo.save_incident(
+        incident_id="INC-DUP1", thread_ts="1700000002.000001", channel_id="C9", severity="SEV-3",
+        summary="s", cloud="aws", region="us-east-1", resources="", probable_cause="", analysis_text="",
+        plan={}, status="open",
+    )
+    assert index.claim(ALERT, scope="C9", key="1700000002.000001", incident_id="INC-DUP1") is None
+    assert index.claim(ALERT, scope="C9", key="1700000002.000002", incident_id="INC-DUP2") is not None
+    repo.update_incident_status("1700000002.000001", "resolved")
+    assert index.claim(ALERT, scope="C9", key="1700000002.000003", incident_id="INC-DUP3") is None
+
+
+def test_duplicate_before_the_original_commits_is_kept(monkeypatch):
+    get_dedup_index().clear()
+    payload = OTelPayload(alerts=[OTelAlert(name="DiskFull", description="disk above 95% on orders-db in eu-west-1")])
+    analyze = otel_handler.analyze_cloud_issue_async
+    early = []
+
+    async def slow_analyze(text):
+        # The re-fire lands while the original is still being analyzed, before its row exists.
+        if not early:
+            early.append(await otel_handler.handle_otel(payload))
+        return await analyze(text)
+
+    monkeypatch.setattr(otel_handler, "analyze_cloud_issue_async", slow_analyze)
+    first = asyncio.run(otel_handler.handle_otel(payload))
+    assert early[0] == {"status": "duplicate", "incident_id": first["incident_id"]}
+    kinds = [e["kind"] for e in repo.incident_timeline(first["incident_id"])["items"]]
+    assert "duplicate" in kinds
+    assert get_dedup_index().stats()["unsaved"] == 0
@@ -0,0 +1,85 @@
+"""
+Smoke test: every API route is mounted on the app and answers.
+
+    python -m pytest -q tests
+"""
+from __future__ import annotations
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from history_repository import save_incident
+
+THREAD_TS = "1700000000.000100"
+
+
+@pytest.fixture(scope="module")
+def client():
+    save_incident(
+        incident_id="INC-SMOKE",
+        thread_ts=THREAD_TS,
+        channel_id="C1",
+        severity="SEV-2",
+        summary="checkout 5xx spike on alb in us-east-1",
+        cloud="aws",
+        region="us-east-1",
+        resources="vpc-0abc",
+        probable_cause="bad deploy",
+        analysis_text="analysis",
+        plan={"meta": {"severity": "SEV-2"}},
+        status="open",
+    )
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.mark.parametrize("path", [
+    "/",
+    "/api/incidents",
+    "/api/incidents?status=open&severity=SEV-2",
+    "/api/incidents/export",
+    "/api/incidents/changes",
+    "/api/incidents/search?q=checkout",
+    "/api/incidents/stats",
+    "/api/incidents/by-resource/vpc-0abc",
+    f"/api/incidents/{THREAD_TS}",
+    f"/api/incidents/{THREAD_TS}/timeline",
+    f"/api/incidents/{THREAD_TS}/similar",
+    f"/api/incidents/by-thread/{THREAD_TS}",
+    "/api/outages",
+    "/api/metrics",
+])
+def test_get_routes(client, path):
+    assert client.get(path).status_code == 200, path
+
+
+def test_list_has_changes_cursor(client):
+    body = client.get("/api/incidents").json()
+    assert body["items"] and body["changes_cursor"]
+
+
+def test_change_stream_is_mounted(client):
+    # The stream never ends; a bad cursor is rejected before it starts.
+    assert client.get("/api/incidents/changes/stream?since=bogus").status_code == 400
+
+
+def test_otel_routes(client):
+    alert = {"name": "CheckoutHighErrorRate", "severity": "critical", "description": "5xx above 5% on checkout"}
+    resp = client.post("/api/alerts/otel", json={"alerts": [alert]})
+    assert resp.status_code == 200 and resp.json()["status"] == "ok"
+    resp = client.post("/api/alerts/batch", json={"messages": ["disk full on db-1", "pod crashloop in payments"]})
+    assert resp.status_code == 200 and len(resp.json()["incident_ids"]) == 2
+
+
+def test_similar_has_one_shape(client):
+    body = client.get(f"/api/incidents/{THREAD_TS}/similar").json()
+    assert set(body) == {"items", "ready"}
+    assert client.get(f"/api/incidents/by-thread/{THREAD_TS}/similar").status_code == 404
+
+
+def test_list_defaults_to_summary_rows(client):
+    item = client.get("/api/incidents").json()["items"][0]
+    assert "analysis_text" not in item and "plan" not in item
+    full = client.get("/api/incidents?fields=all").json()["items"][0]
+    assert "analysis_text" in full and "plan" in full
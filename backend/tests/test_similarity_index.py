@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import history_repository as repo
+from similarity_index import SimilarityIndex
+
+
+def _save(i: int) -> None:
+    repo.save_incident(
+        incident_id=f"INC-S{i:03d}", thread_ts=f"1700005000.{i:06d}", channel_id="C-similar",
+        severity="SEV-3", summary=f"kafka consumer lag on partition {i}", cloud="aws",
+        region="us-east-1", resources="", probable_cause="slow consumer", analysis_text="", plan={},
+    )
+
+
+def _wait(cond, timeout: float = 5.0) -> None:
+    end = time.monotonic() + timeout
+    while not cond() and time.monotonic() < end:
+        time.sleep(0.01)
+
+
+def test_refresh_syncs_pending_writes_off_the_query_path(monkeypatch):
+    index = SimilarityIndex()
+    index.rebuild()
+    before = len(index)
+    for i in range(50):
+        _save(i)
+    repo.flush_writes()
+
+    def no_single_reads(*args, **kwargs):
+        raise AssertionError("per-incident read during refresh")
+
+    monkeypatch.setattr(repo, "get_incident_by_thread_ts", no_single_reads)
+    assert index.refresh()
+    _wait(lambda: not index._applying)
+    assert index.stats()["pending"] == 0
+    assert len(index) == before + 50
+
+
+def test_concurrent_refreshes_start_one_rebuild(monkeypatch):
+    index = SimilarityIndex()
+    started = []
+
+    def slow_rebuild():
+        started.append(1)
+        time.sleep(0.2)
+        return 0
+
+    monkeypatch.setattr(index, "rebuild", slow_rebuild)
+    threads = [threading.Thread(target=index.refresh) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    _wait(lambda: not index._building)
+    assert len(started) == 1
+
+
+def test_add_past_the_initial_capacity():
+    index = SimilarityIndex()
+    index.load([])
+    for i in range(1100):
+        index.add(f"K{i}", f"disk pressure on node {i}")
+    assert len(index) == 1100
+    assert index.query("disk pressure on node 1099", k=1, min_score=0.0)
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import gc
+import threading
+
+from sqlite_pool import SQLitePool
+
+
+def test_connections_close_with_their_thread(tmp_path):
+    pool = SQLitePool(str(tmp_path / "pool.db"), name="test_pool", max_connections=4)
+
+    def work() -> None:
+        with pool.connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+
+    for _ in range(5):
+        threads = [threading.Thread(target=work) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    gc.collect()
+
+    stats = pool.stats()
+    assert stats["connections_opened"] == 100
+    assert stats["open_connections"] == 0
+    assert stats["connections_closed"] == 100
+
+    work()  # this thread keeps its connection
+    assert pool.stats()["open_connections"] == 1
+    pool.close_all()
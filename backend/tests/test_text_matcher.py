@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import autofix_engine
+import incident_engine
+from text_matcher import Matcher
+
+
+def test_keyword_prefix_of_a_non_id_word_still_tags():
+    for text in ("vpc-endpoint creation failed", "VPC-Flow-Logs disabled"):
+        match = incident_engine._MATCHER.scan(text)
+        assert match.tags == {"aws"}
+        assert match.resources == []
+        assert autofix_engine._guess_cloud(text) == "aws"
+        assert incident_engine._heuristic_analyze_issue(text).cloud_provider == "aws"
+
+
+def test_resource_ids_are_whole_words():
+    match = Matcher({"aws": ["vpc"]}).scan("delete of vpc-0abc failed, vpc-0abcz is not an id")
+    assert match.resources == ["vpc-0abc"]
+    assert match.tags == {"aws"}
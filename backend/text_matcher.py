@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# Public region catalogs. Matched as whole words; an availability-zone
+# suffix ("us-east-1a") still counts as the region.
+AWS_REGIONS = (
+    "us-east-1", "us-east-2", "us-west-1", "us-west-2", "us-gov-east-1", "us-gov-west-1",
+    "ca-central-1", "ca-west-1", "mx-central-1", "sa-east-1",
+    "eu-central-1", "eu-central-2", "eu-west-1", "eu-west-2", "eu-west-3",
+    "eu-south-1", "eu-south-2", "eu-north-1",
+    "af-south-1", "il-central-1", "me-south-1", "me-central-1",
+    "ap-east-1", "ap-east-2", "ap-south-1", "ap-south-2",
+    "ap-southeast-1", "ap-southeast-2", "ap-southeast-3", "ap-southeast-4", "ap-southeast-5", "ap-southeast-7",
+    "ap-northeast-1", "ap-northeast-2", "ap-northeast-3",
+    "cn-north-1", "cn-northwest-1",
+)
+AZURE_REGIONS = (
+    "eastus", "eastus2", "westus", "westus2", "westus3", "centralus", "northcentralus",
+    "southcentralus", "westcentralus", "canadacentral", "canadaeast", "brazilsouth",
+    "brazilsoutheast", "mexicocentral", "northeurope", "westeurope", "uksouth", "ukwest",
+    "francecentral", "francesouth", "germanywestcentral", "germanynorth", "switzerlandnorth",
+    "switzerlandwest", "norwayeast", "norwaywest", "swedencentral", "swedensouth",
+    "polandcentral", "italynorth", "spaincentral", "austriaeast", "belgiumcentral",
+    "eastasia", "southeastasia", "japaneast", "japanwest", "koreacentral", "koreasouth",
+    "australiaeast", "australiasoutheast", "australiacentral", "australiacentral2",
+    "centralindia", "southindia", "westindia", "jioindiawest", "jioindiacentral",
+    "uaenorth", "uaecentral", "qatarcentral", "israelcentral", "southafricanorth",
+    "southafricawest", "newzealandnorth", "indonesiacentral", "malaysiawest", "chilecentral",
+)
+GCP_REGIONS = (
+    "us-central1", "us-east1", "us-east4", "us-east5", "us-south1",
+    "us-west1", "us-west2", "us-west3", "us-west4",
+    "northamerica-northeast1", "northamerica-northeast2", "northamerica-south1",
+    "southamerica-east1", "southamerica-west1",
+    "europe-west1", "europe-west2", "europe-west3", "europe-west4", "europe-west6",
+    "europe-west8", "europe-west9", "europe-west10", "europe-west12",
+    "europe-north1", "europe-north2", "europe-central2", "europe-southwest1",
+    "asia-east1", "asia-east2", "asia-northeast1", "asia-northeast2", "asia-northeast3",
+    "asia-south1", "asia-south2", "asia-southeast1", "asia-southeast2",
+    "australia-southeast1", "australia-southeast2",
+    "me-west1", "me-central1", "me-central2", "africa-south1",
+)
+
+REGION_CLOUD: Dict[str, str] = {
+    **{r: "aws" for r in AWS_REGIONS},
+    **{r: "azure" for r in AZURE_REGIONS},
+    **{r: "gcp" for r in GCP_REGIONS},
+}
+
+# AWS-style resource ids: <prefix>-<hex>.
+RESOURCE_PREFIXES = ("vpc", "eni", "i", "sg", "subnet")
+
+_WORD = frozenset("abcdefghijklmnopqrstuvwxyz0123456789_")
+
+
+def _trie_regex(terms: Dict[str, str]) -> str:
+    """
+    Alternation over `terms` with shared prefixes factored out
+    ("vpc(?:-[0-9a-f]+| network)?"), so the regex engine branches once per
+    character instead of trying every word in turn, and the longest term
+    wins. Each term maps to a regex suffix that must follow it ("" for a
+    plain literal).
+    """
+    root: Dict[str, Any] = {}
+    for term, suffix in terms.items():
+        node = root
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = suffix
+
+    def emit(node: Dict[str, Any]) -> str:
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        optional = node.get("") == ""
+        if "" in node and not optional:
+            alts.append(node[""])
+        if not alts:
+            return ""
+        if optional:
+            return "(?:" + "|".join(alts) + ")?"
+        return alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+
+    return emit(root)
+
+
+class TextMatch:
+    """
+    Result of Matcher.scan(): keyword tags seen, regions and resource ids
+    in order of first appearance.
+    """
+
+    __slots__ = ("tags", "regions", "resources")
+
+    def __init__(self) -> None:
+        self.tags: Set[str] = set()
+        self.regions: List[str] = []
+        self.resources: List[str] = []
+
+    def has(self, *tags: str) -> bool:
+        return any(t in self.tags for t in tags)
+
+    @property
+    def region(self) -> Optional[str]:
+        return self.regions[0] if self.regions else None
+
+    @property
+    def region_cloud(self) -> Optional[str]:
+        return REGION_CLOUD.get(self.regions[0]) if self.regions else None
+
+
+class Matcher:
+    """
+    Finds tagged keywords, catalog regions and resource ids in a single
+    left-to-right pass over the lower-cased text.
+
+    All three live in one prefix trie compiled into a single regex, tried
+    only at word starts: the pattern begins with a separator character
+    class, so the regex engine skips the inside of words in its C fast
+    path. Keywords match at the start of a word ("pod" matches "pods",
+    "arm" no longer matches inside "alarm"); regions and resource ids must
+    be whole words (a zone suffix as in "us-east-1a" is allowed).
+    """
+
+    def __init__(self, keywords: Dict[str, Iterable[str]]) -> None:
+        kw_tags: Dict[str, Set[str]] = {}
+        for tag, words in keywords.items():
+            for w in words:
+                kw_tags.setdefault(w.lower(), set()).add(tag)
+
+        terms: Dict[str, str] = {r: "" for r in REGION_CLOUD}
+        terms.update({w: "" for w in kw_tags})
+        terms.update({p + "-": "[0-9a-f]+" for p in RESOURCE_PREFIXES})
+
+        # The trie returns only the longest term at a position; give each
+        # term the tags of every keyword that is a prefix of it.
+        self._tags: Dict[str, Set[str]] = {}
+        for term in terms:
+            tags: Set[str] = set()
+            for i in range(1, len(term) + 1):
+                wt = kw_tags.get(term[:i])
+                if wt:
+                    tags |= wt
+            self._tags[term] = tags
+        self._keywords = frozenset(kw_tags)
+        self._re = re.compile(r"[^a-z0-9_](?=(" + _trie_regex(terms) + "))")
+
+    def scan(self, text: str) -> TextMatch:
+        out = TextMatch()
+        if not text:
+            return out
+        low = " " + text.lower()
+        # str.lower() can change length for a few non-ASCII characters; only
+        # slice the original for resource ids when offsets still line up.
+        aligned = len(low) == len(text) + 1
+        tags = out.tags
+        done: Set[str] = set()
+        for m in self._re.finditer(low):
+            hit = m.group(1)
+            if hit in done:
+                continue
+            start = m.start(1)
+            end = start + len(hit)
+            after = low[end:end + 1]
+            if hit in REGION_CLOUD:
+                # Whole word, or an AWS/GCP zone letter ("us-east-1a").
+                if after in _WORD and not (
+                    hit[-1].isdigit() and after.isalpha() and low[end + 1:end + 2] not in _WORD
+                ):
+                    if hit in self._keywords:
+                        tags |= self._tags[hit]
+                    continue
+                tags |= self._tags[hit]
+                out.regions.append(hit)
+                done.add(hit)
+                continue
+            if hit in self._keywords:
+                tags |= self._tags[hit]
+                done.add(hit)
+                continue
+            # Resource id: "<prefix>-<hex>" as a whole word. Otherwise
+            # ("vpc-endpoint") the keyword prefix still counts.
+            tags |= self._tags[hit[:hit.index("-") + 1]]
+            if after in _WORD:
+                continue
+            out.resources.append(text[start - 1:end - 1] if aligned else hit)
+            done.add(hit)
+        return out
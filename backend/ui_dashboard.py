@@ -1,21 +1,139 @@
 from __future__ import annotations
-from fastapi import APIRouter, HTTPException
-from history_repository import list_incidents, get_incident_by_thread_ts
+import asyncio
+import json
+import os
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from history_repository import (
+    get_incident_by_thread_ts, search_incidents, incident_stats, pool_stats, archive_stats,
+    decode_change_cursor, encode_change_cursor, resolve_fields,
+    add_change_listener, remove_change_listener, incident_timeline,
+)
+import async_repository
 from cloud_outage_engine import detect_multi_cloud_outage
+import metrics
+from rule_engine import rules_stats
+from analysis_cache import get_analysis_cache
+from near_duplicates import get_dedup_index
+from incident_classifier import classifier_stats
+from similarity_index import SIMILAR_FIELDS, get_similarity_index, incident_text
 
 ui_router = APIRouter(prefix="/api")
 
-@ui_router.get("/incidents")
-def api_list_incidents(limit: int = 200):
-    return {"incidents": list_incidents(limit=limit)}
+# The SSE stream is woken by commits in this process; writes made by other
+# processes sharing the DB are picked up by polling at this interval.
+SSE_POLL_S = float(os.getenv("INCIDENTS_SSE_POLL_S", "5"))
+
+# The list, export, changes and by-resource routes live in main.py, which
+# mounts this router after them. Declared before /incidents/{thread_ts} so
+# "search"/"stats"/"changes" are not taken as a thread_ts.
+@ui_router.get("/incidents/search")
+def api_search_incidents(
+    q: str,
+    limit: int = 20,
+    status: Optional[str] = None,
+    severity: Optional[str] = None,
+    cloud: Optional[str] = None,
+    region: Optional[str] = None,
+    channel_id: Optional[str] = None,
+):
+    filters = {"status": status, "severity": severity, "cloud": cloud, "region": region, "channel_id": channel_id}
+    return {"query": q, "results": search_incidents(q, limit=min(max(limit, 1), 200), filters=filters)}
+
+@ui_router.get("/incidents/stats")
+def api_incident_stats(
+    grain: str = "day",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    severity: Optional[str] = None,
+    status: Optional[str] = None,
+    cloud: Optional[str] = None,
+):
+    try:
+        return incident_stats(grain=grain, since=since, until=until, severity=severity, status=status, cloud=cloud)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@ui_router.get("/incidents/changes/stream")
+async def api_incident_change_stream(request: Request, since: Optional[str] = None, fields: Optional[str] = "summary"):
+    """
+    Server-Sent Events: one `incident` event per new/updated incident.
+    Without `since` (or a Last-Event-ID header) only future changes are sent.
+    """
+    cursor = since or request.headers.get("last-event-id")
+    try:
+        resolve_fields(fields)
+        if cursor:
+            decode_change_cursor(cursor)
+        else:
+            cursor = await async_repository.change_cursor()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        nonlocal cursor
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+
+        def on_change(_keys) -> None:
+            loop.call_soon_threadsafe(wake.set)
+
+        add_change_listener(on_change)
+        try:
+            yield f"retry: {int(SSE_POLL_S * 1000)}\n\n"
+            while not await request.is_disconnected():
+                wake.clear()
+                page = await async_repository.incident_changes(since=cursor, limit=200, fields=fields)
+                for item in page["items"]:
+                    event_id = encode_change_cursor(item["change_seq"], item["last_updated_at"])
+                    yield f"id: {event_id}\nevent: incident\ndata: {json.dumps(item, ensure_ascii=False)}\n\n"
+                cursor = page["next_cursor"] or cursor
+                if page["has_more"]:
+                    continue
+                try:
+                    await asyncio.wait_for(wake.wait(), SSE_POLL_S)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            remove_change_listener(on_change)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @ui_router.get("/incidents/{thread_ts}")
-def api_get_incident(thread_ts: str):
-    inc = get_incident_by_thread_ts(thread_ts)
+def api_get_incident(thread_ts: str, fields: Optional[str] = None):
+    try:
+        inc = get_incident_by_thread_ts(thread_ts, fields=fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not inc:
         raise HTTPException(status_code=404, detail="Incident not found")
     return inc
 
+@ui_router.get("/incidents/{thread_ts}/timeline")
+def api_incident_timeline(thread_ts: str, limit: int = 50, before: Optional[int] = None):
+    inc = get_incident_by_thread_ts(thread_ts, fields=["id"])
+    if not inc:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    return incident_timeline(inc["id"], limit=min(max(limit, 1), 500), before=before)
+
+@ui_router.get("/incidents/{thread_ts}/similar")
+def api_similar_incidents(thread_ts: str, k: int = 5, min_score: Optional[float] = None):
+    inc = get_incident_by_thread_ts(thread_ts, fields=list(SIMILAR_FIELDS))
+    if not inc:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    index = get_similarity_index()
+    items = index.similar(incident_text(inc), k=min(max(k, 1), 50), exclude=[thread_ts], min_score=min_score)
+    return {"items": items, "ready": index.stats()["ready"]}
+
 @ui_router.get("/outages")
 def api_outages():
     return detect_multi_cloud_outage()
+
+@ui_router.get("/metrics")
+def api_metrics():
+    return {"db_pool": pool_stats(), "archive": archive_stats(), "rules": rules_stats(), "analysis_cache": get_analysis_cache().stats(), "dedup": get_dedup_index().stats(), "similar": get_similarity_index().stats(), "classifier": classifier_stats(), "metrics": metrics.snapshot()}
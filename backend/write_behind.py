@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import counter, histogram
+from sqlite_pool import SQLitePool
+
+_logger = logging.getLogger("klynx.write_behind")
+
+WriteOp = Callable[[sqlite3.Connection], None]
+
+_BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class _Barrier:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+
+
+class WriteBehindQueue:
+    """
+    Group-commits queued writes from a single writer thread.
+
+    Ops are `fn(conn)` callables tagged with a key (the incident thread_ts).
+    The writer drains up to `max_batch` ops, or whatever arrives within
+    `flush_interval_ms` of the first one, and runs them in one transaction.
+    Readers call `wait_for_key()` to see their own pending writes.
+    `on_commit(keys)` runs on the writer thread after each committed batch.
+    """
+
+    def __init__(
+        self,
+        pool: SQLitePool,
+        *,
+        name: str = "write_behind",
+        flush_interval_ms: int = 50,
+        max_batch: int = 256,
+        max_queue: int = 10000,
+        on_commit: Optional[Callable[[List[str]], None]] = None,
+    ) -> None:
+        self.pool = pool
+        self.name = name
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.on_commit = on_commit
+
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._pending: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._stopped = False
+
+        self._batch_size = histogram(f"{name}_batch_size", _BATCH_BUCKETS)
+        self._commit_ms = histogram(f"{name}_commit_ms")
+        self._ops = counter(f"{name}_ops")
+        self._errors = counter(f"{name}_errors")
+
+        self._thread = threading.Thread(target=self._run, name=f"{name}-writer", daemon=True)
+        self._thread.start()
+
+    # ---- producer side ----
+
+    def submit(self, key: str, op: WriteOp) -> None:
+        if self._stopped:
+            raise RuntimeError("write-behind queue is closed")
+        with self._cond:
+            self._pending[key] = self._pending.get(key, 0) + 1
+        self._q.put((key, op))
+
+    def has_pending(self, key: str) -> bool:
+        with self._cond:
+            return self._pending.get(key, 0) > 0
+
+    def wait_for_key(self, key: str, timeout: Optional[float] = 5.0) -> bool:
+        """
+        Block until every write queued for `key` has been committed.
+        """
+        if not self.has_pending(key):
+            return True
+        self._wake.set()
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending.get(key, 0) == 0, timeout=timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until everything submitted before this call has been committed.
+        """
+        if not self._thread.is_alive():
+            return self._q.empty()
+        barrier = _Barrier()
+        self._q.put(barrier)
+        self._wake.set()
+        return barrier.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        if self._stopped:
+            return
+        self.flush(timeout)
+        self._stopped = True
+        self._q.put(None)
+        self._thread.join(timeout)
+
+    # ---- writer thread ----
+
+    def _collect(self, first: Any) -> Tuple[List[Tuple[str, WriteOp]], List[_Barrier], bool]:
+        ops: List[Tuple[str, WriteOp]] = []
+        barriers: List[_Barrier] = []
+        stop = False
+        item = first
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if item is None:
+                stop = True
+                break
+            if isinstance(item, _Barrier):
+                # Everything before the barrier is already in this batch.
+                barriers.append(item)
+                break
+            ops.append(item)
+            if len(ops) >= self.max_batch:
+                break
+            remaining = deadline - time.monotonic()
+            if self._wake.is_set():
+                remaining = 0
+            try:
+                item = self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait()
+            except queue.Empty:
+                break
+        self._wake.clear()
+        return ops, barriers, stop
+
+    def _commit(self, ops: List[Tuple[str, WriteOp]]) -> None:
+        start = time.perf_counter()
+        try:
+            with self.pool.transaction() as conn:
+                for _, op in ops:
+                    op(conn)
+        except Exception:
+            # One bad op must not take the whole batch down: replay one by one.
+            _logger.exception("write-behind batch of %d failed; retrying individually", len(ops))
+            for key, op in ops:
+                try:
+                    with self.pool.transaction() as conn:
+                        op(conn)
+                except Exception:
+                    self._errors.inc()
+                    _logger.exception("write-behind op for %s dropped", key)
+        self._commit_ms.observe((time.perf_counter() - start) * 1000.0)
+        self._batch_size.observe(len(ops))
+        self._ops.inc(len(ops))
+
+    def _run(self) -> None:
+        while True:
+            first = self._q.get()
+            ops, barriers, stop = self._collect(first)
+            if ops:
+                self._commit(ops)
+                if self.on_commit is not None:
+                    try:
+                        self.on_commit([key for key, _ in ops])
+                    except Exception:
+                        _logger.exception("write-behind on_commit hook failed")
+                with self._cond:
+                    for key, _ in ops:
+                        left = self._pending.get(key, 0) - 1
+                        if left > 0:
+                            self._pending[key] = left
+                        else:
+                            self._pending.pop(key, None)
+                    self._cond.notify_all()
+            for b in barriers:
+                b.done.set()
+            if stop:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._q.qsize(),
+            "pending_keys": len(self._pending),
+            "ops": self._ops.value,
+            "errors": self._errors.value,
+            "batch_size": self._batch_size.snapshot(),
+            "commit_ms": self._commit_ms.snapshot(),
+        }
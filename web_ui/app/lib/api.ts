@@ -1,7 +1,7 @@
 const API_BASE = "/api/backend";
 
 export async function getIncidents() {
-  const res = await fetch(`${API_BASE}/api/incidents`, { cache: "no-store" });
+  const res = await fetch(`${API_BASE}/api/incidents?fields=summary`, { cache: "no-store" });
   if (!res.ok) throw new Error("Failed to fetch incidents");
   return res.json();
 }
@@ -14,7 +14,7 @@ async function http<T>(path: string): Promise<T> {
 }
 
 export async function listIncidents(limit = 50): Promise<IncidentItem[]> {
-  const data = await http<{ items: IncidentItem[] }>(`/api/incidents?limit=${limit}`);
+  const data = await http<{ items: IncidentItem[] }>(`/api/incidents?limit=${limit}&fields=summary`);
   return data.items || [];
 }
 